@@ -0,0 +1,273 @@
+"""
+Indexed alert store
+Alerts are kept in (created_at, id) order, with one bitmap per value of is_read,
+is_resolved, priority and type, so filter combinations are word-wise ANDs
+and a page only materialises the alerts it returns, plus the writer that
+mirrors them into Postgres
+"""
+
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+from db import row_uuid
+
+# Alert attributes with a bitmap per distinct value
+INDEXED_FIELDS = ("is_read", "is_resolved", "priority", "type")
+
+WORD_BITS = 64
+# Words ANDed per step while collecting a page
+SCAN_WORDS = 1024
+
+_BIT_OFFSETS = np.arange(WORD_BITS, dtype=np.int64)
+
+
+class Bitmap:
+    """Growable bitset over alert positions, stored as uint64 words"""
+
+    __slots__ = ("words",)
+
+    def __init__(self, capacity_words: int = 16):
+        self.words = np.zeros(capacity_words, dtype=np.uint64)
+
+    @classmethod
+    def from_positions(cls, positions: np.ndarray, capacity_words: int) -> "Bitmap":
+        bitmap = cls(capacity_words)
+        np.bitwise_or.at(
+            bitmap.words,
+            positions // WORD_BITS,
+            np.left_shift(np.uint64(1), (positions % WORD_BITS).astype(np.uint64)),
+        )
+        return bitmap
+
+    def _reserve(self, words: int) -> None:
+        if words > len(self.words):
+            grown = np.zeros(max(words, 2 * len(self.words)), dtype=np.uint64)
+            grown[:len(self.words)] = self.words
+            self.words = grown
+
+    def set(self, position: int) -> None:
+        word = position // WORD_BITS
+        self._reserve(word + 1)
+        self.words[word] |= np.uint64(1 << (position % WORD_BITS))
+
+    def clear(self, position: int) -> None:
+        word = position // WORD_BITS
+        if word < len(self.words):
+            self.words[word] &= ~np.uint64(1 << (position % WORD_BITS))
+
+    def window(self, start: int, stop: int) -> np.ndarray:
+        """Words ``start:stop``, zero-padded past the allocated end"""
+        if stop <= len(self.words):
+            return self.words[start:stop]
+        out = np.zeros(stop - start, dtype=np.uint64)
+        available = self.words[start:stop]
+        out[:len(available)] = available
+        return out
+
+
+def _sort_key(alert: Any) -> Tuple[Any, str]:
+    return alert.created_at, alert.id
+
+
+def _set_bits(words: np.ndarray, first_word: int) -> np.ndarray:
+    """Positions of the set bits in ``words``, ascending"""
+    nonzero = np.flatnonzero(words)
+    if not len(nonzero):
+        return nonzero
+    bits = np.unpackbits(words[nonzero].view(np.uint8), bitorder="little").reshape(-1, WORD_BITS)
+    rows, columns = np.nonzero(bits)
+    return (nonzero[rows] + first_word) * WORD_BITS + _BIT_OFFSETS[columns]
+
+
+class AlertStore:
+    """
+    Alerts ordered by (created_at, id) with bitmap indexes for filtering
+
+    Positions are assigned in that order and are stable while alerts arrive
+    in order; an alert older than the newest one triggers a one-off
+    renumbering. Pages are therefore addressed by (created_at, id) keys,
+    not positions.
+    """
+
+    def __init__(self, alerts: Iterable[Any] = ()):
+        self._load(alerts)
+
+    def _load(self, alerts: Iterable[Any]) -> None:
+        self._indexes: Dict[str, Dict[Any, Bitmap]] = {}
+        self._alerts: List[Any] = sorted(alerts, key=_sort_key)
+        self._keys: List[Tuple[Any, str]] = [_sort_key(alert) for alert in self._alerts]
+        self._positions: Dict[str, int] = {alert.id: position for position, alert in enumerate(self._alerts)}
+        self._by_product: Dict[Optional[str], List[Any]] = {}
+        for alert in self._alerts:
+            self._by_product.setdefault(alert.product_id, []).append(alert)
+
+        capacity = max(16, -(-len(self._alerts) // WORD_BITS))
+        for field in INDEXED_FIELDS:
+            groups: Dict[Any, List[int]] = {}
+            for position, alert in enumerate(self._alerts):
+                groups.setdefault(getattr(alert, field), []).append(position)
+            self._indexes[field] = {
+                value: Bitmap.from_positions(np.array(positions, dtype=np.int64), capacity)
+                for value, positions in groups.items()
+            }
+
+    def __len__(self) -> int:
+        return len(self._alerts)
+
+    def __contains__(self, alert_id: str) -> bool:
+        return alert_id in self._positions
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._alerts)
+
+    def get(self, alert_id: str) -> Optional[Any]:
+        position = self._positions.get(alert_id)
+        return self._alerts[position] if position is not None else None
+
+    def _bitmap(self, field: str, value: Any) -> Bitmap:
+        bitmaps = self._indexes[field]
+        bitmap = bitmaps.get(value)
+        if bitmap is None:
+            bitmap = bitmaps[value] = Bitmap(max(16, -(-len(self._alerts) // WORD_BITS)))
+        return bitmap
+
+    def _append(self, alert: Any) -> None:
+        position = len(self._alerts)
+        self._alerts.append(alert)
+        self._keys.append(_sort_key(alert))
+        self._positions[alert.id] = position
+        self._by_product.setdefault(alert.product_id, []).append(alert)
+        for field in INDEXED_FIELDS:
+            self._bitmap(field, getattr(alert, field)).set(position)
+
+    def add(self, alert: Any) -> None:
+        if alert.id in self._positions:
+            raise KeyError(f"Alert {alert.id} already exists")
+        if self._keys and _sort_key(alert) < self._keys[-1]:
+            self._load(self._alerts + [alert])
+            return
+        self._append(alert)
+
+    def _reindex(self, alert: Any, field: str, value: Any) -> None:
+        position = self._positions[alert.id]
+        self._bitmap(field, getattr(alert, field)).clear(position)
+        setattr(alert, field, value)
+        self._bitmap(field, value).set(position)
+
+    def mark_read(self, alert_id: str) -> Optional[Any]:
+        alert = self.get(alert_id)
+        if alert is not None and not alert.is_read:
+            self._reindex(alert, "is_read", True)
+        return alert
+
+    def resolve(self, alert_id: str) -> Optional[Any]:
+        alert = self.mark_read(alert_id)
+        if alert is not None and not alert.is_resolved:
+            self._reindex(alert, "is_resolved", True)
+        return alert
+
+    def for_product(self, product_id: str, resolved: bool = False, read: Optional[bool] = None,
+                    limit: int = 50) -> List[Any]:
+        """A product's alerts by status, newest first"""
+        page = []
+        for alert in reversed(self._by_product.get(product_id, ())):
+            if alert.is_resolved == resolved and (read is None or alert.is_read == read):
+                page.append(alert)
+                if len(page) == limit:
+                    break
+        return page
+
+    def _filter_bitmaps(self, filters: Dict[str, Any]) -> Optional[List[Bitmap]]:
+        """Bitmaps to intersect, or None if some filter value never occurs"""
+        bitmaps = []
+        for field, value in filters.items():
+            if value is None:
+                continue
+            bitmap = self._indexes[field].get(value)
+            if bitmap is None:
+                return None
+            bitmaps.append(bitmap)
+        return bitmaps
+
+    def page(self, after: Optional[Tuple[Any, str]] = None, limit: int = 50, **filters: Any) -> List[Any]:
+        """
+        Up to ``limit`` alerts past the (created_at, id) key ``after`` that
+        match every ``field=value`` filter (None values are ignored)
+        """
+        start = 0 if after is None else bisect_right(self._keys, after)
+        bitmaps = self._filter_bitmaps(filters)
+        if bitmaps is None or start >= len(self._alerts):
+            return []
+        if not bitmaps:
+            return self._alerts[start:start + limit]
+
+        total_words = -(-len(self._alerts) // WORD_BITS)
+        positions: List[int] = []
+        word = start // WORD_BITS
+        while word < total_words and len(positions) < limit:
+            stop = min(word + SCAN_WORDS, total_words)
+            combined = bitmaps[0].window(word, stop).copy()
+            for bitmap in bitmaps[1:]:
+                combined &= bitmap.window(word, stop)
+            found = _set_bits(combined, word)
+            positions.extend(found[found >= start][:limit - len(positions)].tolist())
+            word = stop
+        return [self._alerts[p] for p in positions]
+
+
+class PostgresAlertWriter:
+    """
+    Mirrors alerts into the alerts table, which backs the per-product alert
+    reads when the database is enabled
+
+    Rows are keyed by the ``row_uuid`` of the alert id, which is also kept
+    in ``api_id``; rewriting an alert only updates its read/resolved flags.
+    """
+
+    COLUMNS = (
+        "id", "api_id", "type", "priority", "title", "message", "product_id", "competitor_id",
+        "threshold_value", "current_value", "is_read", "is_resolved", "created_at",
+    )
+
+    def __init__(self, pool: Any):
+        self.pool = pool
+
+    @staticmethod
+    def _record(alert: Any) -> Tuple[Any, ...]:
+        return (
+            row_uuid(alert.id),
+            alert.id,
+            alert.type.value,
+            alert.priority.value,
+            alert.title,
+            alert.message,
+            row_uuid(alert.product_id) if alert.product_id is not None else None,
+            row_uuid(alert.competitor_id) if alert.competitor_id is not None else None,
+            alert.threshold_value,
+            alert.current_value,
+            alert.is_read,
+            alert.is_resolved,
+            alert.created_at,
+        )
+
+    async def write(self, alerts: Iterable[Any]) -> int:
+        records = [self._record(alert) for alert in alerts]
+        if not records:
+            return 0
+        columns = ", ".join(self.COLUMNS)
+        placeholders = ", ".join(f"${i}" for i in range(1, len(self.COLUMNS) + 1))
+        async with self.pool.acquire() as conn:
+            await conn.executemany(
+                f"INSERT INTO alerts ({columns}) VALUES ({placeholders}) "
+                "ON CONFLICT (id) DO UPDATE SET is_read = EXCLUDED.is_read, is_resolved = EXCLUDED.is_resolved",
+                records,
+            )
+        return len(records)
+
+    async def update_status(self, alert: Any) -> None:
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                "UPDATE alerts SET is_read = $2, is_resolved = $3 WHERE id = $1",
+                row_uuid(alert.id), alert.is_read, alert.is_resolved,
+            )
@@ -0,0 +1,252 @@
+"""
+Result cache for computed endpoint payloads
+TTL + LRU cache with per-product tags for precise invalidation, backed
+either in-process or by Redis. Tags carry a generation, so a result
+computed while its product was invalidated is never stored.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+from collections import OrderedDict
+import json
+import logging
+import os
+import secrets
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def product_tag(product_id: str) -> str:
+    return f"product:{product_id}"
+
+
+class MemoryCacheBackend:
+    """
+    In-process cache bounded to ``max_entries`` with LRU eviction
+
+    Each tag has a generation, bumped on invalidation; a value computed
+    under an older generation is not stored.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        # key -> (expires_at, tag, value), least recently used first
+        self._entries: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._generations: Dict[str, int] = {}
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _forget(self, key: str) -> None:
+        _, tag, _ = self._entries.pop(key)
+        keys = self._tags.get(tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+    async def get(self, key: str, tag: str) -> Tuple[Optional[Any], Any]:
+        generation = self._generations.get(tag, 0)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, generation
+        if entry[0] <= time.monotonic():
+            self._forget(key)
+            self.expirations += 1
+            return None, generation
+        self._entries.move_to_end(key)
+        return entry[2], generation
+
+    async def set(self, key: str, value: Any, ttl: float, tag: str, generation: Any) -> None:
+        if generation != self._generations.get(tag, 0):
+            return
+        if key in self._entries:
+            self._forget(key)
+        self._entries[key] = (time.monotonic() + ttl, tag, value)
+        self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._forget(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        for tag in tags:
+            # Bumped even without entries: one may be computing right now
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+            for key in list(self._tags.get(tag, ())):
+                self._forget(key)
+                removed += 1
+        return removed
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class RedisCacheBackend:
+    """
+    Redis-backed cache
+
+    Each tag has a generation key holding a random token, and every entry
+    is stored with the token current when its computation started. An
+    entry whose token no longer matches is a miss, so invalidating a tag
+    is one SET and a value computed across an invalidation is never
+    served. Every key has a TTL (generation keys ``generation_ttl``,
+    refreshed on write), so memory is bounded by the TTLs and the
+    server's maxmemory policy may evict any of them: a lost generation key
+    only turns its entries into misses.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "smart_retail:cache:", generation_ttl: int = 86400):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+        self.generation_ttl = generation_ttl
+
+    def _generation_key(self, tag: str) -> str:
+        return self.prefix + "generation:" + tag
+
+    @staticmethod
+    def _token() -> str:
+        return secrets.token_hex(8)
+
+    async def get(self, key: str, tag: str) -> Tuple[Optional[Any], Any]:
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.get(self._generation_key(tag))
+            pipe.get(self.prefix + key)
+            generation, raw = await pipe.execute()
+        if generation is None:
+            # Entries written under a lost generation can never match a new token
+            generation = self._token().encode()
+            if not await self.client.set(self._generation_key(tag), generation, ex=self.generation_ttl, nx=True):
+                generation = await self.client.get(self._generation_key(tag))
+            return None, generation
+        if raw is None:
+            return None, generation
+        entry = json.loads(raw)
+        if entry["generation"] != generation.decode():
+            return None, generation
+        return entry["value"], generation
+
+    async def set(self, key: str, value: Any, ttl: float, tag: str, generation: Any) -> None:
+        if generation is None:
+            return
+        entry = {"generation": generation.decode(), "value": value}
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(self.prefix + key, json.dumps(entry), ex=max(1, int(ttl)))
+            pipe.expire(self._generation_key(tag), self.generation_ttl)
+            await pipe.execute()
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        tags = list(tags)
+        if not tags:
+            return 0
+        async with self.client.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.set(self._generation_key(tag), self._token(), ex=self.generation_ttl)
+            await pipe.execute()
+        return len(tags)
+
+    async def stats(self) -> Dict[str, Any]:
+        info = await self.client.info("stats")
+        return {
+            "evictions": info.get("evicted_keys", 0),
+            "expirations": info.get("expired_keys", 0),
+        }
+
+
+class ResultCache:
+    """
+    Namespaced cache of computed results keyed by product and parameters
+
+    Backend failures are logged and treated as misses so a cache outage
+    never fails a request.
+    """
+
+    def __init__(self, backend: Any, ttl: float = 60.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.counters = {"hits": 0, "misses": 0, "invalidations": 0, "errors": 0}
+
+    @staticmethod
+    def key(namespace: str, product_id: str, *params: Any) -> str:
+        return ":".join([namespace, product_id, *map(str, params)])
+
+    async def get_or_compute(
+        self,
+        namespace: str,
+        product_id: str,
+        params: Tuple[Any, ...],
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """Return the cached value or compute, store and return it"""
+        key = self.key(namespace, product_id, *params)
+        tag = product_tag(product_id)
+        try:
+            value, generation = await self.backend.get(key, tag)
+        except Exception as e:
+            logger.warning(f"Cache read failed: {str(e)}")
+            self.counters["errors"] += 1
+            value, generation = None, None
+        if value is not None:
+            self.counters["hits"] += 1
+            return value
+
+        self.counters["misses"] += 1
+        value = await compute()
+        if generation is None:
+            return value
+        try:
+            # Written under the generation read before computing: if the
+            # product was invalidated meanwhile, the value is never served
+            await self.backend.set(key, value, self.ttl, tag, generation)
+        except Exception as e:
+            logger.warning(f"Cache write failed: {str(e)}")
+            self.counters["errors"] += 1
+        return value
+
+    async def invalidate_products(self, product_ids: Iterable[str]) -> None:
+        """Drop every cached result for the given products"""
+        try:
+            self.counters["invalidations"] += await self.backend.invalidate_tags(
+                product_tag(product_id) for product_id in set(product_ids)
+            )
+        except Exception as e:
+            logger.warning(f"Cache invalidation failed: {str(e)}")
+            self.counters["errors"] += 1
+
+    async def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        stats = {
+            "backend": self.backend.name,
+            "ttl_seconds": self.ttl,
+            **self.counters,
+            "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+        }
+        try:
+            stats.update(await self.backend.stats())
+        except Exception as e:
+            logger.warning(f"Cache stats unavailable: {str(e)}")
+        return stats
+
+
+def create_cache_from_env() -> ResultCache:
+    """Build the result cache from CACHE_BACKEND, CACHE_TTL_SECONDS and CACHE_MAX_ENTRIES"""
+    ttl = float(os.getenv("CACHE_TTL_SECONDS", 60))
+    if os.getenv("CACHE_BACKEND", "memory") == "redis":
+        backend = RedisCacheBackend(os.getenv("REDIS_URL", "redis://localhost:6379"))
+    else:
+        backend = MemoryCacheBackend(int(os.getenv("CACHE_MAX_ENTRIES", 10000)))
+    return ResultCache(backend, ttl=ttl)
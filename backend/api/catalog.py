@@ -0,0 +1,282 @@
+"""
+Product catalog store
+In-memory catalog with a primary hash index on id, a unique index on sku
+and a secondary index on category
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from bisect import bisect_left, bisect_right
+from itertools import count
+from urllib.parse import urlparse
+
+from db import row_uuid
+
+
+def category_key(category: str) -> str:
+    """Case-insensitive key under which a category is indexed and matched"""
+    return category.lower()
+
+
+class DuplicateSKUError(ValueError):
+    """Raised when a product is added or updated with an SKU already in use"""
+
+    def __init__(self, sku: str):
+        super().__init__(f"Product with SKU '{sku}' already exists")
+        self.sku = sku
+
+
+class OrderedIdIndex:
+    """
+    Product ids in ascending ordinal order with lazy deletion, so the page
+    following any ordinal is located by binary search
+    """
+
+    def __init__(self):
+        self._ordinals: List[int] = []
+        self._ids: List[str] = []
+        self.members: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def add(self, product_id: str, ordinal: int) -> None:
+        self.members[product_id] = ordinal
+        if not self._ordinals or ordinal > self._ordinals[-1]:
+            self._ordinals.append(ordinal)
+            self._ids.append(product_id)
+            return
+        pos = bisect_left(self._ordinals, ordinal)
+        # Ordinals are unique per product, so an equal entry is our own tombstone
+        if pos < len(self._ordinals) and self._ordinals[pos] == ordinal:
+            return
+        self._ordinals.insert(pos, ordinal)
+        self._ids.insert(pos, product_id)
+
+    def discard(self, product_id: str) -> None:
+        if self.members.pop(product_id, None) is None:
+            return
+        if len(self._ids) > 2 * len(self.members) + 64:
+            self._compact()
+
+    def _compact(self) -> None:
+        live = [(o, pid) for o, pid in zip(self._ordinals, self._ids) if pid in self.members]
+        self._ordinals = [o for o, _ in live]
+        self._ids = [pid for _, pid in live]
+
+    def page(self, after: Optional[int] = None, skip: int = 0, limit: int = 10) -> List[Tuple[int, str]]:
+        """Return up to ``limit`` live (ordinal, id) pairs with ordinal > ``after``"""
+        pos = 0 if after is None else bisect_right(self._ordinals, after)
+        page: List[Tuple[int, str]] = []
+        while pos < len(self._ids) and len(page) < limit:
+            product_id = self._ids[pos]
+            if product_id in self.members:
+                if skip:
+                    skip -= 1
+                else:
+                    page.append((self._ordinals[pos], product_id))
+            pos += 1
+        return page
+
+
+class CatalogStore:
+    """
+    Indexed product catalog
+
+    Products are any objects exposing ``id``, ``sku`` and ``category``
+    attributes. Lookup, update and delete are O(1); category listing is
+    proportional to the size of the page returned. Every product gets a
+    monotonically increasing ordinal that serves as its keyset sort key.
+    """
+
+    def __init__(self, products: Iterable[Any] = (), id_prefix: str = "prod_"):
+        self.id_prefix = id_prefix
+        self._ids = count(1)
+        self._ordinals = count(1)
+        self._by_id: Dict[str, Any] = {}
+        self._by_sku: Dict[str, str] = {}
+        self._all = OrderedIdIndex()
+        self._by_category: Dict[str, OrderedIdIndex] = {}
+
+        for product in products:
+            self.add(product)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._by_id
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._by_id.values())
+
+    @staticmethod
+    def _category_key(category: str) -> str:
+        return category_key(category)
+
+    def next_id(self) -> str:
+        """Return a product id that has never been handed out or stored"""
+        while True:
+            candidate = f"{self.id_prefix}{next(self._ids)}"
+            if candidate not in self._by_id:
+                return candidate
+
+    def get(self, product_id: str) -> Optional[Any]:
+        return self._by_id.get(product_id)
+
+    def ordinal(self, product_id: str) -> Optional[int]:
+        """Keyset sort key of a product"""
+        return self._all.members.get(product_id)
+
+    def get_by_sku(self, sku: str) -> Optional[Any]:
+        product_id = self._by_sku.get(sku)
+        return self._by_id.get(product_id) if product_id else None
+
+    def add(self, product: Any) -> Any:
+        """Insert a product, assigning an id if it has none"""
+        if product.sku in self._by_sku:
+            raise DuplicateSKUError(product.sku)
+        if not product.id:
+            product.id = self.next_id()
+        elif product.id in self._by_id:
+            raise KeyError(f"Product id '{product.id}' already exists")
+
+        ordinal = next(self._ordinals)
+        self._by_id[product.id] = product
+        self._by_sku[product.sku] = product.id
+        self._all.add(product.id, ordinal)
+        self._category_index(self._category_key(product.category)).add(product.id, ordinal)
+        return product
+
+    def update(self, product_id: str, changes: Dict[str, Any]) -> Optional[Any]:
+        """Apply field changes to a product and keep the indexes in sync"""
+        product = self._by_id.get(product_id)
+        if product is None:
+            return None
+
+        new_sku = changes.get("sku", product.sku)
+        if new_sku != product.sku and new_sku in self._by_sku:
+            raise DuplicateSKUError(new_sku)
+
+        old_sku, old_category = product.sku, self._category_key(product.category)
+        for field, value in changes.items():
+            setattr(product, field, value)
+
+        if product.sku != old_sku:
+            del self._by_sku[old_sku]
+            self._by_sku[product.sku] = product_id
+        new_category = self._category_key(product.category)
+        if new_category != old_category:
+            self._discard_from_category(old_category, product_id)
+            self._category_index(new_category).add(product_id, self._all.members[product_id])
+        return product
+
+    def remove(self, product_id: str) -> Optional[Any]:
+        """Delete a product; returns the removed product or None"""
+        product = self._by_id.pop(product_id, None)
+        if product is None:
+            return None
+        self._by_sku.pop(product.sku, None)
+        self._all.discard(product_id)
+        self._discard_from_category(self._category_key(product.category), product_id)
+        return product
+
+    def _category_index(self, category: str) -> OrderedIdIndex:
+        index = self._by_category.get(category)
+        if index is None:
+            index = self._by_category[category] = OrderedIdIndex()
+        return index
+
+    def _discard_from_category(self, category: str, product_id: str) -> None:
+        index = self._by_category.get(category)
+        if index is None:
+            return
+        index.discard(product_id)
+        if not index:
+            del self._by_category[category]
+
+    def list(
+        self,
+        category: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 10,
+        after: Optional[int] = None,
+    ) -> List[Any]:
+        """
+        List products in creation order, optionally restricted to one category
+
+        ``after`` is the ordinal of the last product of the previous page.
+        """
+        if category is None:
+            index = self._all
+        else:
+            index = self._by_category.get(self._category_key(category))
+            if index is None:
+                return []
+        return [self._by_id[pid] for _, pid in index.page(after=after, skip=skip, limit=limit)]
+
+    def categories(self) -> Dict[str, int]:
+        """Product counts per (lower-cased) category"""
+        return {category: len(index) for category, index in self._by_category.items()}
+
+
+class PostgresCatalogWriter:
+    """
+    Mirrors products and competitors into their tables, so rows that
+    reference them (price_history, ai_insights) satisfy the foreign keys
+
+    API ids are written as their ``row_uuid``. Products are upserted through
+    a session temp table, like ticks; deleted products are only deactivated
+    because their price history still references them.
+    """
+
+    PRODUCT_COLUMNS = ("id", "name", "description", "category", "url", "sku", "is_active")
+
+    def __init__(self, pool: Any):
+        self.pool = pool
+
+    async def write_products(self, products: Iterable[Any]) -> int:
+        records = [
+            (row_uuid(p.id), p.name, p.description, p.category, "", p.sku, True)
+            for p in products
+        ]
+        if not records:
+            return 0
+        columns = ", ".join(self.PRODUCT_COLUMNS)
+        updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in self.PRODUCT_COLUMNS[1:])
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    "CREATE TEMP TABLE IF NOT EXISTS products_staging "
+                    "(LIKE products INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+                )
+                await conn.copy_records_to_table(
+                    "products_staging", records=records, columns=list(self.PRODUCT_COLUMNS)
+                )
+                await conn.execute(
+                    f"INSERT INTO products ({columns}) SELECT {columns} FROM products_staging "
+                    f"ON CONFLICT (id) DO UPDATE SET {updates}"
+                )
+        return len(records)
+
+    async def deactivate_product(self, product_id: str) -> None:
+        async with self.pool.acquire() as conn:
+            await conn.execute("UPDATE products SET is_active = false WHERE id = $1", row_uuid(product_id))
+
+    @staticmethod
+    def _domain(competitor: Any) -> str:
+        # domain is unique and required; without a website the id stands in
+        website = competitor.website or ""
+        host = urlparse(website if "//" in website else f"//{website}").hostname
+        return host or competitor.id
+
+    async def write_competitors(self, competitors: Iterable[Any]) -> int:
+        records = [(row_uuid(c.id), c.name, self._domain(c)) for c in competitors]
+        if not records:
+            return 0
+        async with self.pool.acquire() as conn:
+            await conn.executemany(
+                "INSERT INTO competitors (id, name, domain) VALUES ($1, $2, $3) "
+                "ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name, domain = EXCLUDED.domain",
+                records,
+            )
+        return len(records)
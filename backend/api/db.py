@@ -0,0 +1,184 @@
+"""
+Async Postgres data-access layer
+asyncpg connection pool shared by the database writers, prepared
+statements for the hot read queries, plus pool health and saturation
+statistics
+"""
+
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+# Namespace of the UUIDs that stand in for the API's string ids (prod_1,
+# comp_1, ...) in the UUID key columns of the schema
+API_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, "api.smartretail.com")
+
+
+def row_uuid(api_id: str) -> uuid.UUID:
+    """Database id of an API id; ids that already are UUIDs are kept"""
+    try:
+        return uuid.UUID(api_id)
+    except ValueError:
+        return uuid.uuid5(API_ID_NAMESPACE, api_id)
+
+
+# Hot read queries, prepared on each connection the first time it runs them
+HOT_QUERIES: Dict[str, str] = {
+    "latest_prices": """
+        SELECT DISTINCT ON (product_id) product_id, price, currency, timestamp
+        FROM price_history
+        WHERE product_id = ANY($1::uuid[]) AND competitor_id IS NULL
+        ORDER BY product_id, timestamp DESC
+    """,
+    "product_alerts": """
+        SELECT api_id, type, priority, title, message, competitor_id,
+               threshold_value, current_value, is_read, is_resolved, created_at
+        FROM alerts
+        WHERE product_id = $1 AND is_resolved = $2 AND ($3::boolean IS NULL OR is_read = $3)
+        ORDER BY created_at DESC, api_id DESC
+        LIMIT $4
+    """,
+}
+
+
+class DatabaseConfig(BaseModel):
+    url: str
+    min_size: int = Field(2, ge=0)
+    max_size: int = Field(10, ge=1)
+    acquire_timeout: float = Field(5.0, gt=0, description="Seconds to wait for a free connection")
+    command_timeout: float = Field(30.0, gt=0)
+    max_inactive_connection_lifetime: float = 300.0
+    # Statements, HOT_QUERIES included, are prepared the first time a
+    # connection runs them and kept in this per-connection cache, so nothing
+    # is prepared at connect time
+    statement_cache_size: int = 256
+
+    @classmethod
+    def from_env(cls) -> Optional["DatabaseConfig"]:
+        """Build a config from DATABASE_URL and DB_POOL_* variables, if set"""
+        url = os.getenv("DATABASE_URL")
+        if not url:
+            return None
+        return cls(
+            url=url,
+            min_size=int(os.getenv("DB_POOL_MIN_SIZE", 2)),
+            max_size=int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+            acquire_timeout=float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", 5.0)),
+            command_timeout=float(os.getenv("DB_COMMAND_TIMEOUT", 30.0)),
+        )
+
+
+class Database:
+    """Pooled asyncpg access with the hot read queries and pool stats"""
+
+    def __init__(self, config: DatabaseConfig):
+        self.config = config
+        self.pool = None
+        self._in_use = 0
+        self._counters = {
+            "acquired": 0,
+            "acquire_timeouts": 0,
+            "peak_in_use": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    async def connect(self) -> None:
+        import asyncpg
+
+        self.pool = await asyncpg.create_pool(
+            self.config.url,
+            min_size=self.config.min_size,
+            max_size=self.config.max_size,
+            command_timeout=self.config.command_timeout,
+            max_inactive_connection_lifetime=self.config.max_inactive_connection_lifetime,
+            statement_cache_size=self.config.statement_cache_size,
+        )
+        logger.info("Connected to Postgres (pool %d-%d)", self.config.min_size, self.config.max_size)
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Any]:
+        """Acquire a pooled connection, recording wait time and saturation"""
+        if self.pool is None:
+            raise RuntimeError("Database is not connected")
+        started = time.perf_counter()
+        try:
+            conn = await self.pool.acquire(timeout=self.config.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._counters["acquire_timeouts"] += 1
+            raise
+        waited = time.perf_counter() - started
+        self._counters["acquired"] += 1
+        self._counters["wait_seconds_total"] += waited
+        self._counters["wait_seconds_max"] = max(self._counters["wait_seconds_max"], waited)
+        self._in_use += 1
+        self._counters["peak_in_use"] = max(self._counters["peak_in_use"], self._in_use)
+        try:
+            yield conn
+        finally:
+            self._in_use -= 1
+            await self.pool.release(conn)
+
+    async def fetch_hot(self, name: str, *args) -> List[Any]:
+        """Run one of HOT_QUERIES through the connection's prepared statement"""
+        async with self.acquire() as conn:
+            return await conn.fetch(HOT_QUERIES[name], *args)
+
+    # Hot queries
+
+    async def get_latest_prices(self, product_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """Latest own price per product, keyed by API id; products without one are left out"""
+        api_ids = {row_uuid(product_id): product_id for product_id in product_ids}
+        rows = await self.fetch_hot("latest_prices", list(api_ids))
+        return {api_ids[row["product_id"]]: dict(row) for row in rows}
+
+    async def get_product_alerts(self, product_id: str, resolved: bool = False, read: Optional[bool] = None,
+                                 limit: int = 50) -> List[Dict[str, Any]]:
+        """A product's alerts by status, newest first"""
+        rows = await self.fetch_hot("product_alerts", row_uuid(product_id), resolved, read, limit)
+        return [dict(row) for row in rows]
+
+    # Health
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size, utilisation and acquire latency counters"""
+        if self.pool is None:
+            return {"status": "disconnected"}
+        size = self.pool.get_size()
+        max_size = self.pool.get_max_size()
+        acquired = self._counters["acquired"]
+        return {
+            "status": "connected",
+            "size": size,
+            "idle": self.pool.get_idle_size(),
+            "min_size": self.pool.get_min_size(),
+            "max_size": max_size,
+            "in_use": self._in_use,
+            "saturation": round(self._in_use / max_size, 3),
+            "acquired": acquired,
+            "acquire_timeouts": self._counters["acquire_timeouts"],
+            "peak_in_use": self._counters["peak_in_use"],
+            "avg_wait_ms": round(self._counters["wait_seconds_total"] / acquired * 1000, 3) if acquired else 0.0,
+            "max_wait_ms": round(self._counters["wait_seconds_max"] * 1000, 3),
+        }
+
+    async def ping(self) -> bool:
+        try:
+            async with self.acquire() as conn:
+                return await conn.fetchval("SELECT 1") == 1
+        except Exception as e:
+            logger.warning(f"Database ping failed: {str(e)}")
+            return False
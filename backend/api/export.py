@@ -0,0 +1,137 @@
+"""
+Streaming price-history export
+Encoders turn PriceBatch chunks from PriceHistoryStore.scan into NDJSON,
+CSV or Arrow IPC bytes, so an export is produced in constant memory and
+starts sending before the full result is known
+"""
+
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List
+from enum import Enum
+import asyncio
+import csv
+import io
+import json
+import numpy as np
+
+from price_history import PriceBatch
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow output is optional
+    pa = None
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+    ARROW = "arrow"
+
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.ARROW: "application/vnd.apache.arrow.stream",
+}
+
+EXPORT_COLUMNS = ("id", "product_id", "competitor_id", "price", "timestamp", "source")
+
+
+def arrow_available() -> bool:
+    return pa is not None
+
+
+def _columns(batch: PriceBatch) -> Dict[str, List]:
+    """Python-level columns for the text encoders"""
+    return {
+        "id": [f"price_{seq}" for seq in batch.seq.tolist()],
+        "price": batch.price.tolist(),
+        "timestamp": np.datetime_as_string(batch.ts.astype("datetime64[us]")).tolist(),
+        "source": "internal" if batch.competitor_id is None else "competitor",
+    }
+
+
+def encode_ndjson(batches: Iterable[PriceBatch]) -> Iterator[bytes]:
+    for batch in batches:
+        columns = _columns(batch)
+        lines = [
+            json.dumps({
+                "id": row_id,
+                "product_id": batch.product_id,
+                "competitor_id": batch.competitor_id,
+                "price": price,
+                "timestamp": timestamp,
+                "source": columns["source"],
+            })
+            for row_id, price, timestamp in zip(columns["id"], columns["price"], columns["timestamp"])
+        ]
+        lines.append("")
+        yield "\n".join(lines).encode()
+
+
+def encode_csv(batches: Iterable[PriceBatch]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        columns = _columns(batch)
+        competitor_id = batch.competitor_id or ""
+        writer.writerows(
+            (row_id, batch.product_id, competitor_id, price, timestamp, columns["source"])
+            for row_id, price, timestamp in zip(columns["id"], columns["price"], columns["timestamp"])
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only when nothing matched
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def encode_arrow(batches: Iterable[PriceBatch]) -> Iterator[bytes]:
+    """Arrow IPC stream with one record batch per chunk"""
+    if pa is None:
+        raise RuntimeError("Arrow export requires pyarrow")
+    schema = pa.schema([
+        ("id", pa.string()),
+        ("product_id", pa.string()),
+        ("competitor_id", pa.string()),
+        ("price", pa.float64()),
+        ("timestamp", pa.timestamp("us")),
+        ("source", pa.string()),
+    ])
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in batches:
+            size = len(batch.seq)
+            writer.write_batch(pa.record_batch([
+                pa.array([f"price_{seq}" for seq in batch.seq.tolist()], pa.string()),
+                pa.array([batch.product_id] * size, pa.string()),
+                pa.array([batch.competitor_id] * size, pa.string()),
+                pa.array(batch.price, pa.float64()),
+                pa.array(batch.ts, pa.int64()).cast(pa.timestamp("us")),
+                pa.array(["internal" if batch.competitor_id is None else "competitor"] * size, pa.string()),
+            ], schema=schema))
+            yield _drain(sink)
+    yield _drain(sink)
+
+
+ENCODERS: Dict[ExportFormat, Callable[[Iterable[PriceBatch]], Iterator[bytes]]] = {
+    ExportFormat.NDJSON: encode_ndjson,
+    ExportFormat.CSV: encode_csv,
+    ExportFormat.ARROW: encode_arrow,
+}
+
+
+async def stream_export(batches: Iterable[PriceBatch], fmt: ExportFormat) -> AsyncIterator[bytes]:
+    """Encode batches lazily, yielding to the event loop between chunks"""
+    for chunk in ENCODERS[fmt](batches):
+        if chunk:
+            yield chunk
+        await asyncio.sleep(0)
@@ -0,0 +1,196 @@
+"""
+Bulk price-tick ingestion
+Ticks are buffered in an async micro-batch queue and flushed by size or
+time, with backpressure once the queue is full
+"""
+
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+import uuid
+
+from db import row_uuid
+
+logger = logging.getLogger(__name__)
+
+# (product_id, competitor_id, timestamp in microseconds, price, source)
+Tick = Tuple[str, Optional[str], int, float, str]
+TickKey = Tuple[str, Optional[str], int]
+
+
+class QueueFullError(Exception):
+    """Raised when a submission would exceed the ingest queue capacity"""
+
+
+def tick_key(tick: Tick) -> TickKey:
+    return tick[0], tick[1], tick[2]
+
+
+class TickBatcher:
+    """
+    Micro-batching queue in front of a flush coroutine
+
+    ``submit`` is synchronous and O(len(ticks)); a background task hands
+    batches of up to ``max_batch_size`` ticks to ``flush`` whenever that
+    many are queued or ``max_delay`` seconds have passed. A batch whose
+    flush fails is requeued and retried on the next wakeup; after
+    ``max_attempts`` failures it is moved to ``dead_letters``.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List[Tick]], Awaitable[None]],
+        max_batch_size: int = 5000,
+        max_delay: float = 0.25,
+        max_pending: int = 200_000,
+        max_attempts: int = 3,
+        max_dead_letters: int = 100_000,
+    ):
+        self._flush = flush
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        # Ticks given up on, newest kept, for inspection or replay
+        self.dead_letters: Deque[Tick] = deque(maxlen=max_dead_letters)
+        # Consecutive failed flushes of the batch at the head of the buffer
+        self._attempts = 0
+        self._buffer: List[Tick] = []
+        # Keys of queued and in-flight ticks, for duplicate detection
+        self._pending: Set[TickKey] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.stats: Dict[str, int] = {"accepted": 0, "flushed": 0, "retried": 0, "dead_lettered": 0, "batches": 0}
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def is_pending(self, key: TickKey) -> bool:
+        return key in self._pending
+
+    def submit(self, ticks: List[Tick]) -> None:
+        """Queue ticks for the next flush or raise QueueFullError"""
+        if len(self._buffer) + len(ticks) > self.max_pending:
+            raise QueueFullError(f"Ingest queue full ({len(self._buffer)} ticks pending)")
+        self._ensure_started()
+        self._buffer.extend(ticks)
+        self._pending.update(tick_key(tick) for tick in ticks)
+        self.stats["accepted"] += len(ticks)
+        if len(self._buffer) >= self.max_batch_size:
+            self._wakeup.set()
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done() or self._stopping:
+            self._wakeup = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def start(self) -> None:
+        self._ensure_started()
+
+    async def stop(self) -> None:
+        """Stop the background task and flush whatever is still queued"""
+        if self._task is not None:
+            # The task exits at its next wakeup rather than being cancelled:
+            # on 3.11 wait_for() drops a cancel that races with the event.
+            # Shielded, so cancelling the caller leaves the final flush running
+            self._stopping = True
+            self._wakeup.set()
+            await asyncio.shield(self._task)
+            self._task = None
+        # Each failed pass counts towards max_attempts, so this ends
+        while self._buffer:
+            await self.drain()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.max_delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.drain()
+
+    async def drain(self) -> None:
+        """
+        Flush queued ticks in batches of at most ``max_batch_size``, stopping
+        at the first batch that fails and is requeued
+        """
+        while self._buffer:
+            batch = self._buffer[:self.max_batch_size]
+            del self._buffer[:self.max_batch_size]
+            try:
+                await self._flush(batch)
+            except asyncio.CancelledError:
+                # Requeue, so the next drain flushes the batch again
+                self._buffer[:0] = batch
+                raise
+            except Exception:
+                self._attempts += 1
+                if self._attempts < self.max_attempts:
+                    logger.exception(
+                        "Failed to flush %d price ticks (attempt %d of %d), retrying",
+                        len(batch), self._attempts, self.max_attempts,
+                    )
+                    self._buffer[:0] = batch
+                    self.stats["retried"] += len(batch)
+                    return
+                logger.exception("Failed to flush %d price ticks, moving them to dead letters", len(batch))
+                self.dead_letters.extend(batch)
+                self.stats["dead_lettered"] += len(batch)
+            else:
+                self.stats["flushed"] += len(batch)
+            self._attempts = 0
+            self.stats["batches"] += 1
+            self._pending.difference_update(tick_key(tick) for tick in batch)
+
+
+class PostgresTickWriter:
+    """
+    Bulk writer for the price_history table
+
+    Each batch is COPYed into a session temp table and moved into
+    price_history with a single INSERT ... ON CONFLICT DO NOTHING, so
+    duplicates are skipped server-side without one round trip per row.
+    Product and competitor ids are written as their ``row_uuid``.
+    """
+
+    COLUMNS = ("id", "product_id", "competitor_id", "timestamp", "price", "source")
+
+    def __init__(self, pool: Any):
+        self.pool = pool
+
+    async def write(self, batch: List[Tick], to_datetime: Callable[[int], Any]) -> List[Tick]:
+        """Write a batch and return the ticks actually inserted, in batch order"""
+        # Row ids are assigned here so RETURNING tells which ticks were new
+        ids = [uuid.uuid4() for _ in batch]
+        records = [
+            (
+                row_id,
+                row_uuid(product_id),
+                row_uuid(competitor_id) if competitor_id is not None else None,
+                to_datetime(ts),
+                price,
+                source,
+            )
+            for row_id, (product_id, competitor_id, ts, price, source) in zip(ids, batch)
+        ]
+        columns = ", ".join(self.COLUMNS)
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    "CREATE TEMP TABLE IF NOT EXISTS price_history_staging "
+                    "(LIKE price_history INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+                )
+                await conn.copy_records_to_table(
+                    "price_history_staging", records=records, columns=list(self.COLUMNS)
+                )
+                rows = await conn.fetch(
+                    f"INSERT INTO price_history ({columns}) "
+                    f"SELECT {columns} FROM price_history_staging "
+                    "ON CONFLICT DO NOTHING RETURNING id"
+                )
+        inserted = {row["id"] for row in rows}
+        return [tick for row_id, tick in zip(ids, batch) if row_id in inserted]
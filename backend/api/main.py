@@ -5,13 +5,42 @@ Comprehensive FastAPI backend with Swagger documentation
 
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
-from fastapi import FastAPI, HTTPException, Depends, Query, Body, Path
+from fastapi import FastAPI, HTTPException, Depends, Query, Body, Path, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+import asyncio
 import logging
+import math
 from enum import Enum
 
+from catalog import CatalogStore, DuplicateSKUError, PostgresCatalogWriter, category_key
+from matching import ProductMatcher
+from search import ProductSearchIndex
+from price_history import PriceHistoryStore, PriceRows, from_micros, isoformat_micros, percent_change, to_micros
+from rollups import RollupStore, SqlRollupWriter
+from ingest import PostgresTickWriter, QueueFullError, TickBatcher
+from db import Database, DatabaseConfig, row_uuid
+from cache import create_cache_from_env
+from metrics import DashboardCounters
+from alerts import AlertStore, PostgresAlertWriter
+from alert_rules import AlertRuleEngine, PostgresRuleStore, Trigger
+from recommendations import (
+    PostgresInsightWriter,
+    RecommendationConfig,
+    RecommendationJobs,
+    products_frame,
+    recommend,
+    to_payloads,
+)
+from export import MEDIA_TYPES, ExportFormat, arrow_available, stream_export
+from serialization import ResponseConfig, dumps, json_response
+from pagination import (
+    NEXT_CURSOR_HEADER, InvalidCursorError, decode_cursor, next_cursor, split_page
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -55,8 +84,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+def _json_safe(value: Any) -> Any:
+    """``value`` with non-finite floats written as strings, which JSON cannot hold"""
+    if isinstance(value, float) and not math.isfinite(value):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: _json_safe(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_json_safe(item) for item in value]
+    return value
+
+@app.exception_handler(RequestValidationError)
+async def request_validation_error_handler(request, exc: RequestValidationError):
+    """FastAPI's 422 body, made encodable when the echoed input holds Infinity or NaN"""
+    return JSONResponse(status_code=422, content={"detail": _json_safe(jsonable_encoder(exc.errors()))})
+
 # Enums
 class AlertType(str, Enum):
     PRICE_DROP = "price_drop"
@@ -70,6 +115,11 @@ class AlertPriority(str, Enum):
     HIGH = "high"
     CRITICAL = "critical"
 
+class ProductSort(str, Enum):
+    RELEVANCE = "relevance"
+    PRICE_ASC = "price_asc"
+    PRICE_DESC = "price_desc"
+
 class TimeFrame(str, Enum):
     HOURLY = "hourly"
     DAILY = "daily"
@@ -111,6 +161,52 @@ class PriceHistory(BaseModel):
     timestamp: datetime
     source: str = Field(..., description="Data source (internal, competitor, etc.)")
 
+class PriceTick(BaseModel):
+    product_id: str
+    competitor_id: Optional[str] = None
+    # Bounded by the price_history columns, DECIMAL(10,2) and VARCHAR(50),
+    # so one tick cannot abort the COPY of its whole batch
+    price: float = Field(..., gt=0, lt=10**8, allow_inf_nan=False)
+    timestamp: Optional[datetime] = None
+    source: Optional[str] = Field(None, max_length=50)
+
+class IngestResult(BaseModel):
+    accepted: int
+    duplicates: int
+    rejected: int
+    errors: List[Dict[str, Any]] = Field(default_factory=list, description="First rejected ticks with reasons")
+
+class ProductSearchHit(BaseModel):
+    product: Product
+    score: float = Field(..., description="BM25 relevance, boosted for SKU matches; 0 without a query")
+
+class ProductSearchResponse(BaseModel):
+    total: int
+    hits: List[ProductSearchHit]
+    facets: Dict[str, Dict[str, int]] = Field(..., description="Match counts by category and by price_band")
+
+class SearchResultItem(BaseModel):
+    title: str
+    link: str = ""
+    seller: Optional[str] = None
+
+class ProductMatchRequest(BaseModel):
+    results: List[SearchResultItem] = Field(..., min_length=1, max_length=5000)
+    limit: int = Field(1, ge=1, le=10, description="Candidate products returned per result")
+    min_score: Optional[float] = Field(None, ge=0, le=1, description="Defaults to the matcher's threshold")
+
+class ProductMatch(BaseModel):
+    product_id: str
+    sku: str
+    name: str
+    score: float = Field(..., description="1.0 for an SKU found in the title or link")
+    method: str = Field(..., description="sku or tokens")
+
+class SearchResultMatches(BaseModel):
+    title: str
+    link: str
+    matches: List[ProductMatch]
+
 class Competitor(BaseModel):
     id: Optional[str] = None
     name: str = Field(..., description="Competitor name")
@@ -142,11 +238,36 @@ class Alert(BaseModel):
 class AlertCreate(BaseModel):
     type: AlertType
     priority: AlertPriority
-    title: str
+    # Bounded by the alerts columns: VARCHAR(255) and DECIMAL(10,2)
+    title: str = Field(..., max_length=255)
     message: str
     product_id: Optional[str] = None
     competitor_id: Optional[str] = None
-    threshold_value: Optional[float] = None
+    threshold_value: Optional[float] = Field(None, gt=-10**8, lt=10**8, allow_inf_nan=False)
+
+class LatestPrice(BaseModel):
+    product_id: str
+    price: float
+    currency: str = "USD"
+    timestamp: datetime
+
+class ThresholdDirection(str, Enum):
+    BELOW = "below"
+    ABOVE = "above"
+
+class AlertRuleCreate(BaseModel):
+    product_id: Optional[str] = Field(None, description="Product the rule applies to")
+    category: Optional[str] = Field(None, max_length=255, description="Category the rule applies to, instead of a product")
+    competitor_id: Optional[str] = Field(None, description="Only evaluate this competitor's prices")
+    direction: ThresholdDirection
+    # Bounded by the alert_rules columns: DECIMAL(10,2) and INTEGER
+    threshold: float = Field(..., gt=0, lt=10**8, allow_inf_nan=False)
+    priority: AlertPriority = AlertPriority.MEDIUM
+    cooldown_seconds: int = Field(3600, ge=0, lt=2**31, description="Minimum time between alerts for the same series")
+
+class AlertRule(AlertRuleCreate):
+    id: Optional[str] = None
+    created_at: Optional[datetime] = None
 
 class MarketInsight(BaseModel):
     id: Optional[str] = None
@@ -197,6 +318,15 @@ MOCK_PRODUCTS = [
     ),
 ]
 
+# Indexed catalog store seeded with the mock products
+catalog = CatalogStore(MOCK_PRODUCTS)
+
+# Token and SKU index linking scraped search results to catalog products
+product_matcher = ProductMatcher(catalog)
+
+# Full-text, SKU and price index behind /products/search
+product_search = ProductSearchIndex(catalog)
+
 MOCK_COMPETITORS = [
     Competitor(
         id="comp_1",
@@ -231,6 +361,236 @@ MOCK_ALERTS = [
     ),
 ]
 
+# Alerts in created_at order with bitmap indexes on the filter fields
+alert_store = AlertStore(MOCK_ALERTS)
+
+# Dashboard aggregates maintained by the write endpoints
+dashboard_counters = DashboardCounters()
+dashboard_counters.rebuild(len(catalog), len(MOCK_COMPETITORS), alert_store)
+
+def _fire_alert(trigger: Trigger):
+    """Turn a threshold rule trigger into an alert"""
+    rule = trigger.rule
+    product = catalog.get(trigger.product_id)
+    if trigger.competitor_id is not None:
+        alert_type = AlertType.COMPETITOR_PRICE
+        competitor = next((c for c in MOCK_COMPETITORS if c.id == trigger.competitor_id), None)
+        source = competitor.name if competitor else trigger.competitor_id
+    else:
+        alert_type = AlertType.PRICE_DROP if rule.direction == ThresholdDirection.BELOW else AlertType.MARKET_TREND
+        source = "Internal"
+    alert = Alert(
+        id=f"alert_{len(alert_store) + 1}",
+        type=alert_type,
+        priority=rule.priority,
+        title=f"Price {rule.direction.value} threshold",
+        message=f"{source} price for {product.name if product else trigger.product_id} "
+                f"moved {rule.direction.value} {rule.threshold:.2f} to {trigger.price:.2f}",
+        product_id=trigger.product_id,
+        competitor_id=trigger.competitor_id,
+        threshold_value=rule.threshold,
+        current_value=trigger.price,
+        created_at=datetime.now()
+    )
+    alert_store.add(alert)
+    dashboard_counters.alert_created(alert)
+    if alert_writer is not None:
+        unwritten_alerts.append(alert)
+
+def _product_category(product_id: str) -> Optional[str]:
+    product = catalog.get(product_id)
+    return product.category if product else None
+
+# Threshold rules evaluated against every tick appended to the price history
+alert_rules = AlertRuleEngine(_fire_alert, category_of=_product_category, category_key=category_key)
+
+# Columnar price-history store with OHLC rollups maintained per tick chunk
+price_history = PriceHistoryStore()
+price_rollups = RollupStore()
+price_history.add_listener(price_rollups.on_ticks)
+price_history.add_listener(alert_rules.on_ticks)
+
+def _seed_price_history():
+    """Populate the price-history store with mock ticks"""
+    now = datetime.now()
+    for product in MOCK_PRODUCTS:
+        timestamps = [now - timedelta(days=30 - i) for i in range(30)] + [now]
+        prices = [product.price - (30 - i) * 0.5 + (i % 3) for i in range(30)] + [product.price]
+        price_history.append(product.id, None, timestamps, prices)
+        for competitor, factor in zip(MOCK_COMPETITORS, (0.95, 1.02)):
+            timestamps = [now - timedelta(days=7 - i) for i in range(7)]
+            prices = [round(product.price * factor + i * 2.5, 2) for i in range(7)]
+            price_history.append(product.id, competitor.id, timestamps, prices)
+
+_seed_price_history()
+
+# Sales metric rollups behind /analytics/trends; value = bucket sum or mean
+TREND_METRICS = {"revenue": "sum", "volume": "sum", "margin": "mean"}
+metric_rollups = RollupStore()
+
+def _seed_sales_metrics():
+    """Populate the sales metric rollups with 30 days of mock data"""
+    now = datetime.now()
+    timestamps = [to_micros(now - timedelta(days=30 - i)) for i in range(30)]
+    revenue = [1000 + (i * 50) + (i % 7 * 100) for i in range(30)]
+    metric_rollups.add("revenue", timestamps, revenue)
+    metric_rollups.add("volume", timestamps, [value // 100 for value in revenue])
+    metric_rollups.add("margin", timestamps, [23.5 + (i % 5) * 0.3 for i in range(30)])
+
+_seed_sales_metrics()
+
+# Pooled Postgres access, enabled when DATABASE_URL is configured
+db_config = DatabaseConfig.from_env()
+database: Optional[Database] = Database(db_config) if db_config else None
+
+# Cache for price analysis and recommendations, invalidated per product
+result_cache = create_cache_from_env()
+
+# Products and competitors mirrored into Postgres, which the price and
+# insight rows reference, when the database is enabled
+catalog_writer: Optional[PostgresCatalogWriter] = PostgresCatalogWriter(database) if database else None
+
+# Micro-batched price-tick ingestion; ticks are also written to Postgres
+# when the database is enabled
+tick_writer: Optional[PostgresTickWriter] = PostgresTickWriter(database) if database else None
+rollup_writer: Optional[SqlRollupWriter] = SqlRollupWriter(database) if database else None
+
+# Alerts mirrored into Postgres, which then serves the per-product alert
+# reads, when the database is enabled; rule alerts fired while applying a
+# tick batch are written with it
+alert_writer: Optional[PostgresAlertWriter] = PostgresAlertWriter(database) if database else None
+unwritten_alerts: List[Alert] = []
+
+# Threshold rules kept in Postgres and re-registered at startup when the
+# database is enabled
+rule_store: Optional[PostgresRuleStore] = PostgresRuleStore(database) if database else None
+
+async def _load_alert_rules():
+    """Register the stored rules whose product and competitor still exist"""
+    products = {row_uuid(product.id): product.id for product in catalog}
+    competitors = {row_uuid(c.id): c.id for c in MOCK_COMPETITORS}
+    for row in await rule_store.load():
+        product_id = products.get(row["product_id"]) if row["product_id"] is not None else None
+        competitor_id = competitors.get(row["competitor_id"]) if row["competitor_id"] is not None else None
+        if (row["product_id"] is not None and product_id is None) or (
+            row["competitor_id"] is not None and competitor_id is None
+        ):
+            continue
+        alert_rules.add_rule(AlertRule(
+            id=row.pop("api_id"),
+            **{**row, "product_id": product_id, "competitor_id": competitor_id}
+        ))
+
+async def _flush_ticks(batch):
+    """Apply a batch of ingested ticks to the store and the database"""
+    # A batch requeued after a cancelled flush may already be in the store
+    price_history.extend(tick for tick in batch if not price_history.has_tick(*tick[:3]))
+    await result_cache.invalidate_products(tick[0] for tick in batch)
+    if tick_writer is not None:
+        # Ticks the database already held (e.g. a retried batch) are left out
+        # of the rollups, which would otherwise count them twice
+        inserted = await tick_writer.write(batch, from_micros)
+        await rollup_writer.write(inserted)
+    if alert_writer is not None and unwritten_alerts:
+        fired = unwritten_alerts[:]
+        await alert_writer.write(fired)
+        del unwritten_alerts[:len(fired)]
+
+tick_batcher = TickBatcher(_flush_ticks)
+
+# Vectorized price recommendations; background runs are stored in ai_insights
+# when the database is enabled
+recommendation_config = RecommendationConfig.from_env()
+insight_writer: Optional[PostgresInsightWriter] = PostgresInsightWriter(database) if database else None
+recommendation_jobs = RecommendationJobs()
+recommendation_refresh: Optional[asyncio.Task] = None
+
+# Opt-in: list endpoints encode store rows directly instead of through models
+response_config = ResponseConfig.from_env()
+
+# Rejected ticks reported back per ingest request
+MAX_INGEST_ERRORS = 20
+
+@app.on_event("startup")
+async def startup():
+    if database is not None:
+        await database.connect()
+    if catalog_writer is not None:
+        await catalog_writer.write_competitors(MOCK_COMPETITORS)
+        await catalog_writer.write_products(catalog)
+    if alert_writer is not None:
+        await alert_writer.write(alert_store)
+    if rule_store is not None:
+        await _load_alert_rules()
+    await tick_batcher.start()
+    global recommendation_refresh
+    if recommendation_config.refresh_seconds:
+        recommendation_refresh = asyncio.create_task(_refresh_recommendations())
+
+@app.on_event("shutdown")
+async def shutdown():
+    if recommendation_refresh is not None:
+        recommendation_refresh.cancel()
+    await tick_batcher.stop()
+    if database is not None:
+        await database.close()
+
+def _parse_cursor(cursor: Optional[str], key_type=int, id_type=str):
+    """Decode a cursor query parameter, rejecting malformed tokens with 400"""
+    if cursor is None:
+        return None
+    try:
+        sort_key, row_id = decode_cursor(cursor)
+        return key_type(sort_key), id_type(row_id)
+    except (InvalidCursorError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _set_next_cursor(response: Response, page: list, has_more: bool, key) -> None:
+    """Expose the cursor of the following page through the response header"""
+    token = next_cursor(page, has_more, key)
+    if token:
+        response.headers[NEXT_CURSOR_HEADER] = token
+
+def _scan_page(rows: list, after: Optional[int], limit: int, predicate) -> tuple:
+    """Collect up to limit + 1 (position, row) pairs past ``after`` matching ``predicate``"""
+    matches = []
+    for position in range(0 if after is None else after + 1, len(rows)):
+        if predicate(rows[position]):
+            matches.append((position, rows[position]))
+            if len(matches) > limit:
+                break
+    return split_page(matches, limit)
+
+def _price_history_fields(row) -> Dict[str, Any]:
+    """PriceHistory fields, in model order, of a price-history store row"""
+    seq, product_id, competitor_id, price, timestamp = row
+    return {
+        "id": f"price_{seq}",
+        "product_id": product_id,
+        "competitor_id": competitor_id,
+        "price": price,
+        "timestamp": timestamp,
+        "source": "internal" if competitor_id is None else "competitor"
+    }
+
+def _to_price_history(row) -> PriceHistory:
+    """Build a PriceHistory model from a price-history store row"""
+    return PriceHistory(**_price_history_fields(row))
+
+def _price_history_response(rows: PriceRows, response: Optional[Response] = None) -> Response:
+    """Fast-mode body of a PriceHistory list, encoded straight from store columns"""
+    keys = rows.keys
+    body = dumps(
+        [
+            _price_history_fields((seq, *keys[owner], price, timestamp))
+            for owner, seq, price, timestamp in zip(
+                rows.owner.tolist(), rows.seq.tolist(), rows.price.tolist(), isoformat_micros(rows.ts)
+            )
+        ],
+        rows.price
+    )
+    return json_response(body, response)
+
 # API Endpoints
 
 @app.get("/", tags=["Root"])
@@ -252,24 +612,67 @@ async def health_check():
         "version": "1.0.0"
     }
 
+@app.get("/health/db", tags=["Health"])
+async def database_health():
+    """Connection pool health and saturation statistics"""
+    if database is None:
+        return {"status": "disabled"}
+    stats = database.stats()
+    stats["reachable"] = await database.ping() if database.pool is not None else False
+    return stats
+
+@app.get("/health/cache", tags=["Health"])
+async def cache_health():
+    """Result cache hit, miss and eviction counters"""
+    return await result_cache.stats()
+
 # Product Management Endpoints
 @app.get("/products", response_model=List[Product], tags=["Products"])
 async def get_products(
+    response: Response,
     skip: int = Query(0, ge=0, description="Number of records to skip"),
     limit: int = Query(10, ge=1, le=100, description="Maximum number of records to return"),
-    category: Optional[str] = Query(None, description="Filter by category")
+    category: Optional[str] = Query(None, description="Filter by category"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
 ):
     """Get all products with optional filtering and pagination"""
-    products = MOCK_PRODUCTS
-    if category:
-        products = [p for p in products if p.category.lower() == category.lower()]
-    
-    return products[skip:skip + limit]
+    after = _parse_cursor(cursor)
+    products, has_more = split_page(
+        catalog.list(
+            category=category or None,
+            skip=skip,
+            limit=limit + 1,
+            after=after[0] if after else None
+        ),
+        limit
+    )
+    _set_next_cursor(response, products, has_more, lambda p: (catalog.ordinal(p.id), p.id))
+    return products
+
+@app.get("/products/search", response_model=ProductSearchResponse, tags=["Products"])
+async def search_products(
+    q: str = Query("", max_length=200, description="Words to find in name, SKU, category or description; the last may be partial"),
+    category: Optional[str] = Query(None, description="Filter by category"),
+    min_price: Optional[float] = Query(None, ge=0, description="Minimum price"),
+    max_price: Optional[float] = Query(None, ge=0, description="Maximum price"),
+    sort: ProductSort = Query(ProductSort.RELEVANCE, description="Result order"),
+    skip: int = Query(0, ge=0, description="Number of records to skip"),
+    limit: int = Query(10, ge=1, le=100, description="Maximum number of records to return")
+):
+    """Search products with ranking and category/price-band facet counts"""
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=400, detail="min_price must not exceed max_price")
+    result = product_search.search(q, category, min_price, max_price, sort.value, skip, limit)
+    return ProductSearchResponse(
+        total=result.total,
+        hits=[ProductSearchHit(product=catalog.get(hit.product_id), score=hit.score) for hit in result.hits],
+        facets=result.facets
+    )
 
 @app.get("/products/{product_id}", response_model=Product, tags=["Products"])
 async def get_product(product_id: str = Path(..., description="Product ID")):
     """Get a specific product by ID"""
-    product = next((p for p in MOCK_PRODUCTS if p.id == product_id), None)
+    product = catalog.get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
@@ -278,12 +681,21 @@ async def get_product(product_id: str = Path(..., description="Product ID")):
 async def create_product(product: ProductCreate):
     """Create a new product"""
     new_product = Product(
-        id=f"prod_{len(MOCK_PRODUCTS) + 1}",
+        id=catalog.next_id(),
         **product.dict(),
         created_at=datetime.now(),
         updated_at=datetime.now()
     )
-    MOCK_PRODUCTS.append(new_product)
+    try:
+        catalog.add(new_product)
+    except DuplicateSKUError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    product_matcher.add(new_product)
+    product_search.add(new_product)
+    dashboard_counters.adjust(total_products=1)
+    price_history.record(new_product.id, new_product.price, timestamp=new_product.created_at)
+    if catalog_writer is not None:
+        await catalog_writer.write_products([new_product])
     return new_product
 
 @app.put("/products/{product_id}", response_model=Product, tags=["Products"])
@@ -292,88 +704,281 @@ async def update_product(
     product_update: ProductUpdate = Body(...)
 ):
     """Update an existing product"""
-    product = next((p for p in MOCK_PRODUCTS if p.id == product_id), None)
+    update_data = product_update.dict(exclude_unset=True)
+    update_data["updated_at"] = datetime.now()
+    product = catalog.update(product_id, update_data)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    
-    update_data = product_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(product, field, value)
-    product.updated_at = datetime.now()
+    if "name" in update_data:
+        product_matcher.update(product)
+    product_search.update(product)
+    if "price" in update_data:
+        price_history.record(product_id, product.price, timestamp=product.updated_at)
+    await result_cache.invalidate_products([product_id])
+    if catalog_writer is not None:
+        await catalog_writer.write_products([product])
     
     return product
 
 @app.delete("/products/{product_id}", tags=["Products"])
 async def delete_product(product_id: str = Path(..., description="Product ID")):
     """Delete a product"""
-    global MOCK_PRODUCTS
-    MOCK_PRODUCTS = [p for p in MOCK_PRODUCTS if p.id != product_id]
+    if catalog.remove(product_id) is not None:
+        dashboard_counters.adjust(total_products=-1)
+    product_matcher.remove(product_id)
+    product_search.remove(product_id)
+    price_history.drop_product(product_id)
+    price_rollups.drop_where(lambda key: key[0] == product_id)
+    removed_rules = alert_rules.drop_product(product_id)
+    await result_cache.invalidate_products([product_id])
+    if catalog_writer is not None:
+        await catalog_writer.deactivate_product(product_id)
+    if rule_store is not None:
+        await rule_store.delete(rule.id for rule in removed_rules)
     return {"message": "Product deleted successfully"}
 
+@app.post("/products/match", response_model=List[SearchResultMatches], tags=["Products"])
+async def match_search_results(request: ProductMatchRequest = Body(...)):
+    """Match scraped search results to catalog products by SKU and name similarity"""
+    response = []
+    for item in request.results:
+        matches = product_matcher.match(item.title, item.link, request.limit, request.min_score)
+        response.append(SearchResultMatches(
+            title=item.title,
+            link=item.link,
+            matches=[
+                ProductMatch(
+                    product_id=match.product_id,
+                    sku=match.sku,
+                    name=catalog.get(match.product_id).name,
+                    score=match.score,
+                    method=match.method,
+                )
+                for match in matches
+            ],
+        ))
+    return response
+
 # Price Analysis Endpoints
+def _build_price_analysis(product: Product, timeframe: TimeFrame) -> Dict[str, Any]:
+    """Compute the price analysis payload for a product"""
+    stats = price_history.analysis(product.id, product.price, timeframe.value)
+    for entry in stats["competitor_prices"]:
+        competitor = next((c for c in MOCK_COMPETITORS if c.id == entry["competitor_id"]), None)
+        entry["competitor"] = competitor.name if competitor else entry["competitor_id"]
+    
+    return jsonable_encoder(PriceAnalysis(product_id=product.id, **stats))
+
 @app.get("/products/{product_id}/price-analysis", response_model=PriceAnalysis, tags=["Price Analysis"])
 async def get_price_analysis(
     product_id: str = Path(..., description="Product ID"),
     timeframe: TimeFrame = Query(TimeFrame.DAILY, description="Analysis timeframe")
 ):
     """Get comprehensive price analysis for a product"""
-    product = next((p for p in MOCK_PRODUCTS if p.id == product_id), None)
+    product = catalog.get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Mock price analysis data
-    return PriceAnalysis(
-        product_id=product_id,
-        current_price=product.price,
-        avg_price=product.price * 0.98,
-        min_price=product.price * 0.85,
-        max_price=product.price * 1.15,
-        price_trend="stable",
-        competitor_prices=[
-            {"competitor": "Amazon", "price": product.price * 0.95},
-            {"competitor": "Best Buy", "price": product.price * 1.02}
-        ],
-        price_change_24h=-2.5,
-        price_change_7d=1.2,
-        price_change_30d=-0.8
-    )
+    async def compute():
+        return _build_price_analysis(product, timeframe)
+    
+    return await result_cache.get_or_compute("price_analysis", product_id, (timeframe.value,), compute)
+
+@app.get("/products/{product_id}/price-rollups", tags=["Price Analysis"])
+async def get_price_rollups(
+    product_id: str = Path(..., description="Product ID"),
+    timeframe: TimeFrame = Query(TimeFrame.DAILY, description="Bucket size"),
+    competitor_id: Optional[str] = Query(None, description="Competitor ID; internal prices when omitted"),
+    periods: int = Query(30, ge=1, le=1000, description="Number of most recent buckets")
+):
+    """Get pre-aggregated OHLC price buckets for a product"""
+    if product_id not in catalog:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    return {
+        "product_id": product_id,
+        "competitor_id": competitor_id,
+        "timeframe": timeframe,
+        "data": price_rollups.points((product_id, competitor_id), timeframe.value, periods)
+    }
+
+@app.get("/prices/latest", response_model=List[LatestPrice], tags=["Price Analysis"])
+async def get_latest_prices(
+    product_id: List[str] = Query(..., description="Product IDs; repeat the parameter for several")
+):
+    """Get the latest own price of each product; products without prices are left out"""
+    if len(product_id) > 500:
+        raise HTTPException(status_code=400, detail="At most 500 product IDs per request")
+    
+    if database is not None:
+        latest = await database.get_latest_prices(product_id)
+        return [LatestPrice(product_id=pid, **latest[pid]) for pid in product_id if pid in latest]
+    
+    prices = []
+    for pid in product_id:
+        series = price_history.series(pid, None)
+        latest = series.latest() if series is not None else None
+        if latest is not None:
+            prices.append(LatestPrice(product_id=pid, price=latest[1], timestamp=from_micros(latest[0])))
+    return prices
 
 @app.get("/price-history", response_model=List[PriceHistory], tags=["Price Analysis"])
 async def get_price_history(
+    response: Response,
     product_id: Optional[str] = Query(None, description="Filter by product ID"),
     competitor_id: Optional[str] = Query(None, description="Filter by competitor ID"),
     start_date: Optional[datetime] = Query(None, description="Start date for history"),
     end_date: Optional[datetime] = Query(None, description="End date for history"),
-    limit: int = Query(100, ge=1, le=1000, description="Maximum number of records")
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of records"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
 ):
     """Get price history data with filtering options"""
-    # Mock price history data
-    history = []
-    base_time = datetime.now() - timedelta(days=30)
-    
-    for i in range(min(limit, 30)):
-        history.append(PriceHistory(
-            id=f"price_{i}",
-            product_id=product_id or "prod_1",
+    after = _parse_cursor(cursor, int, int)
+    if response_config.fast_responses:
+        columns = price_history.query_columns(
+            product_id=product_id,
             competitor_id=competitor_id,
-            price=999.99 + (i * 0.5) - (i % 3),
-            timestamp=base_time + timedelta(days=i),
-            source="internal" if not competitor_id else "competitor"
-        ))
+            start_date=start_date,
+            end_date=end_date,
+            limit=limit + 1,
+            after=after
+        )
+        has_more = len(columns.seq) > limit
+        columns = columns.head(limit)
+        _set_next_cursor(
+            response, range(len(columns.seq)), has_more,
+            lambda i: (int(columns.ts[i]), int(columns.seq[i]))
+        )
+        return _price_history_response(columns, response)
+
+    rows, has_more = split_page(
+        price_history.query(
+            product_id=product_id,
+            competitor_id=competitor_id,
+            start_date=start_date,
+            end_date=end_date,
+            limit=limit + 1,
+            after=after
+        ),
+        limit
+    )
+    _set_next_cursor(response, rows, has_more, lambda row: (to_micros(row[4]), row[0]))
+    return [_to_price_history(row) for row in rows]
+
+@app.get("/price-history/export", tags=["Price Analysis"])
+async def export_price_history(
+    format: ExportFormat = Query(ExportFormat.NDJSON, description="Output format (ndjson, csv, arrow)"),
+    product_id: Optional[str] = Query(None, description="Filter by product ID"),
+    competitor_id: Optional[str] = Query(None, description="Filter by competitor ID"),
+    start_date: Optional[datetime] = Query(None, description="Start date for history"),
+    end_date: Optional[datetime] = Query(None, description="End date for history"),
+    chunk_size: int = Query(10000, ge=100, le=100000, description="Rows encoded per chunk")
+):
+    """
+    Stream price history in bulk
+
+    Rows are grouped by (product, competitor) and ordered by timestamp within
+    each group. The response is produced chunk by chunk in constant memory.
+    """
+    if format == ExportFormat.ARROW and not arrow_available():
+        raise HTTPException(status_code=501, detail="Arrow export requires pyarrow")
+    
+    batches = price_history.scan(
+        product_id=product_id,
+        competitor_id=competitor_id,
+        start_date=start_date,
+        end_date=end_date,
+        chunk_size=chunk_size
+    )
+    return StreamingResponse(
+        stream_export(batches, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="price_history.{format.value}"'}
+    )
+
+@app.post("/price-history/ingest", response_model=IngestResult, status_code=202, tags=["Price Analysis"])
+async def ingest_price_ticks(
+    ticks: List[Any] = Body(..., description="Array of price ticks")
+):
+    """
+    Bulk-ingest price ticks
+
+    Valid ticks are queued and written in micro-batches. Ticks repeating a
+    (product, competitor, timestamp) already stored or queued count as
+    duplicates; malformed ticks and unknown products or competitors are
+    rejected. Returns 429 when the ingest queue is full.
+    """
+    accepted, errors = [], []
+    duplicates = 0
+    seen = set()
+    now = datetime.now()
+    competitor_ids = {competitor.id for competitor in MOCK_COMPETITORS}
+    
+    for index, item in enumerate(ticks):
+        try:
+            tick = PriceTick(**item)
+        except ValidationError as e:
+            reasons = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            errors.append({"index": index, "error": reasons})
+            continue
+        except TypeError:
+            errors.append({"index": index, "error": "Tick must be an object"})
+            continue
+        if tick.product_id not in catalog:
+            errors.append({"index": index, "error": f"Unknown product '{tick.product_id}'"})
+            continue
+        if tick.competitor_id is not None and tick.competitor_id not in competitor_ids:
+            errors.append({"index": index, "error": f"Unknown competitor '{tick.competitor_id}'"})
+            continue
+        
+        ts = to_micros(tick.timestamp or now)
+        key = (tick.product_id, tick.competitor_id, ts)
+        if key in seen or tick_batcher.is_pending(key) or price_history.has_tick(*key):
+            duplicates += 1
+            continue
+        seen.add(key)
+        source = tick.source or ("internal" if tick.competitor_id is None else "competitor")
+        accepted.append((tick.product_id, tick.competitor_id, ts, tick.price, source))
+    
+    try:
+        tick_batcher.submit(accepted)
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, round(tick_batcher.max_delay)))}
+        )
     
-    return history
+    return IngestResult(
+        accepted=len(accepted),
+        duplicates=duplicates,
+        rejected=len(errors),
+        errors=errors[:MAX_INGEST_ERRORS]
+    )
+
+@app.get("/price-history/ingest/stats", tags=["Price Analysis"])
+async def get_ingest_stats():
+    """Counters of the ingest micro-batch queue"""
+    return {**tick_batcher.stats, "queued": len(tick_batcher), "dead_letters": len(tick_batcher.dead_letters)}
 
 # Competitor Management Endpoints
 @app.get("/competitors", response_model=List[Competitor], tags=["Competitors"])
 async def get_competitors(
+    response: Response,
     active_only: bool = Query(True, description="Filter by active status"),
-    limit: int = Query(10, ge=1, le=100, description="Maximum number of records")
+    limit: int = Query(10, ge=1, le=100, description="Maximum number of records"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
 ):
     """Get all competitors"""
-    competitors = MOCK_COMPETITORS
-    if active_only:
-        competitors = [c for c in competitors if c.active]
-    return competitors[:limit]
+    after = _parse_cursor(cursor)
+    page, has_more = _scan_page(
+        MOCK_COMPETITORS,
+        after[0] if after else None,
+        limit,
+        lambda c: c.active or not active_only
+    )
+    _set_next_cursor(response, page, has_more, lambda entry: (entry[0], entry[1].id))
+    return [competitor for _, competitor in page]
 
 @app.get("/competitors/{competitor_id}", response_model=Competitor, tags=["Competitors"])
 async def get_competitor(competitor_id: str = Path(..., description="Competitor ID")):
@@ -392,6 +997,9 @@ async def create_competitor(competitor: CompetitorCreate):
         created_at=datetime.now()
     )
     MOCK_COMPETITORS.append(new_competitor)
+    dashboard_counters.adjust(total_competitors=1)
+    if catalog_writer is not None:
+        await catalog_writer.write_competitors([new_competitor])
     return new_competitor
 
 @app.get("/competitors/{competitor_id}/prices", response_model=List[PriceHistory], tags=["Competitors"])
@@ -401,72 +1009,155 @@ async def get_competitor_prices(
     limit: int = Query(50, ge=1, le=500, description="Maximum number of records")
 ):
     """Get price data for a specific competitor"""
-    # Mock competitor price data
-    prices = []
-    base_time = datetime.now() - timedelta(days=7)
-    
-    for i in range(min(limit, 7)):
-        prices.append(PriceHistory(
-            id=f"comp_price_{i}",
-            product_id=product_id or "prod_1",
-            competitor_id=competitor_id,
-            price=950.0 + (i * 2.5),
-            timestamp=base_time + timedelta(days=i),
-            source="competitor"
-        ))
-    
-    return prices
+    if response_config.fast_responses:
+        return _price_history_response(
+            price_history.query_columns(product_id=product_id, competitor_id=competitor_id, limit=limit)
+        )
+    rows = price_history.query(product_id=product_id, competitor_id=competitor_id, limit=limit)
+    return [_to_price_history(row) for row in rows]
 
 # Alert Management Endpoints
 @app.get("/alerts", response_model=List[Alert], tags=["Alerts"])
 async def get_alerts(
+    response: Response,
     unread_only: bool = Query(False, description="Show only unread alerts"),
     priority: Optional[AlertPriority] = Query(None, description="Filter by priority"),
     alert_type: Optional[AlertType] = Query(None, description="Filter by alert type"),
-    limit: int = Query(50, ge=1, le=500, description="Maximum number of records")
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of records"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
 ):
     """Get all alerts with filtering options"""
-    alerts = MOCK_ALERTS
+    after = _parse_cursor(cursor)
+    page, has_more = split_page(
+        alert_store.page(
+            after=(from_micros(after[0]), after[1]) if after else None,
+            limit=limit + 1,
+            is_read=False if unread_only else None,
+            priority=priority,
+            type=alert_type
+        ),
+        limit
+    )
+    _set_next_cursor(response, page, has_more, lambda alert: (to_micros(alert.created_at), alert.id))
+    if response_config.fast_responses:
+        # Stored alerts are validated models; their fields are in model order
+        body = dumps(
+            [alert.__dict__ for alert in page],
+            (value for alert in page for value in (alert.threshold_value, alert.current_value))
+        )
+        return json_response(body, response)
+    return page
+
+@app.get("/products/{product_id}/alerts", response_model=List[Alert], tags=["Alerts"])
+async def get_product_alerts(
+    product_id: str = Path(..., description="Product ID"),
+    resolved: bool = Query(False, description="Resolved instead of open alerts"),
+    read: Optional[bool] = Query(None, description="Filter by read status"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of records")
+):
+    """Get a product's alerts by status, newest first"""
+    if product_id not in catalog:
+        raise HTTPException(status_code=404, detail="Product not found")
     
-    if unread_only:
-        alerts = [a for a in alerts if not a.is_read]
-    if priority:
-        alerts = [a for a in alerts if a.priority == priority]
-    if alert_type:
-        alerts = [a for a in alerts if a.type == alert_type]
+    if database is None:
+        return alert_store.for_product(product_id, resolved=resolved, read=read, limit=limit)
     
-    return alerts[:limit]
+    competitor_ids = {row_uuid(c.id): c.id for c in MOCK_COMPETITORS}
+    rows = await database.get_product_alerts(product_id, resolved=resolved, read=read, limit=limit)
+    return [
+        Alert(
+            id=row.pop("api_id"),
+            product_id=product_id,
+            **{**row, "competitor_id": competitor_ids.get(row["competitor_id"])}
+        )
+        for row in rows
+    ]
 
 @app.post("/alerts", response_model=Alert, tags=["Alerts"])
 async def create_alert(alert: AlertCreate):
     """Create a new alert"""
+    if alert.product_id is not None and alert.product_id not in catalog:
+        raise HTTPException(status_code=404, detail="Product not found")
+    if alert.competitor_id is not None and all(c.id != alert.competitor_id for c in MOCK_COMPETITORS):
+        raise HTTPException(status_code=404, detail="Competitor not found")
+    
     new_alert = Alert(
-        id=f"alert_{len(MOCK_ALERTS) + 1}",
+        id=f"alert_{len(alert_store) + 1}",
         **alert.dict(),
         created_at=datetime.now()
     )
-    MOCK_ALERTS.append(new_alert)
+    alert_store.add(new_alert)
+    dashboard_counters.alert_created(new_alert)
+    if alert_writer is not None:
+        await alert_writer.write([new_alert])
     return new_alert
 
+@app.get("/alert-rules", response_model=List[AlertRule], tags=["Alerts"])
+async def get_alert_rules(
+    product_id: Optional[str] = Query(None, description="Filter by product"),
+    category: Optional[str] = Query(None, description="Filter by category")
+):
+    """Get registered threshold alert rules"""
+    return alert_rules.rules(product_id=product_id, category=category)
+
+@app.post("/alert-rules", response_model=AlertRule, tags=["Alerts"])
+async def create_alert_rule(rule: AlertRuleCreate):
+    """Register a threshold rule evaluated against incoming price ticks"""
+    if (rule.product_id is None) == (rule.category is None):
+        raise HTTPException(status_code=400, detail="Specify exactly one of product_id and category")
+    if rule.product_id is not None and rule.product_id not in catalog:
+        raise HTTPException(status_code=404, detail="Product not found")
+    if rule.competitor_id is not None and all(c.id != rule.competitor_id for c in MOCK_COMPETITORS):
+        raise HTTPException(status_code=404, detail="Competitor not found")
+    
+    new_rule = AlertRule(
+        id=alert_rules.next_id(),
+        **rule.dict(),
+        created_at=datetime.now()
+    )
+    if rule_store is not None:
+        await rule_store.write(new_rule)
+    alert_rules.add_rule(new_rule)
+    return new_rule
+
+@app.delete("/alert-rules/{rule_id}", tags=["Alerts"])
+async def delete_alert_rule(rule_id: str = Path(..., description="Rule ID")):
+    """Delete a threshold alert rule"""
+    if alert_rules.remove_rule(rule_id) is None:
+        raise HTTPException(status_code=404, detail="Alert rule not found")
+    if rule_store is not None:
+        await rule_store.delete([rule_id])
+    return {"message": "Alert rule deleted successfully"}
+
+@app.get("/alert-rules/stats", tags=["Alerts"])
+async def alert_rule_stats():
+    """Rule count and evaluation counters"""
+    return {"rules": len(alert_rules), **alert_rules.stats}
+
 @app.put("/alerts/{alert_id}/read", tags=["Alerts"])
 async def mark_alert_read(alert_id: str = Path(..., description="Alert ID")):
     """Mark an alert as read"""
-    alert = next((a for a in MOCK_ALERTS if a.id == alert_id), None)
+    alert = alert_store.get(alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="Alert not found")
     
-    alert.is_read = True
+    dashboard_counters.alert_read(alert)
+    alert_store.mark_read(alert_id)
+    if alert_writer is not None:
+        await alert_writer.update_status(alert)
     return {"message": "Alert marked as read"}
 
 @app.put("/alerts/{alert_id}/resolve", tags=["Alerts"])
 async def resolve_alert(alert_id: str = Path(..., description="Alert ID")):
     """Mark an alert as resolved"""
-    alert = next((a for a in MOCK_ALERTS if a.id == alert_id), None)
+    alert = alert_store.get(alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="Alert not found")
     
-    alert.is_resolved = True
-    alert.is_read = True
+    dashboard_counters.alert_resolved(alert)
+    alert_store.resolve(alert_id)
+    if alert_writer is not None:
+        await alert_writer.update_status(alert)
     return {"message": "Alert resolved"}
 
 # Market Insights Endpoints
@@ -527,66 +1218,119 @@ async def get_market_insights(
     
     return filtered_insights[:limit]
 
+class PriceRecommendationBatchRequest(BaseModel):
+    product_ids: Optional[List[str]] = Field(None, min_length=1, max_length=1000)
+    category: Optional[str] = Field(None, description="Every product of this category, up to limit")
+    confidence_threshold: float = Field(0.7, ge=0, le=1, description="Minimum confidence for recommendations")
+    limit: int = Field(1000, ge=1, le=10000, description="Maximum products when selecting by category")
+
+class PriceRecommendationJobRequest(BaseModel):
+    category: Optional[str] = Field(None, description="Restrict the run to one category")
+
+def _recommendation_snapshot(products: List[Product]):
+    """Product prices and the price-history summary behind a recommendation run"""
+    start = to_micros(datetime.now() - timedelta(days=recommendation_config.lookback_days))
+    summary = price_history.summary([product.id for product in products], start_us=start)
+    return products_frame(products), summary
+
+def _build_price_recommendations(frame, summary, confidence_threshold: float) -> List[Dict[str, Any]]:
+    """Compute the price recommendation payloads for a snapshot"""
+    return to_payloads(recommend(frame, summary), confidence_threshold)
+
+async def _run_recommendation_job(category: Optional[str]) -> Dict[str, Any]:
+    """Recommend for the whole catalog (or one category) and store the results in ai_insights"""
+    started = datetime.now()
+    products = catalog.list(category=category, limit=len(catalog))
+    # Snapshot on the event loop; the number crunching runs off it
+    frame, summary = _recommendation_snapshot(products)
+    payloads = await asyncio.to_thread(_build_price_recommendations, frame, summary, 0.0)
+    written = 0
+    if insight_writer is not None:
+        valid_until = datetime.now() + timedelta(hours=recommendation_config.ttl_hours)
+        written = await insight_writer.write(payloads, valid_until)
+    return {
+        "products": len(payloads),
+        "insights_written": written,
+        "duration_seconds": round((datetime.now() - started).total_seconds(), 3),
+    }
+
+async def _refresh_recommendations():
+    """Start a catalog-wide recommendation job every refresh period"""
+    while True:
+        await asyncio.sleep(recommendation_config.refresh_seconds)
+        if recommendation_jobs.running() is None:
+            recommendation_jobs.start(lambda: _run_recommendation_job(None))
+
 @app.get("/insights/price-recommendations/{product_id}", tags=["Market Insights"])
 async def get_price_recommendations(
     product_id: str = Path(..., description="Product ID"),
     confidence_threshold: float = Query(0.7, ge=0, le=1, description="Minimum confidence for recommendations")
 ):
     """Get AI-powered price recommendations for a specific product"""
-    product = next((p for p in MOCK_PRODUCTS if p.id == product_id), None)
+    product = catalog.get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Mock price recommendations
-    return {
-        "product_id": product_id,
-        "current_price": product.price,
-        "recommendations": [
-            {
-                "strategy": "competitive_pricing",
-                "suggested_price": product.price * 0.98,
-                "confidence": 0.82,
-                "expected_impact": {
-                    "revenue_change": "+3.2%",
-                    "volume_change": "+8.1%",
-                    "margin_change": "-1.8%"
-                },
-                "reasoning": "Slight price reduction to match closest competitor"
-            },
-            {
-                "strategy": "premium_positioning",
-                "suggested_price": product.price * 1.05,
-                "confidence": 0.75,
-                "expected_impact": {
-                    "revenue_change": "+4.1%",
-                    "volume_change": "-2.3%",
-                    "margin_change": "+6.8%"
-                },
-                "reasoning": "Premium pricing based on brand strength and unique features"
-            }
-        ],
-        "market_analysis": {
-            "avg_competitor_price": product.price * 1.02,
-            "price_elasticity": -0.3,
-            "market_position": "competitive"
-        }
-    }
+    async def compute():
+        return _build_price_recommendations(*_recommendation_snapshot([product]), confidence_threshold)[0]
+    
+    return await result_cache.get_or_compute(
+        "price_recommendations", product_id, (confidence_threshold,), compute
+    )
+
+@app.post("/insights/price-recommendations/batch", tags=["Market Insights"])
+async def get_price_recommendations_batch(request: PriceRecommendationBatchRequest):
+    """Price recommendations for a list of products or a category, computed in one pass"""
+    if (request.product_ids is None) == (request.category is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of product_ids and category")
+    missing: List[str] = []
+    if request.product_ids is not None:
+        products = []
+        for product_id in dict.fromkeys(request.product_ids):
+            product = catalog.get(product_id)
+            if product is None:
+                missing.append(product_id)
+            else:
+                products.append(product)
+    else:
+        products = catalog.list(category=request.category, limit=request.limit)
+    frame, summary = _recommendation_snapshot(products)
+    results = await asyncio.to_thread(_build_price_recommendations, frame, summary, request.confidence_threshold)
+    return {"results": results, "missing": missing}
+
+@app.post("/insights/price-recommendations/jobs", status_code=202, tags=["Market Insights"])
+async def start_price_recommendation_job(request: Optional[PriceRecommendationJobRequest] = None):
+    """Recompute recommendations in the background and store them in ai_insights"""
+    if recommendation_jobs.running() is not None:
+        raise HTTPException(status_code=409, detail="A recommendation job is already running")
+    category = request.category if request is not None else None
+    return recommendation_jobs.start(lambda: _run_recommendation_job(category))
+
+@app.get("/insights/price-recommendations/jobs/{job_id}", tags=["Market Insights"])
+async def get_price_recommendation_job(job_id: str = Path(..., description="Job ID")):
+    """Status and result of a recommendation job"""
+    job = recommendation_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 # Analytics and Reporting Endpoints
 @app.get("/analytics/dashboard", tags=["Analytics"])
 async def get_dashboard_analytics():
     """Get key metrics for dashboard"""
+    counters = dashboard_counters.snapshot()
     return {
-        "total_products": len(MOCK_PRODUCTS),
-        "total_competitors": len(MOCK_COMPETITORS),
-        "active_alerts": len([a for a in MOCK_ALERTS if not a.is_resolved]),
+        "total_products": counters["total_products"],
+        "total_competitors": counters["total_competitors"],
+        "active_alerts": counters["active_alerts"],
+        "unread_alerts": counters["unread_alerts"],
         "revenue_today": 25750.50,
         "revenue_change": "+12.3%",
         "top_products": [
             {"name": "iPhone 15 Pro", "revenue": 15000, "units": 15},
             {"name": "Samsung Galaxy S24", "revenue": 8999, "units": 10}
         ],
-        "price_alerts": len([a for a in MOCK_ALERTS if a.type == AlertType.COMPETITOR_PRICE]),
+        "price_alerts": counters["price_alerts"],
         "avg_margin": 23.5,
         "competitor_activity": 3
     }
@@ -594,12 +1338,19 @@ async def get_dashboard_analytics():
 @app.get("/analytics/trends", tags=["Analytics"])
 async def get_trend_analytics(
     timeframe: TimeFrame = Query(TimeFrame.DAILY, description="Analysis timeframe"),
-    metric: str = Query("revenue", description="Metric to analyze (revenue, volume, margin)")
+    metric: str = Query("revenue", description="Metric to analyze (revenue, volume, margin)"),
+    periods: int = Query(30, ge=1, le=1000, description="Number of most recent buckets")
 ):
     """Get trend analysis data"""
-    # Mock trend data
-    dates = [(datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(30, 0, -1)]
-    values = [1000 + (i * 50) + (i % 7 * 100) for i in range(30)]
+    aggregate = TREND_METRICS.get(metric)
+    if aggregate is None:
+        raise HTTPException(status_code=400, detail=f"Unknown metric '{metric}'")
+    
+    date_format = "%Y-%m-%dT%H:00" if timeframe == TimeFrame.HOURLY else "%Y-%m-%d"
+    points = metric_rollups.points(metric, timeframe.value, periods)
+    dates = [point["bucket_start"].strftime(date_format) for point in points]
+    values = [round(point[aggregate], 2) for point in points]
+    change = percent_change(values[0], values[-1]) if values else 0.0
     
     return {
         "metric": metric,
@@ -607,9 +1358,9 @@ async def get_trend_analytics(
         "data": [{"date": date, "value": value} for date, value in zip(dates, values)],
         "summary": {
             "total": sum(values),
-            "average": sum(values) / len(values),
-            "trend": "increasing",
-            "change_percent": 15.3
+            "average": sum(values) / len(values) if values else 0.0,
+            "trend": "increasing" if change > 1 else "decreasing" if change < -1 else "stable",
+            "change_percent": change
         }
     }
 
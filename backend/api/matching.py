@@ -0,0 +1,401 @@
+"""
+Matching of scraped search results to catalog products
+Product names are reduced to normalized tokens in an inverted index with
+IDF weights. A result's rare tokens select candidate products, which are
+scored by weighted token overlap; SKUs that appear in a title or link are
+exact matches. Misspelled words are resolved to catalog vocabulary through
+a trigram index. The index is updated in place as products change.
+"""
+
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+import argparse
+import math
+import random
+import re
+import time
+import unicodedata
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# "256 GB" and "256GB" should be the same token
+UNIT_PATTERN = re.compile(r"(\d)[\s-]+(gb|tb|mb|mp|mah|mm|cm|hz|khz|ghz|oz|lb|lbs|ml|in|inch|w|v)\b")
+STOP_WORDS = frozenset({
+    "a", "an", "and", "the", "for", "with", "of", "in", "on", "by", "to", "from", "at", "or",
+    "new", "free", "shipping", "sale", "buy", "online", "deal", "deals", "shop", "com", "www",
+    "http", "https", "html", "htm", "php", "product", "products", "p", "dp", "item", "ip",
+})
+
+SKU_MIN_LENGTH = 5
+# Consecutive tokens joined when looking for an SKU, e.g. "WH 1000XM5"
+SKU_MAX_PARTS = 4
+SKU_PREFIX_LENGTH = 3
+FUZZY_MIN_LENGTH = 5
+FUZZY_MIN_SIMILARITY = 0.7
+
+
+def normalize(text: str) -> str:
+    text = text.lower()
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return UNIT_PATTERN.sub(r"\1\2", text)
+
+
+def tokenize(text: str) -> List[str]:
+    """Normalized word tokens in order, stop words removed"""
+    return [token for token in TOKEN_PATTERN.findall(normalize(text)) if token not in STOP_WORDS]
+
+
+def sku_key(sku: str) -> str:
+    """SKU with case and separators removed, as it may appear in a title or URL"""
+    return "".join(TOKEN_PATTERN.findall(normalize(sku)))
+
+
+def url_path(link: str) -> str:
+    """Path and query of a URL, without scheme and host"""
+    return link.partition("//")[2].partition("/")[2] if "//" in link else link
+
+
+def trigrams(token: str) -> Set[str]:
+    padded = f"^{token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _IdfTable(dict):
+    """Token -> IDF weight, computed on first use for a fixed catalog size"""
+
+    def __init__(self, matcher: "ProductMatcher"):
+        super().__init__()
+        self.size = len(matcher)
+        self._postings = matcher._postings
+
+    def __missing__(self, token: str) -> float:
+        weight = self[token] = math.log(1 + max(self.size, 1) / len(self._postings[token]))
+        return weight
+
+
+class Match(NamedTuple):
+    product_id: str
+    sku: str
+    score: float
+    method: str  # "sku" or "tokens"
+
+
+class ProductMatcher:
+    """
+    Incremental index from product names and SKUs to catalog products
+
+    Products are any objects exposing ``id``, ``sku`` and ``name``. Lookup
+    cost depends on the postings of a result's rarest tokens, not on the
+    catalog size; tokens found in more than ``max_postings`` products (or
+    1% of a smaller catalog, but at least ``max_candidates``) only narrow
+    candidates down when no rarer token is shared, and then only if at
+    most ``max_candidates`` products share the two rarest.
+    """
+
+    def __init__(
+        self,
+        products: Iterable[Any] = (),
+        min_score: float = 0.6,
+        max_postings: int = 1000,
+        max_candidates: int = 200,
+    ):
+        self.min_score = min_score
+        self.max_postings = max_postings
+        self.max_candidates = max_candidates
+        self._postings: Dict[str, Set[str]] = {}
+        self._tokens: Dict[str, Tuple[str, ...]] = {}
+        self._skus: Dict[str, str] = {}
+        self._sku_keys: Dict[str, str] = {}
+        # Leading characters of every SKU key, to cut the window scan short
+        self._sku_prefixes: Dict[str, int] = {}
+        # Trigram -> vocabulary tokens, for resolving misspellings
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._fuzzy_cache: Dict[str, Optional[str]] = {}
+        self._idf = _IdfTable(self)
+        # Common-token intersections, which many results share
+        self._intersections: Dict[Tuple[str, ...], Set[str]] = {}
+
+        for product in products:
+            self.add(product)
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._tokens
+
+    def add(self, product: Any) -> None:
+        """Index a product, replacing its previous entry"""
+        if product.id in self._tokens:
+            self.remove(product.id)
+        tokens = tuple(dict.fromkeys(tokenize(product.name)))
+        self._tokens[product.id] = tokens
+        self._skus[product.id] = product.sku
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                self._add_vocabulary(token)
+            postings.add(product.id)
+            self._idf.pop(token, None)
+        self._intersections.clear()
+        key = sku_key(product.sku)
+        if len(key) >= SKU_MIN_LENGTH and any(c.isdigit() for c in key):
+            self._sku_keys[key] = product.id
+            prefix = key[:SKU_PREFIX_LENGTH]
+            self._sku_prefixes[prefix] = self._sku_prefixes.get(prefix, 0) + 1
+
+    def update(self, product: Any) -> None:
+        self.add(product)
+
+    def remove(self, product_id: str) -> None:
+        tokens = self._tokens.pop(product_id, None)
+        if tokens is None:
+            return
+        sku = self._skus.pop(product_id)
+        key = sku_key(sku)
+        if self._sku_keys.get(key) == product_id:
+            del self._sku_keys[key]
+            prefix = key[:SKU_PREFIX_LENGTH]
+            self._sku_prefixes[prefix] -= 1
+            if not self._sku_prefixes[prefix]:
+                del self._sku_prefixes[prefix]
+        for token in tokens:
+            postings = self._postings[token]
+            postings.discard(product_id)
+            self._idf.pop(token, None)
+            if not postings:
+                del self._postings[token]
+                self._remove_vocabulary(token)
+        self._intersections.clear()
+
+    def _fuzzy_candidate(self, token: str) -> bool:
+        return len(token) >= FUZZY_MIN_LENGTH and token.isalpha()
+
+    def _add_vocabulary(self, token: str) -> None:
+        if self._fuzzy_candidate(token):
+            for gram in trigrams(token):
+                self._trigrams.setdefault(gram, set()).add(token)
+        self._fuzzy_cache.clear()
+
+    def _remove_vocabulary(self, token: str) -> None:
+        if self._fuzzy_candidate(token):
+            for gram in trigrams(token):
+                tokens = self._trigrams.get(gram)
+                if tokens is not None:
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._trigrams[gram]
+        self._fuzzy_cache.clear()
+
+    def _resolve(self, token: str) -> Optional[str]:
+        """The vocabulary token a misspelled word most likely stands for"""
+        if token in self._fuzzy_cache:
+            return self._fuzzy_cache[token]
+        best, best_similarity = None, FUZZY_MIN_SIMILARITY
+        if self._fuzzy_candidate(token):
+            grams = trigrams(token)
+            shared: Dict[str, int] = {}
+            for gram in grams:
+                for other in self._trigrams.get(gram, ()):
+                    shared[other] = shared.get(other, 0) + 1
+            for other, count in shared.items():
+                # Dice coefficient; a padded token of length n has n trigrams
+                similarity = 2 * count / (len(grams) + len(other))
+                if similarity > best_similarity:
+                    best, best_similarity = other, similarity
+        if len(self._fuzzy_cache) > 100_000:
+            self._fuzzy_cache.clear()
+        self._fuzzy_cache[token] = best
+        return best
+
+    def match(self, title: str, link: str = "", limit: int = 3, min_score: Optional[float] = None) -> List[Match]:
+        """
+        Best-scoring products for a search result, highest first
+
+        An SKU found in the title or link path scores 1.0. Otherwise the
+        score is an F2 measure of IDF-weighted token overlap, favouring
+        results that contain the whole product name over ones the name
+        fully describes, since result titles carry extra words.
+        """
+        min_score = self.min_score if min_score is None else min_score
+        title_tokens = TOKEN_PATTERN.findall(normalize(title))
+        path_tokens = TOKEN_PATTERN.findall(normalize(url_path(link))) if link else []
+
+        matches: Dict[str, Match] = {}
+        for product_id in self._find_skus(title_tokens, path_tokens):
+            matches[product_id] = Match(product_id, self._skus[product_id], 1.0, "sku")
+
+        # Query tokens present in the vocabulary, misspellings resolved
+        postings = self._postings
+        query: Set[str] = set()
+        for token in title_tokens:
+            if token in STOP_WORDS:
+                continue
+            if token not in postings:
+                token = self._resolve(token)
+                if token is None:
+                    continue
+            query.add(token)
+        if query:
+            for product_id, score in self._score(query):
+                if score >= min_score and product_id not in matches:
+                    matches[product_id] = Match(product_id, self._skus[product_id], round(score, 4), "tokens")
+        return sorted(matches.values(), key=lambda m: (-m.score, m.product_id))[:limit]
+
+    def _find_skus(self, *token_lists: List[str]) -> Set[str]:
+        found: Set[str] = set()
+        sku_keys = self._sku_keys
+        prefixes = self._sku_prefixes
+        if not sku_keys:
+            return found
+        for tokens in token_lists:
+            for start in range(len(tokens)):
+                key = ""
+                for part in tokens[start:start + SKU_MAX_PARTS]:
+                    key += part
+                    if len(key) >= SKU_PREFIX_LENGTH and key[:SKU_PREFIX_LENGTH] not in prefixes:
+                        break
+                    if len(key) >= SKU_MIN_LENGTH and key in sku_keys:
+                        found.add(sku_keys[key])
+        return found
+
+    def _score(self, query: Set[str]) -> List[Tuple[str, float]]:
+        postings = self._postings
+        by_rarity = sorted(query, key=lambda token: len(postings[token]))
+        # Brand and category words fall under a fixed max_postings in a
+        # mid-sized catalog and would make every result score thousands
+        limit = max(self.max_candidates, min(self.max_postings, len(self._tokens) // 100))
+        candidates: Set[str] = set()
+        for token in by_rarity:
+            if len(postings[token]) > limit:
+                break
+            candidates |= postings[token]
+        if not candidates:
+            # Only common tokens: products sharing the fewest rarest ones
+            # that, assuming independence, narrow it to max_candidates
+            n = len(self._tokens)
+            expected = float(n)
+            needed = 0
+            for token in by_rarity:
+                expected *= len(postings[token]) / n
+                needed += 1
+                if expected <= self.max_candidates:
+                    break
+            else:
+                return []
+            key = tuple(by_rarity[:needed])
+            candidates = self._intersections.get(key)
+            if candidates is None:
+                candidates = postings[key[0]]
+                for token in key[1:]:
+                    candidates = candidates & postings[token]
+                if len(self._intersections) > 100_000:
+                    self._intersections.clear()
+                self._intersections[key] = candidates
+            if len(candidates) > self.max_candidates:
+                return []
+
+        idf = self._idf_table()
+        query_weight = sum(idf[token] for token in query)
+        product_tokens = self._tokens
+        scored = []
+        for product_id in candidates:
+            shared = product_weight = 0.0
+            for token in product_tokens[product_id]:
+                weight = idf[token]
+                product_weight += weight
+                if token in query:
+                    shared += weight
+            recall = shared / product_weight
+            precision = shared / query_weight
+            scored.append((product_id, 5 * precision * recall / (4 * precision + recall)))
+        return scored
+
+    def _idf_table(self) -> "_IdfTable":
+        # Weights drift with catalog size; recompute once it moved by 1%
+        if abs(len(self._tokens) - self._idf.size) > 0.01 * self._idf.size:
+            self._idf = _IdfTable(self)
+        return self._idf
+
+    def match_many(self, results: Iterable[Tuple[str, str]], limit: int = 1) -> List[List[Match]]:
+        """Matches for (title, link) pairs, in order"""
+        match = self.match
+        return [match(title, link, limit) for title, link in results]
+
+
+class _SyntheticProduct(NamedTuple):
+    id: str
+    sku: str
+    name: str
+
+
+_BRANDS = ("Apple", "Samsung", "Sony", "Dell", "Lenovo", "Bose", "Canon", "Nikon", "LG", "Philips",
+           "Dyson", "Asus", "Acer", "Garmin", "Logitech", "Anker", "JBL", "Panasonic", "Xiaomi", "Huawei")
+_KINDS = ("Laptop", "Headphones", "Smartphone", "Camera", "Monitor", "Speaker", "Tablet", "Keyboard",
+          "Mouse", "Vacuum", "Watch", "Router", "Charger", "Earbuds", "Television", "Projector")
+_TRAITS = ("Wireless", "Pro", "Max", "Ultra", "Mini", "Plus", "Lite", "Gaming", "Portable", "Noise Cancelling",
+           "Black", "Silver", "White", "Blue", "128GB", "256GB", "512GB", "1TB", "4K", "OLED")
+_NOISE = ("Unlocked", "Free Shipping", "Best Price", "Renewed", "2024 Model", "Official", "Bundle", "In Stock")
+
+
+def synthetic_catalog(size: int, seed: int = 7) -> List[_SyntheticProduct]:
+    rng = random.Random(seed)
+    products = []
+    for i in range(size):
+        model = f"{rng.choice('ABCDEFGHKMNPRSTVWXZ')}{rng.randint(10, 9999)}{rng.choice(('', 'X', 'S', 'M'))}"
+        traits = " ".join(rng.sample(_TRAITS, rng.randint(1, 3)))
+        name = f"{rng.choice(_BRANDS)} {rng.choice(_KINDS)} {model} {traits}"
+        products.append(_SyntheticProduct(f"prod_{i}", f"SKU-{i:07d}-{model}", name))
+    return products
+
+
+def synthetic_results(catalog: Sequence[_SyntheticProduct], count: int, seed: int = 11) -> List[Tuple[str, str]]:
+    """Search-result (title, link) pairs: reworded titles, some typos, some SKUs and some unknown products"""
+    rng = random.Random(seed)
+    results = []
+    for _ in range(count):
+        product = rng.choice(catalog)
+        words = product.name.split()
+        if rng.random() < 0.3:
+            words.pop(rng.randrange(1, len(words)))
+        if rng.random() < 0.2:
+            i = rng.randrange(len(words))
+            if len(words[i]) > 5:
+                j = rng.randrange(1, len(words[i]) - 1)
+                words[i] = words[i][:j] + words[i][j + 1:]
+        known = rng.random() >= 0.1
+        if not known:
+            # A product that is not in the catalog
+            words = [rng.choice(_BRANDS), rng.choice(_KINDS), f"Q{rng.randint(10, 9999)}Z"]
+        words.append(rng.choice(_NOISE))
+        slug = product.sku.lower() if known and rng.random() < 0.3 else "-".join(words).lower()
+        results.append((" ".join(words) + " - Shop", f"https://www.shop.example/{slug}"))
+    return results
+
+
+def benchmark(catalog_size: int = 200_000, results: int = 1_000_000) -> Dict[str, float]:
+    """Index build time and results matched per second on synthetic data"""
+    catalog = synthetic_catalog(catalog_size)
+    sample = synthetic_results(catalog, results)
+    started = time.perf_counter()
+    matcher = ProductMatcher(catalog)
+    built = time.perf_counter() - started
+    started = time.perf_counter()
+    matched = matcher.match_many(sample)
+    elapsed = time.perf_counter() - started
+    return {
+        "catalog": catalog_size,
+        "results": results,
+        "build_seconds": round(built, 3),
+        "match_seconds": round(elapsed, 3),
+        "results_per_second": round(results / elapsed),
+        "matched": sum(1 for found in matched if found),
+    }
+
+
+if __name__ == "__main__":
+    cli = argparse.ArgumentParser(description="Benchmark product matching throughput")
+    cli.add_argument("--catalog", type=int, default=200_000)
+    cli.add_argument("--results", type=int, default=1_000_000)
+    args = cli.parse_args()
+    print(benchmark(args.catalog, args.results))
@@ -0,0 +1,55 @@
+"""
+Dashboard aggregates
+Counters adjusted by the write endpoints so dashboard reads are O(1)
+regardless of how many products, competitors or alerts exist
+"""
+
+from typing import Any, Dict, Iterable
+
+# Alert type counted under "price_alerts"
+PRICE_ALERT_TYPE = "competitor_price"
+
+
+class DashboardCounters:
+    """Incrementally maintained dashboard metrics"""
+
+    FIELDS = ("total_products", "total_competitors", "active_alerts", "unread_alerts", "price_alerts")
+
+    def __init__(self):
+        self._values: Dict[str, int] = dict.fromkeys(self.FIELDS, 0)
+
+    def __getitem__(self, field: str) -> int:
+        return self._values[field]
+
+    def adjust(self, **deltas: int) -> None:
+        for field, delta in deltas.items():
+            self._values[field] += delta
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self._values)
+
+    def rebuild(self, products: int, competitors: int, alerts: Iterable[Any]) -> None:
+        """Recompute every counter from scratch, e.g. after seeding"""
+        self._values = dict.fromkeys(self.FIELDS, 0)
+        self._values["total_products"] = products
+        self._values["total_competitors"] = competitors
+        for alert in alerts:
+            self.alert_created(alert)
+
+    # Alert transitions; each must be called before mutating the alert
+
+    def alert_created(self, alert: Any) -> None:
+        self.adjust(
+            active_alerts=0 if alert.is_resolved else 1,
+            unread_alerts=0 if alert.is_read else 1,
+            price_alerts=1 if alert.type == PRICE_ALERT_TYPE else 0,
+        )
+
+    def alert_read(self, alert: Any) -> None:
+        if not alert.is_read:
+            self.adjust(unread_alerts=-1)
+
+    def alert_resolved(self, alert: Any) -> None:
+        self.alert_read(alert)
+        if not alert.is_resolved:
+            self.adjust(active_alerts=-1)
@@ -0,0 +1,47 @@
+"""
+Keyset (cursor) pagination helpers
+Cursors are opaque URL-safe tokens wrapping the (sort key, id) of the last
+row of a page, so the next page starts with an index seek instead of an
+offset scan
+"""
+
+from typing import Any, List, Optional, Sequence, Tuple, TypeVar
+import base64
+import json
+
+T = TypeVar("T")
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a cursor token cannot be decoded"""
+
+
+def encode_cursor(sort_key: Any, row_id: Any) -> str:
+    """Encode the (sort key, id) of the last row of a page"""
+    payload = json.dumps([sort_key, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode()
+
+
+def decode_cursor(token: str) -> Tuple[Any, Any]:
+    """Decode a cursor produced by ``encode_cursor``"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        sort_key, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {token}") from e
+    return sort_key, row_id
+
+
+def split_page(rows: Sequence[T], limit: int) -> Tuple[List[T], bool]:
+    """Trim a ``limit + 1`` fetch to one page and report whether more rows exist"""
+    return list(rows[:limit]), len(rows) > limit
+
+
+def next_cursor(page: Sequence[T], has_more: bool, key) -> Optional[str]:
+    """Cursor for the page after ``page``, or None on the last page"""
+    if not has_more or not page:
+        return None
+    return encode_cursor(*key(page[-1]))
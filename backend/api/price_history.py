@@ -0,0 +1,746 @@
+"""
+Columnar price-history engine
+Price ticks are kept per (product, competitor) series as sorted NumPy
+timestamp/price arrays with prefix sums and per-block min/max, so range
+aggregates cost O(log n) plus a few block-level reductions. A store-wide
+copy of the ticks in (timestamp, seq) order serves pages that span many
+series.
+"""
+
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple, Any
+from datetime import datetime, timedelta
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+# Block size for the min/max summaries
+BLOCK_SIZE = 1024
+# Windows up to this many ticks are copied and reduced together by summary()
+SUMMARY_GATHER_LIMIT = 4 * BLOCK_SIZE
+
+# Look-back window used by the price analysis for each timeframe
+TIMEFRAME_WINDOWS = {
+    "hourly": timedelta(hours=24),
+    "daily": timedelta(days=30),
+    "weekly": timedelta(weeks=12),
+    "monthly": timedelta(days=365),
+}
+
+# Relative change between window halves below which a trend is "stable"
+TREND_TOLERANCE = 0.01
+
+# Queries spanning more series than this page through the store-wide tick
+# order instead of slicing every series
+MERGE_SERIES_THRESHOLD = 32
+# Out-of-order ticks kept in the tick order's delta run before it is merged
+# into the main run
+DELTA_LIMIT = 65536
+
+SeriesKey = Tuple[str, Optional[str]]
+
+
+class PriceBatch(NamedTuple):
+    """A contiguous run of ticks from one series, as column copies"""
+    product_id: str
+    competitor_id: Optional[str]
+    seq: np.ndarray
+    ts: np.ndarray
+    price: np.ndarray
+
+
+def to_micros(dt: datetime) -> int:
+    """Convert a datetime to integer microseconds (naive local time)"""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return (dt - EPOCH) // MICROSECOND
+
+
+def from_micros(us: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(us))
+
+
+def isoformat_micros(us: np.ndarray) -> List[str]:
+    """datetime.isoformat() of each microsecond timestamp, vectorized"""
+    texts = np.datetime_as_string(us.astype("datetime64[us]"), unit="us").tolist()
+    # isoformat leaves out a zero microsecond part
+    for i in np.flatnonzero(us % 1_000_000 == 0).tolist():
+        texts[i] = texts[i][:19]
+    return texts
+
+
+def percent_change(old: Optional[float], new: float) -> float:
+    if not old:
+        return 0.0
+    return round((new - old) / old * 100, 2)
+
+
+class PriceRows(NamedTuple):
+    """Ticks from any number of series as columns; ``owner`` indexes ``keys``"""
+    keys: List[SeriesKey]
+    owner: np.ndarray
+    seq: np.ndarray
+    ts: np.ndarray
+    price: np.ndarray
+
+    def head(self, n: int) -> "PriceRows":
+        return PriceRows(self.keys, self.owner[:n], self.seq[:n], self.ts[:n], self.price[:n])
+
+
+class PriceSeries:
+    """Append-optimised sorted columns for one (product, competitor) pair"""
+
+    __slots__ = ("size", "ts", "price", "seq", "csum", "block_min", "block_max")
+
+    def __init__(self, capacity: int = 16):
+        self.size = 0
+        self.ts = np.empty(capacity, dtype=np.int64)
+        self.price = np.empty(capacity, dtype=np.float64)
+        self.seq = np.empty(capacity, dtype=np.int64)
+        # csum[i] is the sum of the first i prices
+        self.csum = np.zeros(capacity + 1, dtype=np.float64)
+        self.block_min = np.empty(-(-capacity // BLOCK_SIZE), dtype=np.float64)
+        self.block_max = np.empty_like(self.block_min)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _reserve(self, needed: int) -> None:
+        capacity = len(self.ts)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        n = self.size
+        for name in ("ts", "price", "seq"):
+            old = getattr(self, name)
+            grown = np.empty(capacity, dtype=old.dtype)
+            grown[:n] = old[:n]
+            setattr(self, name, grown)
+        csum = np.zeros(capacity + 1, dtype=np.float64)
+        csum[:n + 1] = self.csum[:n + 1]
+        self.csum = csum
+        blocks = -(-capacity // BLOCK_SIZE)
+        for name in ("block_min", "block_max"):
+            grown = np.empty(blocks, dtype=np.float64)
+            used = -(-n // BLOCK_SIZE)
+            grown[:used] = getattr(self, name)[:used]
+            setattr(self, name, grown)
+
+    def append(self, ts: np.ndarray, price: np.ndarray, seq: np.ndarray) -> None:
+        """Append a chunk of ticks, merging if it is older than the tail"""
+        if len(ts) == 0:
+            return
+        if np.any(ts[1:] < ts[:-1]):
+            order = np.argsort(ts, kind="stable")
+            ts, price, seq = ts[order], price[order], seq[order]
+
+        n = self.size
+        if n and ts[0] < self.ts[n - 1]:
+            self._merge(ts, price, seq)
+            return
+
+        end = n + len(ts)
+        self._reserve(end)
+        self.ts[n:end] = ts
+        self.price[n:end] = price
+        self.seq[n:end] = seq
+        self.csum[n + 1:end + 1] = self.csum[n] + np.cumsum(price)
+        self.size = end
+        self._refresh_blocks(n)
+
+    def _merge(self, ts: np.ndarray, price: np.ndarray, seq: np.ndarray) -> None:
+        n = self.size
+        all_ts = np.concatenate([self.ts[:n], ts])
+        order = np.argsort(all_ts, kind="stable")
+        all_price = np.concatenate([self.price[:n], price])[order]
+        all_seq = np.concatenate([self.seq[:n], seq])[order]
+        self.size = 0
+        self.append(all_ts[order], all_price, all_seq)
+
+    def _refresh_blocks(self, start: int) -> None:
+        first = start // BLOCK_SIZE
+        offsets = np.arange(first * BLOCK_SIZE, self.size, BLOCK_SIZE)
+        values = self.price[:self.size]
+        last = first + len(offsets)
+        self.block_min[first:last] = np.minimum.reduceat(values, offsets)
+        self.block_max[first:last] = np.maximum.reduceat(values, offsets)
+
+    def bounds(self, start_us: Optional[int] = None, end_us: Optional[int] = None) -> Tuple[int, int]:
+        """Binary-search the index range [lo, hi) of ticks within [start, end]"""
+        ts = self.ts[:self.size]
+        lo = 0 if start_us is None else int(np.searchsorted(ts, start_us, side="left"))
+        hi = self.size if end_us is None else int(np.searchsorted(ts, end_us, side="right"))
+        return lo, max(lo, hi)
+
+    def seek(self, after_ts: int, after_seq: int) -> int:
+        """Index of the first tick ordered strictly after (after_ts, after_seq)"""
+        return _seek(self.ts[:self.size], self.seq[:self.size], after_ts, after_seq)
+
+    def mean(self, lo: int, hi: int) -> float:
+        return float((self.csum[hi] - self.csum[lo]) / (hi - lo))
+
+    def _reduce(self, lo: int, hi: int, op, blocks: np.ndarray) -> float:
+        first_full = -(-lo // BLOCK_SIZE)
+        last_full = hi // BLOCK_SIZE
+        if first_full >= last_full:
+            return float(op(self.price[lo:hi]))
+        parts = [op(blocks[first_full:last_full])]
+        if lo < first_full * BLOCK_SIZE:
+            parts.append(op(self.price[lo:first_full * BLOCK_SIZE]))
+        if last_full * BLOCK_SIZE < hi:
+            parts.append(op(self.price[last_full * BLOCK_SIZE:hi]))
+        return float(op(parts))
+
+    def min(self, lo: int, hi: int) -> float:
+        return self._reduce(lo, hi, np.min, self.block_min)
+
+    def max(self, lo: int, hi: int) -> float:
+        return self._reduce(lo, hi, np.max, self.block_max)
+
+    def price_at(self, at_us: int) -> Optional[float]:
+        """Last known price at or before the given time"""
+        idx = int(np.searchsorted(self.ts[:self.size], at_us, side="right")) - 1
+        return float(self.price[idx]) if idx >= 0 else None
+
+    def latest(self) -> Optional[Tuple[int, float]]:
+        if not self.size:
+            return None
+        return int(self.ts[self.size - 1]), float(self.price[self.size - 1])
+
+
+class _Run:
+    """Growable (ts, seq, series id, price) columns sorted by (ts, seq)"""
+
+    __slots__ = ("size", "ts", "seq", "sid", "price")
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.ts = np.empty(capacity, dtype=np.int64)
+        self.seq = np.empty(capacity, dtype=np.int64)
+        self.sid = np.empty(capacity, dtype=np.int32)
+        self.price = np.empty(capacity, dtype=np.float64)
+
+    def columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        n = self.size
+        return self.ts[:n], self.seq[:n], self.sid[:n], self.price[:n]
+
+    def extend(self, ts: np.ndarray, seq: np.ndarray, sid: np.ndarray, price: np.ndarray) -> None:
+        n, end = self.size, self.size + len(ts)
+        if end > len(self.ts):
+            capacity = max(end, 2 * len(self.ts))
+            for name in self.__slots__[1:]:
+                old = getattr(self, name)
+                grown = np.empty(capacity, dtype=old.dtype)
+                grown[:n] = old[:n]
+                setattr(self, name, grown)
+        self.ts[n:end], self.seq[n:end], self.sid[n:end], self.price[n:end] = ts, seq, sid, price
+        self.size = end
+
+    def replace(self, ts: np.ndarray, seq: np.ndarray, sid: np.ndarray, price: np.ndarray) -> None:
+        self.size = len(ts)
+        self.ts, self.seq, self.sid, self.price = ts, seq, sid, price
+
+
+class TickOrder:
+    """
+    Every tick of the store in (timestamp, seq) order, so a keyset page
+    across all series touches about ``limit`` rows rather than ``limit``
+    rows per series
+
+    Chunks at or past the newest tick are appended to the main run. Older
+    ones are buffered, sorted into a small delta run on the next read and
+    merged into the main run once that holds DELTA_LIMIT rows. Rows of
+    dropped series are skipped by reads and removed by that merge.
+    """
+
+    def __init__(self):
+        self._main = _Run()
+        self._delta = _Run(0)
+        self._pending: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+        self._alive = np.zeros(1024, dtype=bool)
+        self._series_count = 0
+        self._dropped = False
+
+    @property
+    def alive(self) -> np.ndarray:
+        """Whether each series id is still in the store"""
+        return self._alive[:self._series_count]
+
+    def add_series(self) -> int:
+        sid = self._series_count
+        if sid == len(self._alive):
+            self._alive = np.concatenate([self._alive, np.zeros(sid, dtype=bool)])
+        self._alive[sid] = True
+        self._series_count += 1
+        return sid
+
+    def drop_series(self, sid: int) -> None:
+        self._alive[sid] = False
+        self._dropped = True
+
+    def add(self, sid: int, ts: np.ndarray, seq: np.ndarray, price: np.ndarray) -> None:
+        """Add a chunk of one series; ``seq`` must exceed every seq already added"""
+        if np.any(ts[1:] < ts[:-1]):
+            order = np.argsort(ts, kind="stable")
+            ts, seq, price = ts[order], seq[order], price[order]
+        sids = np.full(len(ts), sid, dtype=np.int32)
+        main = self._main
+        if not main.size or ts[0] >= main.ts[main.size - 1]:
+            main.extend(ts, seq, sids, price)
+        else:
+            self._pending.append((ts, seq, sids, price))
+
+    def _settle(self) -> None:
+        if not self._pending:
+            return
+        parts = [self._delta.columns(), *self._pending]
+        self._pending = []
+        delta = [np.concatenate([part[i] for part in parts]) for i in range(4)]
+        order = np.lexsort((delta[1], delta[0]))
+        delta = [column[order] for column in delta]
+        if len(order) <= DELTA_LIMIT:
+            self._delta.replace(*delta)
+            return
+        self._main.replace(*_merge_runs(self._main.columns(), delta))
+        self._delta = _Run(0)
+        if self._dropped:
+            keep = self.alive[self._main.sid[:self._main.size]]
+            self._main.replace(*(column[keep] for column in self._main.columns()))
+            self._dropped = False
+
+    def page(
+        self,
+        keep: np.ndarray,
+        start_us: Optional[int],
+        end_us: Optional[int],
+        limit: int,
+        after: Optional[Tuple[int, int]],
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Up to ``limit`` (sid, ts, seq, price) rows of series with
+        ``keep[sid]`` set, in order, within [start_us, end_us] and past
+        ``after``
+        """
+        self._settle()
+        parts = [
+            _collect(run.columns(), keep, start_us, end_us, limit, after)
+            for run in (self._main, self._delta) if run.size
+        ]
+        if not parts:
+            return (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64),
+                    np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+        ts, seq, sid, price = (np.concatenate([part[i] for part in parts]) for i in range(4))
+        order = np.lexsort((seq, ts))[:limit]
+        return sid[order], ts[order], seq[order], price[order]
+
+
+def _seek(ts: np.ndarray, seq: np.ndarray, after_ts: int, after_seq: int) -> int:
+    """Index of the first row ordered strictly after (after_ts, after_seq)"""
+    lo = int(np.searchsorted(ts, after_ts, side="left"))
+    hi = int(np.searchsorted(ts, after_ts, side="right"))
+    # Rows sharing a timestamp are kept in sequence order
+    return lo + int(np.searchsorted(seq[lo:hi], after_seq, side="right"))
+
+
+def _collect(columns, keep: np.ndarray, start_us: Optional[int], end_us: Optional[int],
+             limit: int, after: Optional[Tuple[int, int]]) -> Tuple[np.ndarray, ...]:
+    """The first ``limit`` kept rows of one sorted run within the bounds"""
+    ts, seq, sid, price = columns
+    lo = 0 if start_us is None else int(np.searchsorted(ts, start_us, side="left"))
+    if after is not None:
+        lo = max(lo, _seek(ts, seq, *after))
+    hi = len(ts) if end_us is None else int(np.searchsorted(ts, end_us, side="right"))
+    picked: List[np.ndarray] = []
+    found, step = 0, limit
+    # Windows double, so sparse matches cost O(log) scans rather than one per page row
+    while lo < hi and found < limit:
+        stop = min(hi, lo + step)
+        rows = lo + np.flatnonzero(keep[sid[lo:stop]])[:limit - found]
+        picked.append(rows)
+        found += len(rows)
+        lo, step = stop, step * 2
+    rows = np.concatenate(picked) if picked else np.empty(0, dtype=np.int64)
+    return ts[rows], seq[rows], sid[rows], price[rows]
+
+
+def _merge_runs(a, b) -> List[np.ndarray]:
+    """Merge sorted run ``b`` into sorted run ``a`` in one pass over ``a``"""
+    a_ts, a_seq = a[0], a[1]
+    b_ts, b_seq = b[0], b[1]
+    positions = np.searchsorted(a_ts, b_ts, side="left")
+    # Timestamps also present in ``a`` are placed by seq among its equal run
+    ends = np.searchsorted(a_ts, b_ts, side="right")
+    for i in np.flatnonzero(ends > positions).tolist():
+        lo = positions[i]
+        positions[i] = lo + np.searchsorted(a_seq[lo:ends[i]], b_seq[i], side="right")
+    return [np.insert(a_col, positions, b_col) for a_col, b_col in zip(a, b)]
+
+
+class PriceHistoryStore:
+    """Price ticks for all products, grouped into columnar series"""
+
+    def __init__(self):
+        self._series: Dict[SeriesKey, PriceSeries] = {}
+        self._by_product: Dict[str, Set[SeriesKey]] = {}
+        self._by_competitor: Dict[str, Set[SeriesKey]] = {}
+        # Store-wide order for queries spanning many series, by series id
+        self._order = TickOrder()
+        self._sids: Dict[SeriesKey, int] = {}
+        self._sid_keys: List[SeriesKey] = []
+        # Series ids per competitor, built on first use
+        self._competitor_sids: Dict[str, np.ndarray] = {}
+        self._next_seq = 1
+        self._listeners: List[Any] = []
+
+    def __len__(self) -> int:
+        return sum(len(series) for series in self._series.values())
+
+    def add_listener(self, listener) -> None:
+        """
+        Register ``listener(product_id, competitor_id, ts, price)``, called
+        with every appended chunk
+        """
+        self._listeners.append(listener)
+
+    def series(self, product_id: str, competitor_id: Optional[str] = None) -> Optional[PriceSeries]:
+        return self._series.get((product_id, competitor_id))
+
+    def append(
+        self,
+        product_id: str,
+        competitor_id: Optional[str],
+        timestamps: Sequence[Any],
+        prices: Sequence[float],
+    ) -> np.ndarray:
+        """
+        Append a chunk of ticks for one series
+
+        Timestamps may be datetimes or integer microseconds. Returns the
+        sequence numbers assigned to the new ticks.
+        """
+        if isinstance(timestamps, np.ndarray):
+            ts = timestamps.astype(np.int64, copy=False)
+        else:
+            ts = np.fromiter(
+                (to_micros(t) if isinstance(t, datetime) else int(t) for t in timestamps),
+                dtype=np.int64,
+                count=len(timestamps),
+            )
+        price = np.asarray(prices, dtype=np.float64)
+        if ts.shape != price.shape:
+            raise ValueError("timestamps and prices must have the same length")
+
+        seq = np.arange(self._next_seq, self._next_seq + len(ts), dtype=np.int64)
+        self._next_seq += len(ts)
+
+        key = (product_id, competitor_id)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = PriceSeries()
+            self._by_product.setdefault(product_id, set()).add(key)
+            if competitor_id is not None:
+                self._by_competitor.setdefault(competitor_id, set()).add(key)
+                self._competitor_sids.pop(competitor_id, None)
+            self._sids[key] = self._order.add_series()
+            self._sid_keys.append(key)
+        series.append(ts, price, seq)
+        self._order.add(self._sids[key], ts, seq, price)
+        for listener in self._listeners:
+            listener(product_id, competitor_id, ts, price)
+        return seq
+
+    def record(self, product_id: str, price: float, competitor_id: Optional[str] = None,
+               timestamp: Optional[datetime] = None) -> int:
+        """Append a single tick"""
+        seq = self.append(product_id, competitor_id, [timestamp or datetime.now()], [price])
+        return int(seq[0])
+
+    def extend(self, ticks: Iterable[Sequence[Any]]) -> int:
+        """
+        Append ticks for any number of series
+
+        Each tick starts with (product_id, competitor_id, timestamp in
+        microseconds, price); ticks are grouped so every series receives a
+        single chunk.
+        """
+        grouped: Dict[SeriesKey, Tuple[List[int], List[float]]] = {}
+        count = 0
+        for tick in ticks:
+            columns = grouped.get((tick[0], tick[1]))
+            if columns is None:
+                columns = grouped[(tick[0], tick[1])] = ([], [])
+            columns[0].append(tick[2])
+            columns[1].append(tick[3])
+            count += 1
+        for (product_id, competitor_id), (ts, prices) in grouped.items():
+            self.append(product_id, competitor_id, np.array(ts, dtype=np.int64), prices)
+        return count
+
+    def has_tick(self, product_id: str, competitor_id: Optional[str], ts_us: int) -> bool:
+        """Whether the series already holds a tick at exactly this time"""
+        series = self._series.get((product_id, competitor_id))
+        if series is None:
+            return False
+        lo, hi = series.bounds(ts_us, ts_us)
+        return hi > lo
+
+    def drop_product(self, product_id: str) -> None:
+        for key in self._by_product.pop(product_id, set()):
+            del self._series[key]
+            self._order.drop_series(self._sids.pop(key))
+            if key[1] is not None:
+                self._competitor_sids.pop(key[1], None)
+                keys = self._by_competitor.get(key[1])
+                if keys is not None:
+                    keys.discard(key)
+
+    def _keys(self, product_id: Optional[str], competitor_id: Optional[str]) -> Iterable[SeriesKey]:
+        if product_id is not None and competitor_id is not None:
+            key = (product_id, competitor_id)
+            return [key] if key in self._series else []
+        if product_id is not None:
+            return self._by_product.get(product_id, ())
+        if competitor_id is not None:
+            return self._by_competitor.get(competitor_id, ())
+        return self._series.keys()
+
+    def query(
+        self,
+        product_id: Optional[str] = None,
+        competitor_id: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        limit: int = 100,
+        after: Optional[Tuple[int, int]] = None,
+    ) -> List[Tuple[int, str, Optional[str], float, datetime]]:
+        """
+        Return up to ``limit`` ticks in (timestamp, seq) order as
+        (seq, product_id, competitor_id, price, timestamp) tuples
+
+        ``after`` is the (timestamp in microseconds, seq) keyset position of
+        the last tick of the previous page.
+        """
+        rows = self.query_columns(product_id, competitor_id, start_date, end_date, limit, after)
+        keys = rows.keys
+        return [
+            (seq, keys[owner][0], keys[owner][1], price, from_micros(ts))
+            for owner, seq, price, ts in zip(
+                rows.owner.tolist(), rows.seq.tolist(), rows.price.tolist(), rows.ts.tolist()
+            )
+        ]
+
+    def query_columns(
+        self,
+        product_id: Optional[str] = None,
+        competitor_id: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        limit: int = 100,
+        after: Optional[Tuple[int, int]] = None,
+    ) -> PriceRows:
+        """``query`` as columns, with timestamps in microseconds"""
+        start_us = to_micros(start_date) if start_date else None
+        end_us = to_micros(end_date) if end_date else None
+
+        series_keys = self._keys(product_id, competitor_id)
+        if product_id is None and len(series_keys) > MERGE_SERIES_THRESHOLD:
+            keep = self._order.alive
+            if competitor_id is not None:
+                sids = self._competitor_sids.get(competitor_id)
+                if sids is None:
+                    sids = self._competitor_sids[competitor_id] = np.fromiter(
+                        (self._sids[key] for key in series_keys), dtype=np.int64, count=len(series_keys)
+                    )
+                keep = np.zeros_like(keep)
+                keep[sids] = True
+            sid, ts, seq, price = self._order.page(keep, start_us, end_us, limit, after)
+            sids, owner = np.unique(sid, return_inverse=True)
+            keys = [self._sid_keys[s] for s in sids.tolist()]
+            return PriceRows(keys, owner.astype(np.int64), seq, ts, price)
+
+        keys, ts_parts, seq_parts, price_parts, owner_parts = [], [], [], [], []
+        for key in series_keys:
+            series = self._series[key]
+            lo, hi = series.bounds(start_us, end_us)
+            if after is not None:
+                lo = max(lo, series.seek(*after))
+            hi = min(hi, lo + limit)
+            if lo >= hi:
+                continue
+            ts_parts.append(series.ts[lo:hi])
+            seq_parts.append(series.seq[lo:hi])
+            price_parts.append(series.price[lo:hi])
+            owner_parts.append(np.full(hi - lo, len(keys), dtype=np.int64))
+            keys.append(key)
+
+        if not keys:
+            empty = np.empty(0, dtype=np.int64)
+            return PriceRows([], empty, empty, empty, np.empty(0, dtype=np.float64))
+        ts = np.concatenate(ts_parts)
+        seq = np.concatenate(seq_parts)
+        order = np.lexsort((seq, ts))[:limit]
+        price = np.concatenate(price_parts)[order]
+        owner = np.concatenate(owner_parts)[order]
+        return PriceRows(keys, owner, seq[order], ts[order], price)
+
+    def scan(
+        self,
+        product_id: Optional[str] = None,
+        competitor_id: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        chunk_size: int = 10000,
+    ) -> Iterator[PriceBatch]:
+        """
+        Yield matching ticks series by series in chunks of ``chunk_size``
+
+        Ticks come out grouped by (product, competitor) and in timestamp order
+        within each series, so memory use is bounded by one chunk regardless
+        of the result size.
+        """
+        start_us = to_micros(start_date) if start_date else None
+        end_us = to_micros(end_date) if end_date else None
+
+        # Snapshot the keys: consumers may interleave with writers between chunks
+        keys = sorted(self._keys(product_id, competitor_id), key=lambda k: (k[0], k[1] or ""))
+        for key in keys:
+            after = None
+            while True:
+                series = self._series.get(key)
+                if series is None:
+                    break
+                lo, hi = series.bounds(start_us, end_us)
+                if after is not None:
+                    lo = max(lo, series.seek(*after))
+                hi = min(hi, lo + chunk_size)
+                if lo >= hi:
+                    break
+                batch = PriceBatch(
+                    key[0], key[1],
+                    series.seq[lo:hi].copy(), series.ts[lo:hi].copy(), series.price[lo:hi].copy(),
+                )
+                after = (int(batch.ts[-1]), int(batch.seq[-1]))
+                yield batch
+
+    def analysis(self, product_id: str, current_price: float, timeframe: str = "daily",
+                 now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Compute the PriceAnalysis statistics for a product"""
+        now_us = to_micros(now or datetime.now())
+        window_us = TIMEFRAME_WINDOWS[timeframe] // MICROSECOND
+
+        stats: Dict[str, Any] = {
+            "current_price": current_price,
+            "avg_price": current_price,
+            "min_price": current_price,
+            "max_price": current_price,
+            "price_trend": "stable",
+            "price_change_24h": 0.0,
+            "price_change_7d": 0.0,
+            "price_change_30d": 0.0,
+        }
+
+        series = self._series.get((product_id, None))
+        if series is not None and len(series):
+            lo, hi = series.bounds(now_us - window_us, now_us)
+            if hi > lo:
+                stats["avg_price"] = round(series.mean(lo, hi), 2)
+                stats["min_price"] = series.min(lo, hi)
+                stats["max_price"] = series.max(lo, hi)
+                stats["price_trend"] = self._trend(series, lo, hi)
+            latest = series.price_at(now_us)
+            if latest is not None:
+                for field, delta in (("price_change_24h", timedelta(hours=24)),
+                                     ("price_change_7d", timedelta(days=7)),
+                                     ("price_change_30d", timedelta(days=30))):
+                    stats[field] = percent_change(series.price_at(now_us - delta // MICROSECOND), latest)
+
+        competitor_prices = []
+        for key in self._by_product.get(product_id, ()):
+            if key[1] is None:
+                continue
+            latest = self._series[key].latest()
+            if latest is not None:
+                competitor_prices.append({
+                    "competitor_id": key[1],
+                    "price": latest[1],
+                    "timestamp": from_micros(latest[0]),
+                })
+        competitor_prices.sort(key=lambda entry: entry["competitor_id"])
+        stats["competitor_prices"] = competitor_prices
+        return stats
+
+    def summary(self, product_ids: Optional[Iterable[str]] = None, start_us: Optional[int] = None,
+                end_us: Optional[int] = None) -> Dict[str, Any]:
+        """
+        One row per series, as columns: product_id, competitor_id, latest
+        price, and tick count, mean, min and max within [start_us, end_us]
+        (NaN when the window is empty)
+        """
+        if product_ids is None:
+            keys: Iterable[SeriesKey] = list(self._series)
+        else:
+            keys = [key for product_id in product_ids for key in self._by_product.get(product_id, ())]
+        product_col: List[str] = []
+        competitor_col: List[Optional[str]] = []
+        latest_col: List[float] = []
+        counts: List[int] = []
+        # Short windows are reduced together in one pass; long ones use the
+        # per-series block summaries
+        gathered: List[np.ndarray] = []
+        gathered_rows: List[int] = []
+        long_rows: List[Tuple[int, float, float, float]] = []
+        for key in keys:
+            series = self._series[key]
+            if not series.size:
+                continue
+            lo, hi = series.bounds(start_us, end_us)
+            row = len(counts)
+            product_col.append(key[0])
+            competitor_col.append(key[1])
+            latest_col.append(series.price[series.size - 1])
+            counts.append(hi - lo)
+            if hi - lo > SUMMARY_GATHER_LIMIT:
+                long_rows.append((row, series.mean(lo, hi), series.min(lo, hi), series.max(lo, hi)))
+            elif hi > lo:
+                gathered.append(series.price[lo:hi])
+                gathered_rows.append(row)
+
+        mean = np.full(len(counts), np.nan)
+        low = np.full(len(counts), np.nan)
+        high = np.full(len(counts), np.nan)
+        if gathered:
+            rows = np.array(gathered_rows, dtype=np.int64)
+            offsets = np.zeros(len(gathered), dtype=np.int64)
+            np.cumsum([len(chunk) for chunk in gathered[:-1]], out=offsets[1:])
+            values = np.concatenate(gathered)
+            mean[rows] = np.add.reduceat(values, offsets) / np.diff(np.r_[offsets, len(values)])
+            low[rows] = np.minimum.reduceat(values, offsets)
+            high[rows] = np.maximum.reduceat(values, offsets)
+        for row, row_mean, row_min, row_max in long_rows:
+            mean[row], low[row], high[row] = row_mean, row_min, row_max
+        return {
+            "product_id": product_col,
+            "competitor_id": competitor_col,
+            "latest": np.array(latest_col, dtype=np.float64),
+            "count": np.array(counts, dtype=np.int64),
+            "mean": mean,
+            "min": low,
+            "max": high,
+        }
+
+    @staticmethod
+    def _trend(series: PriceSeries, lo: int, hi: int) -> str:
+        """Compare the mean price of the two halves of the window"""
+        if hi - lo < 2:
+            return "stable"
+        mid = (lo + hi) // 2
+        earlier, later = series.mean(lo, mid), series.mean(mid, hi)
+        if not earlier:
+            return "stable"
+        change = (later - earlier) / earlier
+        if change > TREND_TOLERANCE:
+            return "increasing"
+        if change < -TREND_TOLERANCE:
+            return "decreasing"
+        return "stable"
@@ -0,0 +1,327 @@
+"""
+Price recommendation engine
+Competitor position, an elasticity estimate and strategy suggestions for
+any number of products at once, computed column-wise with pandas/NumPy
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from datetime import datetime
+import asyncio
+import itertools
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel, Field
+
+from db import row_uuid
+
+logger = logging.getLogger(__name__)
+
+INSIGHT_TYPE = "price_recommendation"
+
+# Elasticity of a product with no visible competition, and the floor it
+# approaches in a crowded, undifferentiated market
+BASE_ELASTICITY = -0.3
+MAX_ELASTICITY = -2.5
+# Assumed gross margin when estimating margin impact (no cost data yet)
+DEFAULT_MARGIN = 0.235
+# Price index band treated as "competitive"
+POSITION_BAND = 0.05
+# Largest single price move a strategy may suggest
+MAX_STEP = 0.10
+UNDERCUT = 0.01
+
+
+
+class RecommendationConfig(BaseModel):
+    lookback_days: int = Field(30, ge=1, description="Window of price history behind each estimate")
+    ttl_hours: float = Field(24.0, gt=0, description="valid_until offset of stored insights")
+    refresh_seconds: Optional[float] = Field(None, gt=0, description="Catalog-wide refresh period; None disables it")
+
+    @classmethod
+    def from_env(cls) -> "RecommendationConfig":
+        """Build a config from the RECOMMENDATION_* variables"""
+        refresh = os.getenv("RECOMMENDATION_REFRESH_SECONDS")
+        return cls(
+            lookback_days=int(os.getenv("RECOMMENDATION_LOOKBACK_DAYS", 30)),
+            ttl_hours=float(os.getenv("RECOMMENDATION_TTL_HOURS", 24.0)),
+            refresh_seconds=float(refresh) if refresh else None,
+        )
+
+
+def products_frame(products: Iterable[Any]) -> pd.DataFrame:
+    """product_id/price frame from catalog products"""
+    ids, prices = [], []
+    for product in products:
+        ids.append(product.id)
+        prices.append(product.price)
+    return pd.DataFrame({"product_id": ids, "price": np.array(prices, dtype=np.float64)})
+
+
+def _percent(values: np.ndarray) -> List[str]:
+    return [f"{value:+.1f}%" for value in values.tolist()]
+
+
+def competitor_frame(summary: Dict[str, list]) -> pd.DataFrame:
+    """Per-product competitor statistics from latest competitor prices"""
+    quotes = pd.DataFrame({
+        "product_id": summary["product_id"],
+        "competitor_id": summary["competitor_id"],
+        "latest": summary["latest"],
+    })
+    quotes = quotes[quotes["competitor_id"].notna()]
+    return quotes.groupby("product_id")["latest"].agg(
+        competitor_count="count",
+        competitor_mean="mean",
+        competitor_min="min",
+        competitor_max="max",
+    )
+
+
+def history_frame(summary: Dict[str, list]) -> pd.DataFrame:
+    """Per-product tick count and relative price range of our own price series"""
+    own = pd.DataFrame(summary)
+    own = own[own["competitor_id"].isna()].set_index("product_id")
+    return pd.DataFrame({
+        "history_count": own["count"],
+        "volatility": ((own["max"] - own["min"]) / own["mean"]).fillna(0.0),
+    })
+
+
+def recommend(products: pd.DataFrame, summary: Dict[str, list]) -> pd.DataFrame:
+    """
+    Recommendation columns for every product
+
+    ``products`` has product_id and price columns; ``summary`` is the output
+    of PriceHistoryStore.summary for the look-back window.
+
+    Without sales volumes the elasticity is a structural estimate: it starts
+    at BASE_ELASTICITY and moves towards MAX_ELASTICITY as the number of
+    competitors grows, damped by how differentiated the market looks (spread
+    of competitor prices plus our own price volatility).
+    """
+    frame = products.set_index("product_id")[["price"]]
+    frame = frame.join(competitor_frame(summary)).join(history_frame(summary))
+    frame["competitor_count"] = frame["competitor_count"].fillna(0).astype(np.int64)
+    frame["history_count"] = frame["history_count"].fillna(0).astype(np.int64)
+    frame["volatility"] = frame["volatility"].fillna(0.0)
+
+    price = frame["price"].to_numpy(dtype=np.float64)
+    count = frame["competitor_count"].to_numpy()
+    has_competitors = count > 0
+    comp_mean = frame["competitor_mean"].to_numpy(dtype=np.float64)
+    comp_min = frame["competitor_min"].to_numpy(dtype=np.float64)
+    comp_max = frame["competitor_max"].to_numpy(dtype=np.float64)
+
+    # Competitor position
+    with np.errstate(invalid="ignore", divide="ignore"):
+        price_index = np.where(has_competitors, price / comp_mean, np.nan)
+        dispersion = np.where(count > 1, (comp_max - comp_min) / comp_mean, 0.0)
+    position = np.select(
+        [~has_competitors, price_index > 1 + POSITION_BAND, price_index < 1 - POSITION_BAND],
+        ["no_competitor_data", "premium", "discount"],
+        default="competitive",
+    )
+
+    # Elasticity
+    pressure = count / (count + 2.0)
+    differentiation = np.clip(dispersion + frame["volatility"].to_numpy(), 0.0, 1.0)
+    elasticity = BASE_ELASTICITY + (MAX_ELASTICITY - BASE_ELASTICITY) * pressure * (1 - differentiation)
+
+    # Data quality drives every confidence score
+    data_confidence = (
+        0.5
+        + 0.25 * np.minimum(count, 3) / 3
+        + 0.25 * np.minimum(frame["history_count"].to_numpy(), 30) / 30
+    )
+
+    # Competitive pricing: sit just under the cheapest competitor
+    target = np.where(has_competitors, comp_min * (1 - UNDERCUT), price)
+    competitive = np.clip(target, price * (1 - MAX_STEP), price * (1 + MAX_STEP))
+    competitive_confidence = np.where(has_competitors, data_confidence * (0.6 + 0.4 * pressure), 0.0)
+
+    # Premium positioning: raise inelastic products, more the less elastic
+    raise_by = np.where(elasticity > -1, np.minimum(MAX_STEP, 0.02 / -elasticity), 0.0)
+    premium = price * (1 + raise_by)
+    premium_confidence = np.where(raise_by > 0, data_confidence * np.clip(1 + elasticity, 0.0, 1.0), 0.0)
+
+    out = pd.DataFrame({
+        "product_id": frame.index.to_numpy(),
+        "current_price": price,
+        "competitor_count": count,
+        "avg_competitor_price": comp_mean,
+        "min_competitor_price": comp_min,
+        "price_index": price_index,
+        "market_position": position,
+        "price_elasticity": elasticity,
+    })
+    for name, suggested, confidence in (
+        ("competitive", competitive, competitive_confidence),
+        ("premium", premium, premium_confidence),
+    ):
+        change = suggested / price - 1
+        out[f"{name}_price"] = suggested
+        out[f"{name}_confidence"] = confidence
+        out[f"{name}_price_change"] = change * 100
+        out[f"{name}_volume_change"] = elasticity * change * 100
+        out[f"{name}_revenue_change"] = ((1 + change) * (1 + elasticity * change) - 1) * 100
+        # Margin rate change in percentage points at an unchanged unit cost
+        cost = price * (1 - DEFAULT_MARGIN)
+        out[f"{name}_margin_change"] = ((suggested - cost) / suggested - DEFAULT_MARGIN) * 100
+    return out
+
+
+STRATEGIES = (("competitive", "competitive_pricing"), ("premium", "premium_positioning"))
+IMPACT_FIELDS = ("revenue_change", "volume_change", "margin_change")
+
+
+def _competitive_reasoning(count: int, change: float, elasticity: float) -> str:
+    if change < 0:
+        return f"Undercut the cheapest of {count} competitors by {UNDERCUT:.0%}"
+    if change > 0:
+        return "Already cheapest; room to raise while staying below competitors"
+    return "Price already matches the competitive target"
+
+
+def _premium_reasoning(count: int, change: float, elasticity: float) -> str:
+    return f"Estimated elasticity {elasticity:.2f} leaves room for a premium increase"
+
+
+_REASONING = {"competitive": _competitive_reasoning, "premium": _premium_reasoning}
+
+
+def to_payloads(frame: pd.DataFrame, confidence_threshold: float = 0.0) -> List[Dict[str, Any]]:
+    """
+    Recommendation payloads, keeping strategies at or above
+    ``confidence_threshold``; a strategy that does not apply has zero
+    confidence and is always left out
+    """
+    column = {name: values.tolist() for name, values in frame.items()}
+    avg_price = frame["avg_competitor_price"].round(2)
+    avg_price = avg_price.astype(object).where(avg_price.notna(), None).tolist()
+    elasticity = frame["price_elasticity"].round(2).tolist()
+    strategies = []
+    for name, strategy in STRATEGIES:
+        strategies.append((
+            strategy,
+            _REASONING[name],
+            frame[f"{name}_price"].round(2).tolist(),
+            frame[f"{name}_confidence"].round(2).tolist(),
+            column[f"{name}_price_change"],
+            [_percent(frame[f"{name}_{field}"].to_numpy()) for field in IMPACT_FIELDS],
+        ))
+
+    payloads = []
+    for i, product_id in enumerate(column["product_id"]):
+        count = column["competitor_count"][i]
+        recommendations = []
+        for strategy, reasoning, suggested, confidence, change, (revenue, volume, margin) in strategies:
+            if confidence[i] <= 0 or confidence[i] < confidence_threshold:
+                continue
+            recommendations.append({
+                "strategy": strategy,
+                "suggested_price": suggested[i],
+                "confidence": confidence[i],
+                "expected_impact": {
+                    "revenue_change": revenue[i],
+                    "volume_change": volume[i],
+                    "margin_change": margin[i],
+                },
+                "reasoning": reasoning(count, change[i], elasticity[i]),
+            })
+        payloads.append({
+            "product_id": product_id,
+            "current_price": column["current_price"][i],
+            "recommendations": recommendations,
+            "market_analysis": {
+                "avg_competitor_price": avg_price[i],
+                "competitor_count": count,
+                "price_elasticity": elasticity[i],
+                "market_position": column["market_position"][i],
+            },
+        })
+    return payloads
+
+
+class PostgresInsightWriter:
+    """Replaces the price recommendation rows of ai_insights for a set of products"""
+
+    COLUMNS = ("product_id", "insight_type", "insight_text", "confidence_score", "metadata", "valid_until")
+
+    def __init__(self, pool: Any):
+        self.pool = pool
+
+    @staticmethod
+    def records(payloads: List[Dict[str, Any]], valid_until: datetime) -> List[tuple]:
+        """One row per product with a recommendation, describing its most confident strategy"""
+        records = []
+        for payload in payloads:
+            best = max(payload["recommendations"], key=lambda r: r["confidence"], default=None)
+            if best is None:
+                continue
+            records.append((
+                row_uuid(payload["product_id"]),
+                INSIGHT_TYPE,
+                f"{best['strategy']}: {payload['current_price']:.2f} -> {best['suggested_price']:.2f}",
+                best["confidence"],
+                json.dumps(payload),
+                valid_until,
+            ))
+        return records
+
+    async def write(self, payloads: List[Dict[str, Any]], valid_until: datetime) -> int:
+        if not payloads:
+            return 0
+        # JSON encoding a catalog's worth of payloads would stall the event loop
+        records = await asyncio.to_thread(self.records, payloads, valid_until)
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                # Products without a recommendation this run lose their old one too
+                await conn.execute(
+                    "DELETE FROM ai_insights WHERE insight_type = $1 AND product_id = ANY($2::uuid[])",
+                    INSIGHT_TYPE, [row_uuid(payload["product_id"]) for payload in payloads],
+                )
+                await conn.copy_records_to_table("ai_insights", records=records, columns=list(self.COLUMNS))
+        return len(records)
+
+
+class RecommendationJobs:
+    """Background catalog-wide recommendation runs and their status"""
+
+    def __init__(self, max_history: int = 20):
+        self.max_history = max_history
+        self._ids = itertools.count(1)
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+    def running(self) -> Optional[Dict[str, Any]]:
+        return next((job for job in self._jobs.values() if job["status"] == "running"), None)
+
+    def start(self, run: Callable[[], Any]) -> Dict[str, Any]:
+        """Schedule ``run`` (a coroutine function returning a result dict) as a new job"""
+        job_id = f"job_{next(self._ids)}"
+        job = {"id": job_id, "status": "running", "started_at": datetime.now(), "finished_at": None,
+               "result": None, "error": None}
+        self._jobs[job_id] = job
+        while len(self._jobs) > self.max_history:
+            del self._jobs[next(iter(self._jobs))]
+        self._tasks[job_id] = asyncio.get_running_loop().create_task(self._run(job, run))
+        return job
+
+    async def _run(self, job: Dict[str, Any], run: Callable[[], Any]) -> None:
+        try:
+            job["result"] = await run()
+            job["status"] = "completed"
+        except Exception as e:
+            logger.exception("Recommendation job %s failed", job["id"])
+            job["status"] = "failed"
+            job["error"] = str(e)
+        finally:
+            job["finished_at"] = datetime.now()
+            self._tasks.pop(job["id"], None)
@@ -0,0 +1,269 @@
+"""
+Time-bucket rollups
+OHLC, sum and count per hourly/daily/weekly/monthly bucket, maintained as
+ticks arrive so trend queries read pre-aggregated points instead of raw
+history. The same aggregates can be upserted into the price_rollups table
+on Postgres or SQLite.
+"""
+
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple
+from datetime import datetime
+import numpy as np
+
+from db import row_uuid
+from price_history import from_micros, to_micros
+
+HOUR_US = 3_600_000_000
+DAY_US = 24 * HOUR_US
+
+BUCKET_SIZES = ("hourly", "daily", "weekly", "monthly")
+
+# Column order shared by the in-memory chunks and the SQL rows
+AGGREGATE_FIELDS = ("open", "high", "low", "close", "open_ts", "close_ts", "total", "count")
+
+
+def bucket_ids(ts_us: np.ndarray, bucket: str) -> np.ndarray:
+    """Integer bucket number of each timestamp (weeks start on Monday)"""
+    if bucket == "hourly":
+        return ts_us // HOUR_US
+    if bucket == "daily":
+        return ts_us // DAY_US
+    if bucket == "weekly":
+        # 1970-01-01 was a Thursday
+        return (ts_us // DAY_US + 3) // 7
+    if bucket == "monthly":
+        return ts_us.astype("datetime64[us]").astype("datetime64[M]").astype(np.int64)
+    raise ValueError(f"Unknown bucket size: {bucket}")
+
+
+def bucket_starts(ids: np.ndarray, bucket: str) -> np.ndarray:
+    """Start of each bucket in microseconds"""
+    if bucket == "hourly":
+        return ids * HOUR_US
+    if bucket == "daily":
+        return ids * DAY_US
+    if bucket == "weekly":
+        return (ids * 7 - 3) * DAY_US
+    if bucket == "monthly":
+        return ids.astype("datetime64[M]").astype("datetime64[us]").astype(np.int64)
+    raise ValueError(f"Unknown bucket size: {bucket}")
+
+
+def aggregate_chunk(ts: np.ndarray, price: np.ndarray, bucket: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Per-bucket aggregates of a chunk of ticks sorted by timestamp"""
+    ids = bucket_ids(ts, bucket)
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    ends = np.r_[starts[1:], len(ids)]
+    return ids[starts], {
+        "open": price[starts],
+        "high": np.maximum.reduceat(price, starts),
+        "low": np.minimum.reduceat(price, starts),
+        "close": price[ends - 1],
+        "open_ts": ts[starts],
+        "close_ts": ts[ends - 1],
+        "total": np.add.reduceat(price, starts),
+        "count": (ends - starts).astype(np.int64),
+    }
+
+
+class RollupSeries:
+    """Sorted per-bucket aggregate columns for one series and bucket size"""
+
+    __slots__ = ("ids",) + AGGREGATE_FIELDS
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        for field in AGGREGATE_FIELDS:
+            dtype = np.int64 if field in ("open_ts", "close_ts", "count") else np.float64
+            setattr(self, field, np.empty(0, dtype=dtype))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def update(self, ids: np.ndarray, chunk: Dict[str, np.ndarray]) -> None:
+        """Fold a chunk of per-bucket aggregates into the series"""
+        pos = np.searchsorted(self.ids, ids)
+        exists = pos < len(self.ids)
+        exists[exists] = self.ids[pos[exists]] == ids[exists]
+
+        if exists.any():
+            p, c = pos[exists], {field: values[exists] for field, values in chunk.items()}
+            earlier = c["open_ts"] < self.open_ts[p]
+            self.open[p] = np.where(earlier, c["open"], self.open[p])
+            self.open_ts[p] = np.where(earlier, c["open_ts"], self.open_ts[p])
+            later = c["close_ts"] >= self.close_ts[p]
+            self.close[p] = np.where(later, c["close"], self.close[p])
+            self.close_ts[p] = np.where(later, c["close_ts"], self.close_ts[p])
+            self.high[p] = np.maximum(self.high[p], c["high"])
+            self.low[p] = np.minimum(self.low[p], c["low"])
+            self.total[p] += c["total"]
+            self.count[p] += c["count"]
+
+        new = ~exists
+        if new.any():
+            at = pos[new]
+            self.ids = np.insert(self.ids, at, ids[new])
+            for field, values in chunk.items():
+                setattr(self, field, np.insert(getattr(self, field), at, values[new]))
+
+    def tail(self, periods: int, end_id: Optional[int] = None) -> slice:
+        """Index range of the last ``periods`` buckets up to ``end_id``"""
+        hi = len(self.ids) if end_id is None else int(np.searchsorted(self.ids, end_id, side="right"))
+        return slice(max(0, hi - periods), hi)
+
+
+class RollupStore:
+    """Rollups for every bucket size, keyed by an arbitrary series key"""
+
+    def __init__(self, bucket_sizes: Sequence[str] = BUCKET_SIZES):
+        self.bucket_sizes = tuple(bucket_sizes)
+        self._series: Dict[Tuple[Hashable, str], RollupSeries] = {}
+
+    def add(self, key: Hashable, ts: np.ndarray, values: np.ndarray) -> None:
+        """Fold a chunk of (timestamp in microseconds, value) points into every bucket size"""
+        if len(ts) == 0:
+            return
+        ts = np.asarray(ts, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        if np.any(ts[1:] < ts[:-1]):
+            order = np.argsort(ts, kind="stable")
+            ts, values = ts[order], values[order]
+        for bucket in self.bucket_sizes:
+            series = self._series.get((key, bucket))
+            if series is None:
+                series = self._series[(key, bucket)] = RollupSeries()
+            series.update(*aggregate_chunk(ts, values, bucket))
+
+    def on_ticks(self, product_id: str, competitor_id: Optional[str], ts: np.ndarray, price: np.ndarray) -> None:
+        """PriceHistoryStore listener keeping price rollups current"""
+        self.add((product_id, competitor_id), ts, price)
+
+    def drop_where(self, predicate) -> None:
+        """Remove the rollups of every series key matching ``predicate``"""
+        for key in [key for key in self._series if predicate(key[0])]:
+            del self._series[key]
+
+    def points(
+        self,
+        key: Hashable,
+        bucket: str,
+        periods: int = 30,
+        end: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        """The last ``periods`` buckets as dicts, oldest first"""
+        series = self._series.get((key, bucket))
+        if series is None or not len(series):
+            return []
+        end_id = int(bucket_ids(np.array([to_micros(end)], dtype=np.int64), bucket)[0]) if end else None
+        window = series.tail(periods, end_id)
+        starts = bucket_starts(series.ids[window], bucket).tolist()
+        columns = {field: getattr(series, field)[window].tolist() for field in AGGREGATE_FIELDS}
+        return [
+            {
+                "bucket_start": from_micros(start),
+                "open": columns["open"][i],
+                "high": columns["high"][i],
+                "low": columns["low"][i],
+                "close": columns["close"][i],
+                "mean": columns["total"][i] / columns["count"][i],
+                "sum": columns["total"][i],
+                "count": columns["count"][i],
+            }
+            for i, start in enumerate(starts)
+        ]
+
+
+# Portable upsert for the price_rollups table (Postgres and SQLite >= 3.24)
+_ROLLUP_COLUMNS = (
+    "product_id", "competitor_id", "bucket_size", "bucket_start",
+    "open", "high", "low", "close", "open_ts", "close_ts", "price_sum", "tick_count",
+)
+
+_ROLLUP_UPSERT = """
+INSERT INTO price_rollups ({columns})
+VALUES ({placeholders})
+ON CONFLICT (product_id, competitor_id, bucket_size, bucket_start) DO UPDATE SET
+    open = CASE WHEN excluded.open_ts < price_rollups.open_ts
+                THEN excluded.open ELSE price_rollups.open END,
+    open_ts = CASE WHEN excluded.open_ts < price_rollups.open_ts
+                   THEN excluded.open_ts ELSE price_rollups.open_ts END,
+    close = CASE WHEN excluded.close_ts >= price_rollups.close_ts
+                 THEN excluded.close ELSE price_rollups.close END,
+    close_ts = CASE WHEN excluded.close_ts >= price_rollups.close_ts
+                    THEN excluded.close_ts ELSE price_rollups.close_ts END,
+    high = CASE WHEN excluded.high > price_rollups.high
+                THEN excluded.high ELSE price_rollups.high END,
+    low = CASE WHEN excluded.low < price_rollups.low
+               THEN excluded.low ELSE price_rollups.low END,
+    price_sum = price_rollups.price_sum + excluded.price_sum,
+    tick_count = price_rollups.tick_count + excluded.tick_count
+"""
+
+
+def rollup_upsert_sql(paramstyle: str = "numeric") -> str:
+    """Upsert statement using $n ("numeric", asyncpg) or ? ("qmark", sqlite3) parameters"""
+    if paramstyle == "numeric":
+        placeholders = ", ".join(f"${i}" for i in range(1, len(_ROLLUP_COLUMNS) + 1))
+    elif paramstyle == "qmark":
+        placeholders = ", ".join("?" for _ in _ROLLUP_COLUMNS)
+    else:
+        raise ValueError(f"Unsupported paramstyle: {paramstyle}")
+    return _ROLLUP_UPSERT.format(columns=", ".join(_ROLLUP_COLUMNS), placeholders=placeholders)
+
+
+def rollup_rows(
+    ticks: Iterable[Sequence[Any]],
+    bucket_sizes: Sequence[str] = BUCKET_SIZES,
+) -> Iterator[Tuple[Any, ...]]:
+    """
+    Upsert rows aggregating a batch of (product_id, competitor_id,
+    timestamp in microseconds, price, ...) ticks
+
+    Internal prices use an empty competitor_id so the conflict target works
+    without NULL handling on every engine.
+    """
+    grouped: Dict[Tuple[str, Optional[str]], Tuple[List[int], List[float]]] = {}
+    for tick in ticks:
+        columns = grouped.setdefault((tick[0], tick[1]), ([], []))
+        columns[0].append(tick[2])
+        columns[1].append(tick[3])
+
+    for (product_id, competitor_id), (ts_list, price_list) in grouped.items():
+        ts = np.array(ts_list, dtype=np.int64)
+        price = np.array(price_list, dtype=np.float64)
+        order = np.argsort(ts, kind="stable")
+        ts, price = ts[order], price[order]
+        for bucket in bucket_sizes:
+            ids, chunk = aggregate_chunk(ts, price, bucket)
+            starts = bucket_starts(ids, bucket).tolist()
+            columns = {field: values.tolist() for field, values in chunk.items()}
+            for i, start in enumerate(starts):
+                yield (
+                    product_id, competitor_id or "", bucket, from_micros(start),
+                    columns["open"][i], columns["high"][i], columns["low"][i], columns["close"][i],
+                    from_micros(columns["open_ts"][i]), from_micros(columns["close_ts"][i]),
+                    columns["total"][i], columns["count"][i],
+                )
+
+
+class SqlRollupWriter:
+    """
+    Upserts the rollups of ingested tick batches into price_rollups
+
+    Ids are written as the text of their ``row_uuid``, matching price_history.
+    """
+
+    def __init__(self, pool: Any, paramstyle: str = "numeric"):
+        self.pool = pool
+        self.sql = rollup_upsert_sql(paramstyle)
+
+    async def write(self, ticks: Sequence[Sequence[Any]]) -> int:
+        rows = list(rollup_rows(
+            (str(row_uuid(tick[0])), str(row_uuid(tick[1])) if tick[1] is not None else None, tick[2], tick[3])
+            for tick in ticks
+        ))
+        if not rows:
+            return 0
+        async with self.pool.acquire() as conn:
+            await conn.executemany(self.sql, rows)
+        return len(rows)
@@ -0,0 +1,416 @@
+"""
+Product search index
+Name, SKU, category and description tokens go into one inverted index with
+per-field weights, ranked with BM25. The last query word also matches as a
+prefix, and partial SKUs are found through a trigram index over SKUs.
+Prices are kept in a sorted index for range filters and price ordering,
+and facet counts by category and price band are returned with each search.
+"""
+
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from itertools import islice
+import heapq
+import math
+
+from matching import TOKEN_PATTERN, normalize, sku_key
+
+FIELD_WEIGHTS = (("name", 3.0), ("sku", 2.0), ("category", 1.0), ("description", 1.0))
+# Lower edges of the price-band facet
+PRICE_BANDS = (0, 25, 50, 100, 250, 500, 1000)
+# Vocabulary terms a trailing prefix may expand to
+MAX_PREFIX_TERMS = 50
+MIN_PREFIX_LENGTH = 2
+MIN_SKU_FRAGMENT = 3
+# Added to the text score of SKU matches so they rank first
+SKU_EXACT_BOOST = 100.0
+SKU_PARTIAL_BOOST = 50.0
+
+SORT_ORDERS = ("relevance", "price_asc", "price_desc")
+# Sorts after any term
+HIGHEST = "\uffff"
+
+
+def price_band(price: float) -> str:
+    i = max(0, bisect_right(PRICE_BANDS, price) - 1)
+    if i + 1 < len(PRICE_BANDS):
+        return f"{PRICE_BANDS[i]}-{PRICE_BANDS[i + 1]}"
+    return f"{PRICE_BANDS[i]}+"
+
+
+def _terms(text: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(normalize(text)) if text else []
+
+
+def _sku_trigrams(key: str) -> Set[str]:
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+class SearchHit(NamedTuple):
+    product_id: str
+    score: float
+
+
+class SearchResult(NamedTuple):
+    hits: List[SearchHit]
+    total: int
+    facets: Dict[str, Dict[str, int]]
+
+
+class SortedPriceIndex:
+    """
+    Product ids in ascending price order, for range scans and price ordering
+
+    Prices and ids are parallel lists, so a range of ids is a plain slice.
+    Equal prices keep insertion order.
+    """
+
+    def __init__(self):
+        self._prices: List[float] = []
+        self._ids: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, price: float, product_id: str) -> None:
+        pos = bisect_right(self._prices, price)
+        self._prices.insert(pos, price)
+        self._ids.insert(pos, product_id)
+
+    def append(self, price: float, product_id: str) -> None:
+        """Add out of order; call sort() before the next lookup"""
+        self._prices.append(price)
+        self._ids.append(product_id)
+
+    def sort(self) -> None:
+        order = sorted(range(len(self._prices)), key=self._prices.__getitem__)
+        self._prices = [self._prices[i] for i in order]
+        self._ids = [self._ids[i] for i in order]
+
+    def remove(self, price: float, product_id: str) -> None:
+        pos = bisect_left(self._prices, price)
+        end = bisect_right(self._prices, price, pos)
+        for i in range(pos, end):
+            if self._ids[i] == product_id:
+                del self._prices[i]
+                del self._ids[i]
+                return
+
+    def _bounds(self, low: float, high: float) -> Tuple[int, int]:
+        return bisect_left(self._prices, low), bisect_right(self._prices, high)
+
+    def between(self, low: float, high: float, descending: bool = False) -> Iterable[str]:
+        """Ids with low <= price <= high, in price order"""
+        start, end = self._bounds(low, high)
+        positions = range(end - 1, start - 1, -1) if descending else range(start, end)
+        return map(self._ids.__getitem__, positions)
+
+    def ids_between(self, low: float, high: float) -> List[str]:
+        start, end = self._bounds(low, high)
+        return self._ids[start:end]
+
+    def count(self, low: float, high: float) -> int:
+        start, end = self._bounds(low, high)
+        return end - start
+
+
+class ProductSearchIndex:
+    """
+    Incrementally maintained full-text, SKU and price index over products
+
+    Products are any objects exposing ``id``, ``name``, ``sku``,
+    ``category``, ``description`` and ``price``. Every query word must
+    match; the score is the BM25 sum over words, with the best-scoring
+    expansion counting for a trailing prefix.
+    """
+
+    def __init__(self, products: Iterable[Any] = (), k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # Term -> product id -> field-weighted term frequency
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._vocabulary: List[str] = []
+        self._doc_terms: Dict[str, Tuple[str, ...]] = {}
+        self._lengths: Dict[str, float] = {}
+        self._total_length = 0.0
+        self._prices: Dict[str, float] = {}
+        self._categories: Dict[str, str] = {}
+        # Category -> product ids, in insertion order
+        self._by_category: Dict[str, Dict[str, None]] = {}
+        self._bands: Dict[str, str] = {}
+        self._band_counts: Counter = Counter()
+        self._price_index = SortedPriceIndex()
+        self._sku_keys: Dict[str, str] = {}
+        self._sku_trigrams: Dict[str, Set[str]] = {}
+        self._loading = False
+
+        # Bulk load: append everything, then sort the ordered indexes once
+        self._loading = True
+        for product in products:
+            self.add(product)
+        self._loading = False
+        self._vocabulary.sort()
+        self._price_index.sort()
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._doc_terms
+
+    def add(self, product: Any) -> None:
+        """Index a product, replacing its previous entry"""
+        product_id = product.id
+        if product_id in self._doc_terms:
+            self.remove(product_id)
+
+        frequencies: Dict[str, float] = {}
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS:
+            for term in _terms(getattr(product, field, None)):
+                frequencies[term] = frequencies.get(term, 0.0) + weight
+                length += weight
+        for term, frequency in frequencies.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if self._loading:
+                    self._vocabulary.append(term)
+                else:
+                    insort(self._vocabulary, term)
+            postings[product_id] = frequency
+        self._doc_terms[product_id] = tuple(frequencies)
+        self._lengths[product_id] = length
+        self._total_length += length
+
+        category = product.category.lower()
+        band = price_band(product.price)
+        self._prices[product_id] = product.price
+        self._categories[product_id] = category
+        self._by_category.setdefault(category, {})[product_id] = None
+        self._bands[product_id] = band
+        self._band_counts[band] += 1
+        if self._loading:
+            self._price_index.append(product.price, product_id)
+        else:
+            self._price_index.add(product.price, product_id)
+
+        key = sku_key(product.sku)
+        self._sku_keys[product_id] = key
+        for gram in _sku_trigrams(key):
+            self._sku_trigrams.setdefault(gram, set()).add(product_id)
+
+    def update(self, product: Any) -> None:
+        self.add(product)
+
+    def remove(self, product_id: str) -> None:
+        terms = self._doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            del postings[product_id]
+            if not postings:
+                del self._postings[term]
+                del self._vocabulary[bisect_left(self._vocabulary, term)]
+        self._total_length -= self._lengths.pop(product_id)
+
+        price = self._prices.pop(product_id)
+        self._price_index.remove(price, product_id)
+        category = self._categories.pop(product_id)
+        members = self._by_category[category]
+        del members[product_id]
+        if not members:
+            del self._by_category[category]
+        band = self._bands.pop(product_id)
+        self._band_counts[band] -= 1
+        if not self._band_counts[band]:
+            del self._band_counts[band]
+
+        key = self._sku_keys.pop(product_id)
+        for gram in _sku_trigrams(key):
+            holders = self._sku_trigrams[gram]
+            holders.discard(product_id)
+            if not holders:
+                del self._sku_trigrams[gram]
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        """The most frequent vocabulary terms starting with ``prefix``"""
+        start = bisect_left(self._vocabulary, prefix)
+        end = bisect_left(self._vocabulary, prefix + HIGHEST, start)
+        terms = self._vocabulary[start:end]
+        if len(terms) > MAX_PREFIX_TERMS:
+            terms = heapq.nlargest(MAX_PREFIX_TERMS, terms, key=lambda t: len(self._postings[t]))
+        return terms
+
+    def _sku_matches(self, fragment: str) -> Dict[str, float]:
+        """Products whose SKU contains ``fragment``, with their boost"""
+        grams = sorted(_sku_trigrams(fragment), key=lambda g: len(self._sku_trigrams.get(g, ())))
+        if not grams or grams[0] not in self._sku_trigrams:
+            return {}
+        candidates = set(self._sku_trigrams[grams[0]])
+        for gram in grams[1:]:
+            candidates &= self._sku_trigrams.get(gram, set())
+            if not candidates:
+                return {}
+        return {
+            product_id: SKU_EXACT_BOOST if self._sku_keys[product_id] == fragment else SKU_PARTIAL_BOOST
+            for product_id in candidates
+            if fragment in self._sku_keys[product_id]
+        }
+
+    def _text_matches(self, words: List[str]) -> Tuple[Set[str], List[List[Dict[str, float]]]]:
+        """Products matching every word, and per word the postings of the terms it may stand for"""
+        expansions: List[List[Dict[str, float]]] = []
+        for i, word in enumerate(words):
+            terms = [word] if word in self._postings else []
+            if i == len(words) - 1 and len(word) >= MIN_PREFIX_LENGTH:
+                terms += [term for term in self._prefix_terms(word) if term != word]
+            if not terms:
+                return set(), []
+            expansions.append([self._postings[term] for term in terms])
+
+        by_size = sorted(expansions, key=lambda postings: sum(len(p) for p in postings))
+        candidates = set().union(*by_size[0])
+        for postings in by_size[1:]:
+            if not candidates:
+                break
+            if len(postings) == 1:
+                candidates.intersection_update(postings[0])
+            else:
+                candidates = {pid for pid in candidates if any(pid in p for p in postings)}
+        return candidates, expansions
+
+    def _bm25(self, product_ids: Iterable[str], expansions: List[List[Dict[str, float]]]) -> Dict[str, float]:
+        n = len(self._doc_terms)
+        average_length = self._total_length / n if n else 1.0
+        k1, b = self.k1, self.b
+        lengths = self._lengths
+        scores = dict.fromkeys(product_ids, 0.0)
+        for postings in expansions:
+            idfs = [math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for p in postings]
+            for product_id in scores:
+                norm = k1 * (1 - b + b * lengths[product_id] / average_length)
+                best = 0.0
+                for p, idf in zip(postings, idfs):
+                    tf = p.get(product_id)
+                    if tf is not None:
+                        best = max(best, idf * tf * (k1 + 1) / (tf + norm))
+                scores[product_id] += best
+        return scores
+
+    def search(
+        self,
+        query: str = "",
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        sort: str = "relevance",
+        skip: int = 0,
+        limit: int = 10,
+    ) -> SearchResult:
+        """
+        Products matching ``query`` and the filters, ordered by ``sort``
+
+        Facet counts ignore their own filter, so the category facet shows
+        what selecting another category would return and vice versa.
+        Without a query, relevance order is price order when a price range
+        is given and insertion order otherwise; an update moves a product
+        to the end.
+        """
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"Unknown sort order '{sort}'")
+        matches: Optional[Set[str]] = None
+        expansions: List[List[Dict[str, float]]] = []
+        boosts: Dict[str, float] = {}
+        words = _terms(query)
+        if words:
+            matches, expansions = self._text_matches(words)
+            fragment = sku_key(query)
+            if len(fragment) >= MIN_SKU_FRAGMENT:
+                boosts = self._sku_matches(fragment)
+                matches.update(boosts)
+
+        def score(product_ids: Iterable[str]) -> Dict[str, float]:
+            scores = self._bm25(product_ids, expansions)
+            for product_id in scores.keys() & boosts.keys():
+                scores[product_id] += boosts[product_id]
+            return scores
+
+        category_key = category.lower() if category else None
+        priced = min_price is not None or max_price is not None
+        low = -math.inf if min_price is None else min_price
+        high = math.inf if max_price is None else max_price
+        categories, bands, prices = self._categories, self._bands, self._prices
+
+        category_facet: Counter
+        band_facet: Counter
+        if matches is None:
+            # Browsing: start from the price range or category, not the catalog
+            in_range = self._price_index.ids_between(low, high) if priced else None
+            members = self._by_category.get(category_key, {}) if category_key else None
+            if in_range is not None:
+                category_facet = Counter(map(categories.__getitem__, in_range))
+            else:
+                category_facet = Counter({c: len(ids) for c, ids in self._by_category.items()})
+            if members is not None:
+                band_facet = Counter(map(bands.__getitem__, members))
+            else:
+                band_facet = Counter(self._band_counts)
+            if in_range is not None:
+                # Still in price order
+                selected: Optional[List[str]] = in_range if members is None else [
+                    pid for pid in in_range if pid in members
+                ]
+            elif members is not None:
+                selected = list(members)
+            else:
+                selected = None
+        else:
+            in_price = matches
+            if priced:
+                # Slicing the price index runs at C speed; checking each
+                # match's price does not, so it only wins for narrow matches
+                if self._price_index.count(low, high) < 8 * len(matches):
+                    in_price = matches.intersection(self._price_index.ids_between(low, high))
+                else:
+                    in_price = {pid for pid in matches if low <= prices[pid] <= high}
+            in_category = matches
+            if category_key is not None:
+                in_category = matches.intersection(self._by_category.get(category_key, ()))
+            category_facet = Counter(map(categories.__getitem__, in_price))
+            band_facet = Counter(map(bands.__getitem__, in_category))
+            selected = list(in_price & in_category)
+
+        total = len(self._doc_terms) if selected is None else len(selected)
+        wanted = skip + limit
+        if selected is None:
+            if sort == "relevance":
+                ordered: Iterable[str] = self._prices
+            else:
+                ordered = self._price_index.between(low, high, descending=sort == "price_desc")
+            page = list(islice(ordered, skip, wanted))
+        elif sort == "relevance" and matches is not None:
+            # Only the filtered matches are scored
+            scores = score(selected)
+            page = heapq.nsmallest(wanted, selected, key=lambda pid: (-scores[pid], pid))[skip:]
+        elif sort == "relevance" or (matches is None and priced):
+            if sort == "price_desc":
+                selected.reverse()
+            page = selected[skip:wanted]
+        elif sort == "price_asc":
+            page = heapq.nsmallest(wanted, selected, key=lambda pid: (prices[pid], pid))[skip:]
+        else:
+            page = heapq.nsmallest(wanted, selected, key=lambda pid: (-prices[pid], pid))[skip:]
+
+        if matches is None:
+            hits = [SearchHit(pid, 0.0) for pid in page]
+        else:
+            scores = score(page)
+            hits = [SearchHit(pid, round(scores[pid], 4)) for pid in page]
+        facets = {
+            "category": dict(category_facet.most_common()),
+            "price_band": {band: band_facet[band] for band in map(price_band, PRICE_BANDS) if band_facet[band]},
+        }
+        return SearchResult(hits, total, facets)
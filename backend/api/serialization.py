@@ -0,0 +1,84 @@
+"""
+Lean JSON rendering for large list responses
+Rows from the in-process stores are already valid, so in fast mode list
+endpoints encode them straight to JSON bytes with orjson instead of
+building models that FastAPI validates again and encodes with the stdlib
+json module. The bytes are identical to what JSONResponse renders for the
+same data.
+"""
+
+from typing import Any, Iterable, Optional
+import json
+import os
+
+import numpy as np
+from fastapi import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # The stdlib encoder is used instead
+    orjson = None
+
+# Outside this range repr() switches to exponent notation ("1e-05",
+# "1e+16") while orjson writes "0.00001" and "1e16"
+EXACT_FLOAT_MIN = 1e-4
+EXACT_FLOAT_MAX = 1e16
+
+
+class ResponseConfig(BaseModel):
+    fast_responses: bool = False
+
+    @classmethod
+    def from_env(cls) -> "ResponseConfig":
+        """Build a config from API_FAST_RESPONSES"""
+        return cls(fast_responses=os.getenv("API_FAST_RESPONSES", "false").lower() in ("1", "true", "yes"))
+
+
+def orjson_available() -> bool:
+    return orjson is not None
+
+
+def _floats_exact(values: Iterable[Optional[float]]) -> bool:
+    if isinstance(values, np.ndarray):
+        magnitude = np.abs(values)
+        return bool(np.all((magnitude == 0) | ((magnitude >= EXACT_FLOAT_MIN) & (magnitude < EXACT_FLOAT_MAX))))
+    return all(v is None or v == 0 or EXACT_FLOAT_MIN <= abs(v) < EXACT_FLOAT_MAX for v in values)
+
+
+def dumps(content: Any, floats: Iterable[Optional[float]] = ()) -> bytes:
+    """
+    ``content`` as JSONResponse renders it
+
+    ``floats`` are the float values inside ``content`` (an iterable or a
+    numpy array); if any of them would be written differently by orjson,
+    the stdlib encoder is used.
+    """
+    if orjson is not None and _floats_exact(floats):
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+        default=_isoformat,
+    ).encode("utf-8")
+
+
+def _isoformat(value: Any) -> str:
+    # Only datetimes reach the stdlib encoder unconverted
+    text = value.isoformat()
+    return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+
+def json_response(body: bytes, response: Optional[Response] = None) -> Response:
+    """
+    Wrap encoded JSON in a response, carrying over headers set on the
+    endpoint's injected ``response`` (FastAPI drops them for returned
+    Response objects)
+    """
+    fast = Response(body, media_type="application/json")
+    if response is not None:
+        fast.headers.raw.extend(response.headers.raw)
+    return fast
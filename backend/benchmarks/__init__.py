@@ -0,0 +1,5 @@
+"""
+In-process load and latency benchmarks for the API and the MCP server
+
+Run from backend/ with ``python -m benchmarks``; see ``--help``.
+"""
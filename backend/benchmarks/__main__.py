@@ -0,0 +1,166 @@
+"""
+Seed the apps, run every scenario and report throughput and latency
+
+    cd backend
+    python -m benchmarks --products 100000 --save baseline.json
+    python -m benchmarks --products 100000 --compare baseline.json
+
+With ``--compare``, exits with status 1 when a scenario regressed by more
+than ``--tolerance``.
+"""
+
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import gc
+import logging
+import sys
+import time
+
+from .harness import (
+    compare, environment, load_baseline, print_comparison, print_results, run_load, save_baseline
+)
+from .suites import (
+    api_scenarios, load_api, load_mcp, mcp_scenarios, micro_benchmarks, open_mcp_connections,
+    seed_api, seed_mcp
+)
+
+
+def _settle() -> None:
+    # Seeded stores hold millions of objects; moving them out of the
+    # collector's reach keeps full collections from landing in the timings
+    gc.collect()
+    gc.freeze()
+
+
+def _selected(names: List[str], patterns: Optional[List[str]]) -> List[str]:
+    if not patterns:
+        return names
+    return [name for name in names if any(pattern.lower() in name.lower() for pattern in patterns)]
+
+
+async def _run_scenarios(scenarios, args, report: Dict[str, Any]) -> None:
+    for name in _selected(list(scenarios), args.scenarios):
+        # Best of --repeat runs, so a noisy neighbour does not set the
+        # baseline; every run sends new requests (ingest rejects repeats)
+        runs = []
+        for i in range(args.repeat):
+            warmup = args.warmup if i == 0 else 0
+            first = 0 if i == 0 else args.warmup + i * args.requests
+            runs.append(await run_load(scenarios[name], args.requests, args.concurrency, warmup, first))
+        report["scenarios"][name] = max(runs, key=lambda stats: stats["throughput"])
+        print(f"  {name}: {report['scenarios'][name]['throughput']:.1f} req/s", file=sys.stderr)
+
+
+async def _run_api(main, args, report: Dict[str, Any]) -> None:
+    import httpx
+
+    main.response_config.fast_responses = args.fast_responses
+    await main.startup()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await _run_scenarios(api_scenarios(main, client, args.seed), args, report)
+    # Shut down as the server does, flushing queued ingest batches to the
+    # stand-in database
+    started = time.perf_counter()
+    await main.shutdown()
+    report["shutdown"]["api"] = round(time.perf_counter() - started, 3)
+
+
+async def _run_mcp(server, args, report: Dict[str, Any]) -> None:
+    idle, connections = await open_mcp_connections(server, args.concurrency)
+    try:
+        await _run_scenarios(mcp_scenarios(idle, args.products, args.competitors, args.seed), args, report)
+    finally:
+        for connection in connections:
+            await connection.__aexit__(None, None, None)
+
+
+def run(args) -> Dict[str, Any]:
+    report: Dict[str, Any] = {
+        "environment": environment(),
+        "config": {
+            key: getattr(args, key)
+            for key in ("products", "alerts", "ticks", "competitors", "requests",
+                        "concurrency", "warmup", "repeat", "seed", "fast_responses")
+        },
+        "seeding": {},
+        "scenarios": {},
+        "shutdown": {},
+        "skipped": {},
+    }
+
+    if not args.skip_api:
+        print("Seeding API...", file=sys.stderr)
+        main = load_api()
+        report["seeding"]["api"] = seed_api(main, args.products, args.alerts, args.ticks, args.competitors, args.seed)
+        _settle()
+        asyncio.run(_run_api(main, args, report))
+
+    if not args.skip_mcp:
+        try:
+            server = load_mcp()
+        except Exception as e:
+            # motor and prisma are needed to import the server at all; the
+            # stand-ins only replace the clients it creates
+            report["skipped"]["mcp"] = f"{type(e).__name__}: {e}"
+            print(f"Skipping MCP server: {report['skipped']['mcp']}", file=sys.stderr)
+        else:
+            print("Seeding MCP server...", file=sys.stderr)
+            report["seeding"]["mcp"] = seed_mcp(server, args.products, args.ticks, args.competitors, args.seed)
+            _settle()
+            asyncio.run(_run_mcp(server, args, report))
+
+    if args.micro:
+        print("Running component benchmarks...", file=sys.stderr)
+        report["micro"] = micro_benchmarks(args.products)
+    return report
+
+
+def main() -> int:
+    cli = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__,
+                                  formatter_class=argparse.RawDescriptionHelpFormatter)
+    cli.add_argument("--products", type=int, default=10_000, help="Synthetic catalog size (10k-1M)")
+    cli.add_argument("--alerts", type=int, help="Synthetic alerts; defaults to --products")
+    cli.add_argument("--ticks", type=int, help="Synthetic price ticks; defaults to 10 per product")
+    cli.add_argument("--competitors", type=int, default=50)
+    cli.add_argument("--requests", type=int, default=500, help="Measured requests per scenario")
+    cli.add_argument("--concurrency", type=int, default=8, help="Requests in flight")
+    cli.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per scenario")
+    cli.add_argument("--repeat", type=int, default=3, help="Runs per scenario; the fastest is reported")
+    cli.add_argument("--seed", type=int, default=7)
+    cli.add_argument("--scenarios", nargs="*", help="Run only scenarios whose name contains one of these")
+    cli.add_argument("--skip-api", action="store_true")
+    cli.add_argument("--skip-mcp", action="store_true")
+    cli.add_argument("--fast-responses", action="store_true", help="Serve API list endpoints in fast mode")
+    cli.add_argument("--micro", action="store_true", help="Also run the per-component benchmarks")
+    cli.add_argument("--save", metavar="PATH", help="Write the report as a JSON baseline")
+    cli.add_argument("--compare", metavar="PATH", help="Compare against a saved baseline")
+    cli.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative regression")
+    cli.add_argument("--verbose", action="store_true", help="Keep the apps' info logging")
+    args = cli.parse_args()
+    if args.products < 1 or args.requests < 1 or args.repeat < 1:
+        cli.error("--products, --requests and --repeat must be at least 1")
+    args.alerts = args.products if args.alerts is None else args.alerts
+    args.ticks = args.products * 10 if args.ticks is None else args.ticks
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    report = run(args)
+    print_results(report["scenarios"])
+    if args.save:
+        save_baseline(args.save, report)
+        print(f"Saved baseline to {args.save}", file=sys.stderr)
+    if args.compare:
+        baseline = load_baseline(args.compare)
+        if baseline.get("config") != report["config"]:
+            print("Warning: baseline was recorded with a different configuration", file=sys.stderr)
+        rows, regressed = compare(baseline, report, args.tolerance)
+        print()
+        print_comparison(rows)
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
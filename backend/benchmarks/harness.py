@@ -0,0 +1,203 @@
+"""
+Closed-loop load generation, latency statistics and JSON baselines
+
+Requests go straight to the ASGI apps: HTTP through httpx's ASGI
+transport, WebSockets through ``ASGIWebSocket``, both on the running event
+loop without sockets or threads.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+# A request: called with its index, returns whether it succeeded
+Call = Callable[[int], Awaitable[bool]]
+
+
+def latency_stats(latencies_ns: List[int], errors: int, elapsed: float) -> Dict[str, Any]:
+    """Throughput and latency percentiles of one scenario run"""
+    ms = np.asarray(latencies_ns, dtype=np.float64) / 1e6
+    p50, p95, p99 = np.percentile(ms, (50, 95, 99)) if len(ms) else (0.0, 0.0, 0.0)
+    return {
+        "requests": len(ms),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(ms) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(float(ms.mean()), 3) if len(ms) else 0.0,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(ms.max()), 3) if len(ms) else 0.0,
+    }
+
+
+async def run_load(call: Call, requests: int, concurrency: int = 1, warmup: int = 0,
+                   first: int = 0) -> Dict[str, Any]:
+    """
+    Issue ``requests`` calls from ``concurrency`` workers, each starting
+    its next request as soon as the previous one completes
+
+    ``warmup`` calls run first and are not measured; calls are numbered
+    from ``first``. A call that raises counts as an error, with its latency
+    kept.
+    """
+    for i in range(first, first + warmup):
+        await call(i)
+
+    latencies: List[int] = []
+    errors = 0
+    issued = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in issued:
+            started = time.perf_counter_ns()
+            try:
+                ok = await call(first + warmup + i)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter_ns() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, requests)))))
+    return latency_stats(latencies, errors, time.perf_counter() - started)
+
+
+class ASGIWebSocket:
+    """
+    In-process WebSocket client for an ASGI app
+
+    Use as an async context manager; the app runs as a task on the current
+    loop and exchanges ASGI messages through queues.
+    """
+
+    def __init__(self, app: Any, path: str):
+        self.app = app
+        self.path = path
+        self._inbound: asyncio.Queue = asyncio.Queue()
+        self._outbound: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "ASGIWebSocket":
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "http_version": "1.1",
+            "path": self.path,
+            "raw_path": self.path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+            "subprotocols": [],
+            "state": {},
+        }
+        self._task = asyncio.create_task(self.app(scope, self._inbound.get, self._outbound.put))
+        await self._inbound.put({"type": "websocket.connect"})
+        message = await self._outbound.get()
+        if message["type"] != "websocket.accept":
+            raise ConnectionError(f"WebSocket not accepted: {message}")
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self._inbound.put({"type": "websocket.disconnect", "code": 1000})
+        try:
+            await asyncio.wait_for(self._task, timeout=5)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+
+    async def send_json(self, message: Any) -> None:
+        await self._inbound.put({"type": "websocket.receive", "text": json.dumps(message)})
+
+    async def receive_json(self) -> Any:
+        message = await self._outbound.get()
+        if message["type"] == "websocket.close":
+            raise ConnectionError(f"WebSocket closed with code {message.get('code')}")
+        return json.loads(message.get("text") or message.get("bytes"))
+
+
+def environment() -> Dict[str, Any]:
+    """Where a run happened, stored with its results"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "recorded_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save_baseline(path: str, report: Dict[str, Any]) -> None:
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+        f.write("\n")
+
+
+def load_baseline(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float = 0.1) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Per-scenario change in throughput and p95 latency against a baseline
+
+    A scenario regresses when its throughput drops or its p95 latency rises
+    by more than ``tolerance``, or when it errors where the baseline did not.
+    Scenarios missing from either run are skipped.
+    """
+    rows, regressed = [], False
+    for name, now in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        throughput = now["throughput"] / before["throughput"] - 1 if before["throughput"] else 0.0
+        p95 = now["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        worse = throughput < -tolerance or p95 > tolerance or (now["errors"] and not before["errors"])
+        regressed |= bool(worse)
+        rows.append({
+            "scenario": name,
+            "throughput": now["throughput"],
+            "throughput_change": round(throughput, 3),
+            "p95_ms": now["p95_ms"],
+            "p95_change": round(p95, 3),
+            "regressed": bool(worse),
+        })
+    return rows, regressed
+
+
+def print_results(scenarios: Dict[str, Dict[str, Any]], out=sys.stdout) -> None:
+    print(f"{'scenario':<40} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}", file=out)
+    for name, stats in scenarios.items():
+        print(
+            f"{name:<40} {stats['throughput']:>9.1f} {stats['p50_ms']:>8.2f} "
+            f"{stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['errors']:>7}",
+            file=out,
+        )
+
+
+def print_comparison(rows: List[Dict[str, Any]], out=sys.stdout) -> None:
+    print(f"{'scenario':<40} {'req/s':>9} {'change':>8} {'p95 ms':>8} {'change':>8}", file=out)
+    for row in rows:
+        print(
+            f"{row['scenario']:<40} {row['throughput']:>9.1f} {row['throughput_change']:>+8.1%} "
+            f"{row['p95_ms']:>8.2f} {row['p95_change']:>+8.1%}{'  REGRESSED' if row['regressed'] else ''}",
+            file=out,
+        )
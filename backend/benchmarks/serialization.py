@@ -0,0 +1,99 @@
+"""
+Serialization micro-benchmark for the API's list endpoints, run with
+``python -m benchmarks --micro`` once the API directory is importable
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict
+import asyncio
+import time
+
+
+def benchmark(rows: int = 1000, rounds: int = 50) -> Dict[str, Any]:
+    """
+    Rows per second of the model path and the fast path for the list
+    endpoints, served in-process, checking the bodies are byte-identical
+    """
+    import httpx
+    import main
+    from serialization import orjson_available
+
+    now = datetime.now()
+    main.price_history.append(
+        "bench_product", "bench_competitor",
+        [now - timedelta(seconds=rows - i) for i in range(rows)],
+        [round(10 + (i % 997) * 0.37, 2) for i in range(rows)],
+    )
+    for i in range(500):
+        main.alert_store.add(main.Alert(
+            id=f"bench_alert_{i}",
+            type=main.AlertType.COMPETITOR_PRICE,
+            priority=main.AlertPriority.MEDIUM,
+            title="Benchmark alert",
+            message=f"Price moved on bench_product ({i})",
+            product_id="bench_product",
+            threshold_value=100.0 + i,
+            current_value=99.5 + i,
+            created_at=now + timedelta(seconds=i),
+        ))
+    endpoints = {
+        "price_history": (f"/price-history?product_id=bench_product&limit={min(rows, 1000)}", min(rows, 1000)),
+        "competitor_prices": ("/competitors/bench_competitor/prices?limit=500", min(rows, 500)),
+        "alerts": ("/alerts?limit=500", 500),
+    }
+
+    async def measure(client, url: str):
+        await client.get(url)
+        started = time.perf_counter()
+        for _ in range(rounds):
+            response = await client.get(url)
+        elapsed = time.perf_counter() - started
+        return elapsed, (response.content, response.headers.get("content-type"), response.headers.get("x-next-cursor"))
+
+    async def serve() -> None:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, (url, count) in endpoints.items():
+                bodies, rates = {}, {}
+                for fast in (False, True):
+                    main.response_config.fast_responses = fast
+                    elapsed, bodies[fast] = await measure(client, url)
+                    rates["fast" if fast else "model"] = round(count * rounds / elapsed)
+                rates["identical"] = bodies[False] == bodies[True]
+                rates["speedup"] = round(rates["fast"] / rates["model"], 2)
+                results[name] = rates
+
+    results: Dict[str, Any] = {"orjson": orjson_available()}
+    previous = main.response_config.fast_responses
+    try:
+        asyncio.run(serve())
+    finally:
+        main.response_config.fast_responses = previous
+
+    # Encoding alone, without routing and the HTTP round trip; the model
+    # path is FastAPI's classic one from store rows: build, re-validate,
+    # jsonable_encoder, JSONResponse.render
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+    from typing import List
+
+    store_rows = main.price_history.query(product_id="bench_product", limit=1000)
+    columns = main.price_history.query_columns(product_id="bench_product", limit=1000)
+    adapter = TypeAdapter(List[main.PriceHistory])
+    encoders = {
+        "model": lambda: JSONResponse(jsonable_encoder(adapter.validate_python(
+            [main._to_price_history(row) for row in store_rows], from_attributes=True
+        ))).body,
+        "fast": lambda: main._price_history_response(columns).body,
+    }
+    encoded, rates = {}, {}
+    for name, encode in encoders.items():
+        started = time.perf_counter()
+        for _ in range(rounds):
+            encoded[name] = encode()
+        rates[name] = round(len(store_rows) * rounds / (time.perf_counter() - started))
+    rates["identical"] = encoded["model"] == encoded["fast"]
+    rates["speedup"] = round(rates["fast"] / rates["model"], 2)
+    results["price_history_encode"] = rates
+    return results
@@ -0,0 +1,318 @@
+"""
+In-memory stand-ins for the databases behind the API and the MCP server
+
+They answer the exact calls the apps make, computed from synthetic data,
+so a benchmark measures request handling rather than a database server:
+
+- ``StandInPool``: the asyncpg pool used by the API's catalog, tick, rollup,
+  insight, alert and rule writers; rows are counted and dropped.
+- ``StandInPrisma``: the Prisma client of the MCP server, serving the
+  competitor report query and accepting crawled prices.
+- ``StandInMongo``: the Motor database of the MCP server, evaluating the
+  price trend pipelines over columnar ticks.
+"""
+
+from bisect import bisect_right
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+MS_PER_DAY = 86_400_000
+
+
+class SyntheticTicks(NamedTuple):
+    """Price ticks as columns, sorted by product then timestamp"""
+    owner: np.ndarray       # Product index
+    competitor: np.ndarray  # Competitor index, -1 for our own price
+    ts_us: np.ndarray
+    price: np.ndarray
+
+
+def synthetic_ticks(prices: np.ndarray, competitors: int, ticks: int, days: int = 90,
+                    seed: int = 5, now: Optional[datetime] = None) -> SyntheticTicks:
+    """
+    About ``ticks`` ticks spread evenly over the products whose base
+    ``prices`` are given, from our price and two competitors per product,
+    over the last ``days``
+    """
+    rng = np.random.default_rng(seed)
+    products = len(prices)
+    per_product = max(1, ticks // max(products, 1))
+    owner = np.repeat(np.arange(products, dtype=np.int64), per_product)
+    slot = rng.integers(0, 3, len(owner))
+    rivals = rng.integers(0, max(competitors, 1), (products, 2))
+    competitor = np.where(slot == 0, -1, rivals[owner, np.maximum(slot - 1, 0)])
+    if competitors == 0:
+        competitor[:] = -1
+
+    end_us = ((now or datetime.utcnow()) - EPOCH) // timedelta(microseconds=1)
+    ts_us = end_us - rng.integers(0, days * MS_PER_DAY * 1000, len(owner))
+    price = np.round(np.maximum(prices[owner] * (1 + 0.05 * rng.standard_normal(len(owner))), 0.01), 2)
+    order = np.lexsort((ts_us, owner))
+    return SyntheticTicks(owner[order], competitor[order], ts_us[order], price[order])
+
+
+def series_slices(ticks: SyntheticTicks):
+    """(product index, competitor index, tick positions) of every price series, in time order"""
+    order = np.lexsort((ticks.ts_us, ticks.competitor, ticks.owner))
+    owner, competitor = ticks.owner[order], ticks.competitor[order]
+    starts = np.flatnonzero(np.r_[True, (owner[1:] != owner[:-1]) | (competitor[1:] != competitor[:-1])])
+    ends = np.r_[starts[1:], len(order)]
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        yield int(owner[start]), int(competitor[start]), order[start:end]
+
+
+# Postgres (API)
+
+class StandInConnection:
+    def __init__(self, pool: "StandInPool"):
+        self.pool = pool
+        self._staged: List[Sequence[Any]] = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def execute(self, sql: str, *args) -> str:
+        if sql.lstrip().upper().startswith("INSERT"):
+            rows, self._staged = len(self._staged), []
+            self.pool.rows_written += rows
+            return f"INSERT 0 {rows}"
+        return "OK"
+
+    async def executemany(self, sql: str, rows: Sequence[Sequence[Any]]) -> None:
+        self.pool.rows_written += len(rows)
+
+    async def copy_records_to_table(self, table: str, records: Sequence[Sequence[Any]],
+                                    columns: Sequence[str]) -> str:
+        records = list(records)
+        self._staged.extend(records)
+        return f"COPY {len(records)}"
+
+    async def fetch(self, sql: str, *args) -> List[Any]:
+        # INSERT ... SELECT FROM staging RETURNING id: every staged row is new
+        if sql.lstrip().upper().startswith("INSERT"):
+            staged, self._staged = self._staged, []
+            self.pool.rows_written += len(staged)
+            return [{"id": record[0]} for record in staged]
+        return []
+
+
+class StandInPool:
+    """Accepts writes from the API's Postgres writers without a server"""
+
+    def __init__(self):
+        self.rows_written = 0
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield StandInConnection(self)
+
+
+# Prisma (MCP)
+
+class _StandInPriceHistory:
+    def __init__(self):
+        self.created = 0
+
+    async def create_many(self, data: List[Dict[str, Any]]) -> int:
+        self.created += len(data)
+        return len(data)
+
+
+class StandInPrisma:
+    """Serves the competitor report and accepts crawled prices"""
+
+    def __init__(self, product_prices: np.ndarray, competitor_ids: Sequence[str],
+                 competitor_names: Sequence[str], ticks: SyntheticTicks):
+        self.pricehistory = _StandInPriceHistory()
+        self._report = self._report_rows(product_prices, competitor_ids, competitor_names, ticks)
+        self._ids = [row["competitor_id"] for row in self._report]
+
+    async def connect(self) -> None:
+        pass
+
+    async def disconnect(self) -> None:
+        pass
+
+    @staticmethod
+    def _report_rows(product_prices, competitor_ids, competitor_names, ticks) -> List[Dict[str, Any]]:
+        # Latest competitor price per (product, competitor): ticks are in
+        # time order within a product, so the last one of each pair wins
+        listed = ticks.competitor >= 0
+        owner, competitor, price = ticks.owner[listed], ticks.competitor[listed], ticks.price[listed]
+        pair = owner * len(competitor_ids) + competitor
+        last = len(pair) - 1 - np.unique(pair[::-1], return_index=True)[1]
+        owner, competitor, price = owner[last], competitor[last], price[last]
+
+        lowest = np.full(len(product_prices), np.inf)
+        np.minimum.at(lowest, owner, price)
+        ours = product_prices[owner]
+        columns = {
+            "product_overlap": np.bincount(competitor, minlength=len(competitor_ids)),
+            "difference": np.bincount(competitor, price - ours, len(competitor_ids)),
+            "percent": np.bincount(competitor, (price - ours) * 100.0 / ours, len(competitor_ids)),
+            "lowest": np.bincount(competitor, price <= lowest[owner], len(competitor_ids)),
+        }
+        listed_products = int(np.isfinite(lowest).sum())
+        updated_at = datetime.utcnow()
+        rows = []
+        for i in np.argsort(np.array(competitor_ids, dtype=object)).tolist():
+            overlap = int(columns["product_overlap"][i])
+            rows.append({
+                "competitor_id": competitor_ids[i],
+                "name": competitor_names[i],
+                "updated_at": updated_at,
+                "product_overlap": overlap,
+                "price_difference": columns["difference"][i] / overlap if overlap else 0.0,
+                "price_difference_percent": columns["percent"][i] / overlap if overlap else 0.0,
+                "lowest_price_listings": int(columns["lowest"][i]),
+                "listed_products": listed_products,
+            })
+        return rows
+
+    async def query_raw(self, sql: str, *args) -> List[Dict[str, Any]]:
+        if "per_competitor" not in sql:
+            raise NotImplementedError("Only the competitor report query has a stand-in")
+        start = bisect_right(self._ids, args[0]) if "c.id > $1" in sql else 0
+        return [dict(row) for row in self._report[start:start + int(args[-1])]]
+
+
+# Mongo (MCP)
+
+class _StandInCursor:
+    def __init__(self, documents: List[Dict[str, Any]]):
+        self.documents = documents
+
+    async def to_list(self, length: Optional[int]) -> List[Dict[str, Any]]:
+        return self.documents if length is None else self.documents[:length]
+
+
+class StandInCollection:
+    """
+    price_history documents held as columns, answering the two aggregation
+    shapes the MCP server runs: the single-product ``$facet`` of stats and
+    time buckets, and the per-product ``$group`` with ``$topN`` points
+    """
+
+    def __init__(self, product_ids: Sequence[str], competitor_ids: Sequence[str], ticks: SyntheticTicks):
+        self._index = {product_id: i for i, product_id in enumerate(product_ids)}
+        # Index -1, our own price, maps to the trailing None
+        self._competitor_ids = np.array(list(competitor_ids) + [None], dtype=object)
+        self._competitor_index = {competitor_id: i for i, competitor_id in enumerate(competitor_ids)}
+        self._offsets = np.searchsorted(ticks.owner, np.arange(len(product_ids) + 1))
+        self._ticks = ticks
+
+    async def create_index(self, keys: Any, **kwargs) -> str:
+        return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+    def aggregate(self, pipeline: List[Dict[str, Any]]) -> _StandInCursor:
+        match = pipeline[0]["$match"]
+        product_filter = match["product_id"]
+        product_ids = product_filter["$in"] if isinstance(product_filter, dict) else [product_filter]
+        since_ms = (match["timestamp"]["$gte"] - EPOCH) // timedelta(milliseconds=1)
+        competitors = None
+        if "competitor_id" in match:
+            competitors = [self._competitor_index[c] for c in match["competitor_id"]["$in"] if c in self._competitor_index]
+
+        facet = next((stage["$facet"] for stage in pipeline if "$facet" in stage), None)
+        if facet is not None:
+            ts_ms, price, _ = self._select(product_ids[0], since_ms, competitors)
+            if not len(ts_ms):
+                return _StandInCursor([{"stats": [], "buckets": []}])
+            unit = facet["buckets"][0]["$group"]["_id"]["$dateTrunc"]["unit"]
+            return _StandInCursor([{
+                "stats": [{"_id": None, **self._stats(ts_ms, price, since_ms)}],
+                "buckets": self._buckets(ts_ms, price, unit),
+            }])
+
+        points = pipeline[1]["$group"]["points"]["$topN"]["n"]
+        documents = []
+        for product_id in product_ids:
+            ts_ms, price, competitor = self._select(product_id, since_ms, competitors)
+            if not len(ts_ms):
+                continue
+            newest = np.arange(len(ts_ms) - 1, max(len(ts_ms) - points, 0) - 1, -1)
+            documents.append({
+                "_id": product_id,
+                **self._stats(ts_ms, price, since_ms),
+                "points": [
+                    {"price": p, "timestamp": EPOCH + timedelta(milliseconds=t), "competitor_id": c}
+                    for p, t, c in zip(price[newest].tolist(), ts_ms[newest].tolist(),
+                                       self._competitor_ids[competitor[newest]].tolist())
+                ],
+            })
+        return _StandInCursor(documents)
+
+    def _select(self, product_id: str, since_ms: int, competitors: Optional[List[int]]):
+        i = self._index.get(product_id)
+        if i is None:
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0, dtype=np.int64)
+        window = slice(self._offsets[i], self._offsets[i + 1])
+        ts_ms = self._ticks.ts_us[window] // 1000
+        keep = ts_ms >= since_ms
+        competitor = self._ticks.competitor[window]
+        if competitors is not None:
+            keep &= np.isin(competitor, competitors)
+        return ts_ms[keep], self._ticks.price[window][keep], competitor[keep]
+
+    @staticmethod
+    def _stats(ts_ms: np.ndarray, price: np.ndarray, since_ms: int) -> Dict[str, Any]:
+        days = (ts_ms - since_ms) / MS_PER_DAY
+        count = len(price)
+        denominator = count * float(days @ days) - float(days.sum()) ** 2
+        slope = 0 if denominator == 0 else (count * float(days @ price) - float(days.sum()) * float(price.sum())) / denominator
+        return {
+            "count": count,
+            "mean": float(price.mean()),
+            "min": float(price.min()),
+            "max": float(price.max()),
+            "stddev": float(price.std()),
+            "slope": slope,
+        }
+
+    @staticmethod
+    def _buckets(ts_ms: np.ndarray, price: np.ndarray, unit: str) -> List[Dict[str, Any]]:
+        day = ts_ms // MS_PER_DAY
+        if unit == "week":
+            # 1970-01-01 was a Thursday; weeks start on Monday
+            starts = (day - (day + 3) % 7).astype("datetime64[D]")
+        elif unit == "month":
+            starts = day.astype("datetime64[D]").astype("datetime64[M]").astype("datetime64[D]")
+        else:
+            starts = day.astype("datetime64[D]")
+        keys, first = np.unique(starts, return_index=True)
+        last = np.r_[first[1:], len(price)] - 1
+        counts = last - first + 1
+        means = np.add.reduceat(price, first) / counts
+
+        buckets = []
+        previous_close = None
+        for i, start in enumerate(keys.tolist()):
+            close = float(price[last[i]])
+            buckets.append({
+                "bucket_start": datetime(start.year, start.month, start.day),
+                "open": float(price[first[i]]),
+                "close": close,
+                "min": float(price[first[i]:last[i] + 1].min()),
+                "max": float(price[first[i]:last[i] + 1].max()),
+                "mean": float(means[i]),
+                "count": int(counts[i]),
+                "moving_average": float(means[max(0, i - 2):i + 1].mean()),
+                "change_percent": (close - previous_close) / previous_close * 100 if previous_close else None,
+            })
+            previous_close = close
+        return buckets
+
+
+class StandInMongo:
+    """The retail_analytics database with its price_history collection"""
+
+    def __init__(self, product_ids: Sequence[str], competitor_ids: Sequence[str], ticks: SyntheticTicks):
+        self.price_history = StandInCollection(product_ids, competitor_ids, ticks)
+
+    def close(self) -> None:
+        pass
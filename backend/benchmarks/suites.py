@@ -0,0 +1,362 @@
+"""
+Seeding and request scenarios for the API and the MCP server
+
+Both apps are imported as their servers run them, from their own
+directories, and their module-level stores are replaced with synthetic
+data of the requested size. Every scenario request is derived from the
+seed and its index, so runs replay the same requests.
+"""
+
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+import asyncio
+import random
+import sys
+import time
+
+import numpy as np
+
+from .harness import ASGIWebSocket, Call
+from .standins import StandInMongo, StandInPool, StandInPrisma, series_slices, synthetic_ticks
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+API_DIR = BACKEND_DIR / "api"
+MCP_DIR = BACKEND_DIR / "mcp"
+
+# Pre-built /products/match bodies cycled through by the match scenario
+MATCH_BATCHES = 64
+MATCH_BATCH_SIZE = 20
+INGEST_BATCH_SIZE = 100
+TREND_BATCH_SIZE = 50
+
+
+def _import(directory: Path, module: str):
+    if str(directory) not in sys.path:
+        sys.path.insert(0, str(directory))
+    return __import__(module)
+
+
+def _rng(seed: int, i: int) -> random.Random:
+    return random.Random(seed * 1_000_003 + i)
+
+
+def _ok(response) -> bool:
+    return response.status_code < 400
+
+
+# API
+
+def load_api():
+    """backend/api/main.py, with its stores still holding the mock data"""
+    return _import(API_DIR, "main")
+
+
+def seed_api(main, products: int, alerts: int, ticks: int, competitors: int, seed: int = 7) -> Dict[str, Any]:
+    """
+    Replace the API's catalog, search and match indexes, alerts, competitors
+    and price history with synthetic data, and route its Postgres writers
+    to a stand-in pool
+    """
+    from matching import ProductMatcher, synthetic_catalog
+    from search import ProductSearchIndex
+    from catalog import CatalogStore, PostgresCatalogWriter
+    from alerts import AlertStore, PostgresAlertWriter
+    from alert_rules import PostgresRuleStore
+    from price_history import PriceHistoryStore
+    from rollups import RollupStore, SqlRollupWriter
+    from ingest import PostgresTickWriter
+    from recommendations import PostgresInsightWriter
+
+    timings = {}
+    rng = random.Random(seed)
+    now = datetime.now()
+
+    started = time.perf_counter()
+    rows = synthetic_catalog(products, seed)
+    main.catalog = CatalogStore(
+        main.Product.model_construct(
+            id=row.id,
+            name=row.name,
+            sku=row.sku,
+            price=round(rng.uniform(5, 2000), 2),
+            category=row.name.split()[1],
+            description=f"{row.name} from {row.name.split()[0]}",
+            stock=rng.randint(0, 500),
+            created_at=now - timedelta(days=rng.randint(1, 365)),
+            updated_at=now,
+        )
+        for row in rows
+    )
+    timings["catalog"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    main.product_matcher = ProductMatcher(main.catalog)
+    timings["match_index"] = time.perf_counter() - started
+    started = time.perf_counter()
+    main.product_search = ProductSearchIndex(main.catalog)
+    timings["search_index"] = time.perf_counter() - started
+
+    main.MOCK_COMPETITORS[:] = [
+        main.Competitor.model_construct(
+            id=f"comp_{j + 1}",
+            name=f"Competitor {j + 1}",
+            website=f"https://competitor{j + 1}.example",
+            description=None,
+            active=True,
+            created_at=now - timedelta(days=rng.randint(1, 365)),
+        )
+        for j in range(competitors)
+    ]
+
+    started = time.perf_counter()
+    types, priorities = list(main.AlertType), list(main.AlertPriority)
+    main.alert_store = AlertStore(
+        main.Alert.model_construct(
+            id=f"alert_{i + 1}",
+            type=rng.choice(types),
+            priority=rng.choice(priorities),
+            title="Competitor price change",
+            message=f"Price moved on {rows[i % len(rows)].name}",
+            product_id=rows[i % len(rows)].id,
+            competitor_id=f"comp_{rng.randint(1, competitors)}" if competitors else None,
+            threshold_value=round(rng.uniform(5, 2000), 2),
+            current_value=round(rng.uniform(5, 2000), 2),
+            is_read=rng.random() < 0.3,
+            is_resolved=rng.random() < 0.1,
+            created_at=now - timedelta(seconds=alerts - i),
+        )
+        for i in range(alerts)
+    )
+    main.dashboard_counters.rebuild(len(main.catalog), len(main.MOCK_COMPETITORS), main.alert_store)
+    timings["alerts"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    main.price_history = PriceHistoryStore()
+    main.price_rollups = RollupStore()
+    prices = np.fromiter((product.price for product in main.catalog), dtype=np.float64, count=len(main.catalog))
+    generated = synthetic_ticks(prices, competitors, ticks, seed=seed, now=now)
+    for owner, competitor, positions in series_slices(generated):
+        main.price_history.append(
+            rows[owner].id,
+            f"comp_{competitor + 1}" if competitor >= 0 else None,
+            generated.ts_us[positions],
+            generated.price[positions],
+        )
+    # Seeded history skips the rollup and alert-rule listeners, which cost
+    # about a millisecond per series; ticks ingested by the scenarios go
+    # through them as usual
+    main.price_history.add_listener(main.price_rollups.on_ticks)
+    main.price_history.add_listener(main.alert_rules.on_ticks)
+    timings["price_history"] = time.perf_counter() - started
+
+    pool = StandInPool()
+    main.catalog_writer = PostgresCatalogWriter(pool)
+    main.tick_writer = PostgresTickWriter(pool)
+    main.rollup_writer = SqlRollupWriter(pool)
+    main.insight_writer = PostgresInsightWriter(pool)
+    main.alert_writer = PostgresAlertWriter(pool)
+    main.rule_store = PostgresRuleStore(pool)
+
+    return {
+        "products": len(main.catalog),
+        "alerts": len(main.alert_store),
+        "ticks": len(generated.price),
+        "competitors": competitors,
+        "seconds": {name: round(seconds, 3) for name, seconds in timings.items()},
+    }
+
+
+def api_scenarios(main, client, seed: int = 7) -> Dict[str, Call]:
+    """Requests against the seeded API through an httpx client on its ASGI transport"""
+    from matching import synthetic_results
+
+    catalog = list(main.catalog)
+    product_ids = [product.id for product in catalog]
+    categories = sorted({product.category for product in catalog})
+    competitor_ids = [competitor.id for competitor in main.MOCK_COMPETITORS] or [None]
+    # Brand and kind words, searched whole and as prefixes
+    words = sorted({word for product in catalog[:1000] for word in product.name.split()[:2]})
+    priorities = [priority.value for priority in main.AlertPriority]
+    match_bodies = [
+        {"results": [
+            {"title": title, "link": link}
+            for title, link in synthetic_results(catalog, MATCH_BATCH_SIZE, seed=seed + i)
+        ]}
+        for i in range(MATCH_BATCHES)
+    ]
+    # Ingested ticks start after the seeded history, one microsecond apart
+    ingest_start = datetime.now() + timedelta(minutes=1)
+
+    async def products(i: int) -> bool:
+        rng = _rng(seed, i)
+        params = {"limit": 50}
+        if rng.random() < 0.5:
+            params["category"] = rng.choice(categories)
+        return _ok(await client.get("/products", params=params))
+
+    async def product(i: int) -> bool:
+        return _ok(await client.get(f"/products/{_rng(seed, i).choice(product_ids)}"))
+
+    async def search(i: int) -> bool:
+        rng = _rng(seed, i)
+        first, second = rng.choice(words), rng.choice(words)
+        params = {"q": f"{first} {second[:rng.randint(2, len(second))]}", "limit": 20}
+        if rng.random() < 0.3:
+            low = round(rng.uniform(5, 1000), 2)
+            params.update(min_price=low, max_price=low + 500)
+        return _ok(await client.get("/products/search", params=params))
+
+    async def match(i: int) -> bool:
+        return _ok(await client.post("/products/match", json=match_bodies[i % len(match_bodies)]))
+
+    async def price_history(i: int) -> bool:
+        params = {"product_id": _rng(seed, i).choice(product_ids), "limit": 500}
+        return _ok(await client.get("/price-history", params=params))
+
+    async def competitor_prices(i: int) -> bool:
+        competitor_id = _rng(seed, i).choice(competitor_ids)
+        return _ok(await client.get(f"/competitors/{competitor_id}/prices", params={"limit": 500}))
+
+    async def price_analysis(i: int) -> bool:
+        return _ok(await client.get(f"/products/{_rng(seed, i).choice(product_ids)}/price-analysis"))
+
+    async def alerts(i: int) -> bool:
+        rng = _rng(seed, i)
+        params = {"limit": 100, "unread_only": rng.random() < 0.5}
+        if rng.random() < 0.5:
+            params["priority"] = rng.choice(priorities)
+        return _ok(await client.get("/alerts", params=params))
+
+    async def dashboard(i: int) -> bool:
+        return _ok(await client.get("/analytics/dashboard"))
+
+    async def ingest(i: int) -> bool:
+        rng = _rng(seed, i)
+        first = ingest_start + timedelta(microseconds=i * INGEST_BATCH_SIZE)
+        ticks = [
+            {
+                "product_id": rng.choice(product_ids),
+                "competitor_id": rng.choice(competitor_ids),
+                "price": round(rng.uniform(5, 2000), 2),
+                "timestamp": (first + timedelta(microseconds=k)).isoformat(),
+            }
+            for k in range(INGEST_BATCH_SIZE)
+        ]
+        return _ok(await client.post("/price-history/ingest", json=ticks))
+
+    return {
+        "api GET /products": products,
+        "api GET /products/{id}": product,
+        "api GET /products/search": search,
+        "api POST /products/match": match,
+        "api GET /price-history": price_history,
+        "api GET /competitors/{id}/prices": competitor_prices,
+        "api GET /products/{id}/price-analysis": price_analysis,
+        "api GET /alerts": alerts,
+        "api GET /analytics/dashboard": dashboard,
+        "api POST /price-history/ingest": ingest,
+    }
+
+
+# MCP server
+
+def load_mcp():
+    """
+    backend/mcp/server.py; raises if its database clients (motor, prisma)
+    cannot be imported or constructed
+    """
+    return _import(MCP_DIR, "server")
+
+
+def seed_mcp(server, products: int, ticks: int, competitors: int, seed: int = 7) -> Dict[str, Any]:
+    """Point the MCP server's Prisma and Mongo clients at stand-ins holding synthetic data"""
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    product_ids = [f"prod_{i}" for i in range(products)]
+    prices = np.round(rng.uniform(5, 2000, products), 2)
+    competitor_ids = [f"comp_{j + 1}" for j in range(competitors)]
+    generated = synthetic_ticks(prices, competitors, ticks, seed=seed)
+
+    server.prisma = StandInPrisma(prices, competitor_ids, [f"Competitor {j + 1}" for j in range(competitors)], generated)
+    server.db = StandInMongo(product_ids, competitor_ids, generated)
+    return {
+        "products": products,
+        "ticks": len(generated.price),
+        "competitors": competitors,
+        "seconds": {"stand_ins": round(time.perf_counter() - started, 3)},
+    }
+
+
+async def open_mcp_connections(server, count: int) -> Tuple[asyncio.Queue, List[ASGIWebSocket]]:
+    """``count`` open /mcp connections, handed out through a queue"""
+    connections = [ASGIWebSocket(server.app, "/mcp") for _ in range(count)]
+    idle: asyncio.Queue = asyncio.Queue()
+    for connection in connections:
+        await connection.__aenter__()
+        idle.put_nowait(connection)
+    return idle, connections
+
+
+def mcp_scenarios(idle: asyncio.Queue, products: int, competitors: int, seed: int = 7) -> Dict[str, Call]:
+    """MCP commands, each sent on an idle connection and awaited before the connection is reused"""
+
+    async def command(i: int, name: str, params: Dict[str, Any]) -> bool:
+        connection = await idle.get()
+        try:
+            await connection.send_json({"id": i, "command": name, "params": params})
+            reply = await connection.receive_json()
+            return reply.get("id") == i and reply.get("status") == "success"
+        finally:
+            idle.put_nowait(connection)
+
+    def product_id(rng: random.Random) -> str:
+        return f"prod_{rng.randrange(products)}"
+
+    async def price_trends(i: int) -> bool:
+        rng = _rng(seed, i)
+        params = {"product_id": product_id(rng), "timeframe": rng.choice(("daily", "weekly", "monthly"))}
+        if competitors and rng.random() < 0.3:
+            params["competitor_ids"] = [f"comp_{rng.randint(1, competitors)}"]
+        return await command(i, "price_trends", params)
+
+    async def price_trends_batch(i: int) -> bool:
+        rng = _rng(seed, i)
+        params = {
+            "product_ids": [product_id(rng) for _ in range(TREND_BATCH_SIZE)],
+            "timeframe": "daily",
+            "points": 100,
+        }
+        return await command(i, "price_trends_batch", params)
+
+    async def competitor_report(i: int) -> bool:
+        return await command(i, "competitor_report", {"limit": 50})
+
+    async def market_analysis(i: int) -> bool:
+        return await command(i, "market_analysis", {})
+
+    return {
+        "mcp price_trends": price_trends,
+        "mcp price_trends_batch": price_trends_batch,
+        "mcp competitor_report": competitor_report,
+        "mcp market_analysis": market_analysis,
+    }
+
+
+def micro_benchmarks(products: int) -> Dict[str, Any]:
+    """The single-component benchmarks kept next to the code they measure"""
+    import alert_rules
+    import matching
+    from . import serialization
+    results = {
+        "matching": matching.benchmark(min(products, 200_000), 20_000),
+        "alert_rules": alert_rules.benchmark(rules=1_000_000, ticks=100_000),
+        "serialization": serialization.benchmark(),
+    }
+    try:
+        snippet_parser = _import(MCP_DIR, "integrations.snippet_parser").snippet_parser
+    except ImportError as e:
+        results["snippet_parser"] = {"skipped": str(e)}
+    else:
+        results["snippet_parser"] = snippet_parser.benchmark(20_000)
+    return results
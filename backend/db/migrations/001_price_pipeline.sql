@@ -0,0 +1,71 @@
+-- Bring a database initialised from an earlier schema.sql up to date with
+-- the tables and indexes used by ingestion, rollups and alerts.
+-- schema.sql only runs when the Postgres volume is first created; this file
+-- is idempotent and can be applied to an existing volume at any time:
+--   docker-compose exec -T postgres psql -U postgres -d smart_retail < db/migrations/001_price_pipeline.sql
+
+ALTER TABLE price_history ADD COLUMN IF NOT EXISTS competitor_id UUID REFERENCES competitors(id);
+ALTER TABLE price_history ADD COLUMN IF NOT EXISTS source VARCHAR(50) DEFAULT 'internal';
+
+CREATE TABLE IF NOT EXISTS alerts (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    api_id VARCHAR(64) NOT NULL UNIQUE,
+    type VARCHAR(50) NOT NULL,
+    priority VARCHAR(20) NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    message TEXT NOT NULL,
+    product_id UUID REFERENCES products(id),
+    competitor_id UUID REFERENCES competitors(id),
+    threshold_value DECIMAL(10,2),
+    current_value DECIMAL(10,2),
+    is_read BOOLEAN DEFAULT false,
+    is_resolved BOOLEAN DEFAULT false,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+-- Alerts were not written before api_id was added, so the table is empty
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS api_id VARCHAR(64) NOT NULL UNIQUE;
+
+CREATE TABLE IF NOT EXISTS alert_rules (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    api_id VARCHAR(64) NOT NULL UNIQUE,
+    product_id UUID REFERENCES products(id) ON DELETE CASCADE,
+    category VARCHAR(255),
+    competitor_id UUID REFERENCES competitors(id),
+    direction VARCHAR(10) NOT NULL CHECK (direction IN ('below', 'above')),
+    threshold DECIMAL(10,2) NOT NULL,
+    priority VARCHAR(20) NOT NULL DEFAULT 'medium',
+    cooldown_seconds INTEGER NOT NULL DEFAULT 3600,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CHECK ((product_id IS NULL) <> (category IS NULL))
+);
+-- Rules were not written before api_id was added, so the table is empty
+ALTER TABLE alert_rules ADD COLUMN IF NOT EXISTS api_id VARCHAR(64) NOT NULL UNIQUE;
+
+CREATE TABLE IF NOT EXISTS price_rollups (
+    product_id UUID NOT NULL,
+    competitor_id VARCHAR(64) NOT NULL DEFAULT '',
+    bucket_size VARCHAR(10) NOT NULL,
+    bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    open DECIMAL(10,2) NOT NULL,
+    high DECIMAL(10,2) NOT NULL,
+    low DECIMAL(10,2) NOT NULL,
+    close DECIMAL(10,2) NOT NULL,
+    open_ts TIMESTAMP WITH TIME ZONE NOT NULL,
+    close_ts TIMESTAMP WITH TIME ZONE NOT NULL,
+    price_sum DECIMAL(18,2) NOT NULL,
+    tick_count BIGINT NOT NULL,
+    PRIMARY KEY (product_id, competitor_id, bucket_size, bucket_start)
+);
+
+-- The earlier index of this name lacked id, so keyset pages needed a sort
+DROP INDEX IF EXISTS idx_price_history_product_timestamp;
+CREATE INDEX idx_price_history_product_timestamp ON price_history(product_id, timestamp DESC, id DESC);
+-- Fails if price_history already holds duplicate ticks; remove them first
+CREATE UNIQUE INDEX IF NOT EXISTS idx_price_history_series_tick
+    ON price_history(product_id, competitor_id, timestamp) NULLS NOT DISTINCT;
+CREATE INDEX IF NOT EXISTS idx_alert_rules_product ON alert_rules(product_id);
+CREATE INDEX IF NOT EXISTS idx_alert_rules_category ON alert_rules(category);
+DROP INDEX IF EXISTS idx_alerts_status_created;
+DROP INDEX IF EXISTS idx_alerts_priority;
+DROP INDEX IF EXISTS idx_alerts_type;
+CREATE INDEX IF NOT EXISTS idx_alerts_product_status ON alerts(product_id, is_resolved, created_at DESC, api_id DESC);
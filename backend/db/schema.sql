@@ -33,8 +33,10 @@ CREATE TABLE products (
 CREATE TABLE price_history (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     product_id UUID REFERENCES products(id),
+    competitor_id UUID REFERENCES competitors(id),
     price DECIMAL(10,2) NOT NULL,
     currency VARCHAR(3) DEFAULT 'USD',
+    source VARCHAR(50) DEFAULT 'internal',
     is_sale BOOLEAN DEFAULT false,
     original_price DECIMAL(10,2),
     timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
@@ -78,12 +80,75 @@ CREATE TABLE market_trends (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Create alerts table
+-- api_id is the API's alert id (alert_1, ...); id is its row_uuid
+CREATE TABLE alerts (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    api_id VARCHAR(64) NOT NULL UNIQUE,
+    type VARCHAR(50) NOT NULL,
+    priority VARCHAR(20) NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    message TEXT NOT NULL,
+    product_id UUID REFERENCES products(id),
+    competitor_id UUID REFERENCES competitors(id),
+    threshold_value DECIMAL(10,2),
+    current_value DECIMAL(10,2),
+    is_read BOOLEAN DEFAULT false,
+    is_resolved BOOLEAN DEFAULT false,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create alert_rules table: price thresholds evaluated against incoming ticks
+-- Exactly one of product_id and category is set
+-- api_id is the API's rule id (rule_1, ...); id is its row_uuid
+CREATE TABLE alert_rules (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    api_id VARCHAR(64) NOT NULL UNIQUE,
+    product_id UUID REFERENCES products(id) ON DELETE CASCADE,
+    category VARCHAR(255),
+    competitor_id UUID REFERENCES competitors(id),
+    direction VARCHAR(10) NOT NULL CHECK (direction IN ('below', 'above')),
+    threshold DECIMAL(10,2) NOT NULL,
+    priority VARCHAR(20) NOT NULL DEFAULT 'medium',
+    cooldown_seconds INTEGER NOT NULL DEFAULT 3600,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CHECK ((product_id IS NULL) <> (category IS NULL))
+);
+
+-- Create price_rollups table: OHLC aggregates per series and time bucket,
+-- upserted as ticks are ingested. Works on plain Postgres (and SQLite);
+-- with TimescaleDB a continuous aggregate can replace it.
+-- competitor_id is '' for internal prices so the primary key has no NULLs.
+CREATE TABLE price_rollups (
+    product_id UUID NOT NULL,
+    competitor_id VARCHAR(64) NOT NULL DEFAULT '',
+    bucket_size VARCHAR(10) NOT NULL,
+    bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    open DECIMAL(10,2) NOT NULL,
+    high DECIMAL(10,2) NOT NULL,
+    low DECIMAL(10,2) NOT NULL,
+    close DECIMAL(10,2) NOT NULL,
+    open_ts TIMESTAMP WITH TIME ZONE NOT NULL,
+    close_ts TIMESTAMP WITH TIME ZONE NOT NULL,
+    price_sum DECIMAL(18,2) NOT NULL,
+    tick_count BIGINT NOT NULL,
+    PRIMARY KEY (product_id, competitor_id, bucket_size, bucket_start)
+);
+
 -- Create indexes for better query performance
 CREATE INDEX idx_products_category ON products(category);
 CREATE INDEX idx_products_brand ON products(brand);
 CREATE INDEX idx_products_competitor ON products(competitor_id);
-CREATE INDEX idx_price_history_product_timestamp ON price_history(product_id, timestamp DESC);
+-- id is included so keyset pages on (timestamp, id) are pure index range scans
+CREATE INDEX idx_price_history_product_timestamp ON price_history(product_id, timestamp DESC, id DESC);
 CREATE INDEX idx_price_history_timestamp ON price_history(timestamp DESC);
+-- One tick per series and instant; lets bulk ingest skip duplicates with ON CONFLICT
+CREATE UNIQUE INDEX idx_price_history_series_tick
+    ON price_history(product_id, competitor_id, timestamp) NULLS NOT DISTINCT;
+CREATE INDEX idx_alert_rules_product ON alert_rules(product_id);
+CREATE INDEX idx_alert_rules_category ON alert_rules(category);
+-- Serves a product's alerts by status, newest first
+CREATE INDEX idx_alerts_product_status ON alerts(product_id, is_resolved, created_at DESC, api_id DESC);
 CREATE INDEX idx_promotions_product_dates ON promotions(product_id, start_date, end_date);
 CREATE INDEX idx_ai_insights_product_type ON ai_insights(product_id, insight_type);
 CREATE INDEX idx_ai_insights_valid_until ON ai_insights(valid_until);
@@ -0,0 +1,358 @@
+"""
+Adaptive re-crawl scheduling for competitor prices
+Every (product, competitor) pair sits in a heap ordered by when it is next
+due. After each crawl its interval is recomputed from how often and by how
+much its price has changed, so volatile listings are polled often and
+static ones drift towards the maximum interval. Due pairs are crawled in
+batches, one search per product, with the search client fanning the
+queries out concurrently.
+"""
+
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+from collections import deque
+from urllib.parse import urlparse
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import time
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+# (product_id, competitor_id)
+TargetKey = Tuple[str, str]
+# (product_id, competitor_id, price, url, observed at in epoch seconds)
+Observation = Tuple[str, str, float, str, float]
+
+SearchMany = Callable[[List[str]], Awaitable[Dict[str, List[Any]]]]
+RecordObservations = Callable[[List[Observation]], Awaitable[None]]
+
+class CrawlSchedulerConfig(BaseModel):
+    min_interval: float = Field(900.0, gt=0, description="Seconds")
+    max_interval: float = Field(86400.0, gt=0, description="Seconds")
+    default_interval: float = Field(21600.0, gt=0, description="Prior: one change per this many seconds")
+    change_probability: float = Field(0.5, gt=0, lt=1, description="Target chance of a change between crawls")
+    volatility_scale: float = Field(0.05, gt=0, description="Mean relative move that halves the interval")
+    history_horizon: float = Field(30 * 86400.0, gt=0, description="Seconds of change history that count")
+    batch_size: int = Field(50, ge=1, description="Products searched per batch")
+    max_batches_in_flight: int = Field(2, ge=1)
+    idle_sleep: float = Field(5.0, gt=0, description="Longest sleep while nothing is due")
+    max_results: int = Field(20, ge=1, le=100, description="Search results scanned per product")
+    lookback_days: int = Field(30, ge=1, description="Price history that seeds the change statistics")
+    target_refresh: float = Field(3600.0, gt=0, description="Seconds between reloads of the product and competitor lists")
+
+    @classmethod
+    def from_env(cls) -> "CrawlSchedulerConfig":
+        """Build a config from the CRAWL_* variables"""
+        return cls(
+            min_interval=float(os.getenv("CRAWL_MIN_INTERVAL_SECONDS", 900.0)),
+            max_interval=float(os.getenv("CRAWL_MAX_INTERVAL_SECONDS", 86400.0)),
+            default_interval=float(os.getenv("CRAWL_DEFAULT_INTERVAL_SECONDS", 21600.0)),
+            batch_size=int(os.getenv("CRAWL_BATCH_SIZE", 50)),
+            max_batches_in_flight=int(os.getenv("CRAWL_MAX_BATCHES_IN_FLIGHT", 2)),
+            max_results=int(os.getenv("CRAWL_MAX_RESULTS", 20)),
+            lookback_days=int(os.getenv("CRAWL_LOOKBACK_DAYS", 30)),
+            target_refresh=float(os.getenv("CRAWL_TARGET_REFRESH_SECONDS", 3600.0)),
+        )
+
+def domain_of(url: str) -> str:
+    """Host of a URL or bare domain, without a leading www."""
+    host = urlparse(url if "//" in url else f"//{url}").hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+class CrawlTarget:
+    """Crawl state and change statistics of one (product, competitor) pair"""
+
+    __slots__ = (
+        "product_id", "competitor_id", "query", "domain", "interval", "next_due",
+        "last_observed", "last_price", "changes", "observed_seconds", "volatility", "misses",
+    )
+
+    def __init__(self, product_id: str, competitor_id: str, query: str, domain: str, interval: float):
+        self.product_id = product_id
+        self.competitor_id = competitor_id
+        self.query = query
+        self.domain = domain
+        self.interval = interval
+        self.next_due = 0.0
+        self.last_observed: Optional[float] = None
+        self.last_price: Optional[float] = None
+        self.changes = 0.0
+        self.observed_seconds = 0.0
+        # Exponentially weighted mean absolute log price move per change
+        self.volatility = 0.0
+        self.misses = 0
+
+    @property
+    def key(self) -> TargetKey:
+        return (self.product_id, self.competitor_id)
+
+class CrawlScheduler:
+    """
+    Heap of crawl targets by next-due time, with adaptive intervals
+
+    ``search`` maps a list of queries to search results per query (e.g.
+    GoogleShoppingAPI.search_many); results need ``link`` and ``price``.
+    ``record`` receives the observed prices of each batch.
+    """
+
+    def __init__(
+        self,
+        search: SearchMany,
+        record: RecordObservations,
+        config: Optional[CrawlSchedulerConfig] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.search = search
+        self.record = record
+        self.config = config or CrawlSchedulerConfig()
+        self._clock = clock
+        self._targets: Dict[TargetKey, CrawlTarget] = {}
+        self._heap: List[Tuple[float, int, TargetKey]] = []
+        self._seq = itertools.count()
+        self._lags: Deque[float] = deque(maxlen=10000)
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"batches": 0, "searches": 0, "crawled": 0, "changed": 0, "missed": 0, "unanswered": 0, "failed_batches": 0}
+
+    def __len__(self) -> int:
+        return len(self._targets)
+
+    def get(self, product_id: str, competitor_id: str) -> Optional[CrawlTarget]:
+        return self._targets.get((product_id, competitor_id))
+
+    def _push(self, target: CrawlTarget, due: float) -> None:
+        target.next_due = due
+        heapq.heappush(self._heap, (due, next(self._seq), target.key))
+
+    def add_target(
+        self,
+        product_id: str,
+        competitor_id: str,
+        query: str,
+        website: str,
+        changes: float = 0.0,
+        observed_seconds: float = 0.0,
+        volatility: float = 0.0,
+        last_observed: Optional[float] = None,
+        last_price: Optional[float] = None,
+    ) -> CrawlTarget:
+        """
+        Add or replace a target, seeded with change statistics from price
+        history; it is due one interval after its last observation
+        """
+        target = CrawlTarget(product_id, competitor_id, query, domain_of(website), self.config.default_interval)
+        target.changes = changes
+        target.observed_seconds = observed_seconds
+        target.volatility = volatility
+        target.last_observed = last_observed
+        target.last_price = last_price
+        target.interval = self.interval(target)
+        self._targets[target.key] = target
+        now = self._clock()
+        self._push(target, now if last_observed is None else min(now, last_observed) + target.interval)
+        return target
+
+    def remove_target(self, product_id: str, competitor_id: str) -> Optional[CrawlTarget]:
+        # The heap entry is skipped when popped
+        return self._targets.pop((product_id, competitor_id), None)
+
+    def drop_where(self, predicate: Callable[[TargetKey], bool]) -> None:
+        for key in [key for key in self._targets if predicate(key)]:
+            del self._targets[key]
+
+    def interval(self, target: CrawlTarget) -> float:
+        """
+        Seconds until the chance of a price change reaches change_probability
+
+        Changes are modelled as a Poisson process whose rate is estimated
+        from observed changes, with a prior of one change per
+        default_interval; larger typical moves shorten the interval further.
+        """
+        config = self.config
+        rate = (target.changes + 1) / (target.observed_seconds + config.default_interval)
+        interval = -math.log(1 - config.change_probability) / rate
+        interval /= 1 + target.volatility / config.volatility_scale
+        return min(config.max_interval, max(config.min_interval, interval))
+
+    def observe(self, target: CrawlTarget, price: float, at: float) -> bool:
+        """Fold a crawled price into the target's statistics; True if it changed"""
+        changed = False
+        if target.last_price is not None and target.last_observed is not None:
+            target.observed_seconds += max(0.0, at - target.last_observed)
+            if abs(price - target.last_price) > 1e-9:
+                changed = True
+                target.changes += 1
+                if price > 0 and target.last_price > 0:
+                    move = abs(math.log(price / target.last_price))
+                    target.volatility = 0.3 * move + 0.7 * target.volatility
+            # Forget history beyond the horizon proportionally
+            horizon = self.config.history_horizon
+            if target.observed_seconds > horizon:
+                target.changes *= horizon / target.observed_seconds
+                target.observed_seconds = horizon
+        target.last_price = price
+        target.last_observed = at
+        target.misses = 0
+        return changed
+
+    def pop_due(self, now: float, limit: int) -> List[CrawlTarget]:
+        """
+        Remove and return up to ``limit`` products' worth of due targets,
+        most overdue first; targets of the same product are taken together
+        so they share one search
+        """
+        due: List[CrawlTarget] = []
+        queries = set()
+        while self._heap and self._heap[0][0] <= now:
+            due_at, _, key = self._heap[0]
+            target = self._targets.get(key)
+            if target is None or target.next_due != due_at:
+                heapq.heappop(self._heap)
+                continue
+            if target.query not in queries and len(queries) >= limit:
+                break
+            heapq.heappop(self._heap)
+            queries.add(target.query)
+            self._lags.append(now - due_at)
+            # Parked until rescheduled after the crawl
+            target.next_due = math.inf
+            due.append(target)
+        return due
+
+    def next_due(self) -> Optional[float]:
+        while self._heap:
+            due_at, _, key = self._heap[0]
+            target = self._targets.get(key)
+            if target is not None and target.next_due == due_at:
+                return due_at
+            heapq.heappop(self._heap)
+        return None
+
+    async def crawl(self, targets: Sequence[CrawlTarget]) -> List[Observation]:
+        """Search each product once, record the competitors' prices and reschedule every target"""
+        by_query: Dict[str, List[CrawlTarget]] = {}
+        for target in targets:
+            by_query.setdefault(target.query, []).append(target)
+        try:
+            results = await self.search(list(by_query))
+        except Exception as e:
+            logger.error(f"Crawl batch failed: {str(e)}")
+            self._stats["failed_batches"] += 1
+            results = {}
+        self._stats["batches"] += 1
+        self._stats["searches"] += len(by_query)
+
+        now = self._clock()
+        observations: List[Observation] = []
+        for query, group in by_query.items():
+            listings = results.get(query)
+            if not listings:
+                # The search failed, ran out of quota or came back empty,
+                # which says nothing about any one competitor: retry at the
+                # current interval without counting misses
+                self._stats["unanswered"] += 1
+                for target in group:
+                    if target.key in self._targets:
+                        self._push(target, now + target.interval)
+                continue
+            # Cheapest listing per domain among this product's results
+            offers: Dict[str, Any] = {}
+            for result in listings:
+                domain = domain_of(result.link)
+                if domain not in offers or result.price < offers[domain].price:
+                    offers[domain] = result
+            for target in group:
+                if target.key not in self._targets:
+                    continue
+                offer = offers.get(target.domain)
+                if offer is None:
+                    # Not listed: back off up to the maximum
+                    target.misses += 1
+                    self._stats["missed"] += 1
+                    delay = min(self.config.max_interval, target.interval * 2 ** min(target.misses, 6))
+                else:
+                    if self.observe(target, offer.price, now):
+                        self._stats["changed"] += 1
+                    self._stats["crawled"] += 1
+                    target.interval = self.interval(target)
+                    delay = target.interval
+                    observations.append((target.product_id, target.competitor_id, offer.price, offer.link, now))
+                self._push(target, now + delay)
+        if observations:
+            await self.record(observations)
+        return observations
+
+    async def run(self) -> None:
+        """Crawl due targets until cancelled, up to max_batches_in_flight batches at a time"""
+        slots = asyncio.Semaphore(self.config.max_batches_in_flight)
+        batches = set()
+        try:
+            while True:
+                await slots.acquire()
+                due = self.pop_due(self._clock(), self.config.batch_size)
+                if not due:
+                    slots.release()
+                    upcoming = self.next_due()
+                    wait = self.config.idle_sleep if upcoming is None else upcoming - self._clock()
+                    await asyncio.sleep(min(self.config.idle_sleep, max(0.01, wait)))
+                    continue
+                batch = asyncio.create_task(self.crawl(due))
+                batches.add(batch)
+                batch.add_done_callback(batches.discard)
+                batch.add_done_callback(lambda _: slots.release())
+        finally:
+            for batch in batches:
+                batch.cancel()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Crawl counters, scheduling lag and freshness of the collected prices"""
+        now = self._clock()
+        targets = list(self._targets.values())
+        stats: Dict[str, Any] = dict(self._stats)
+        stats["targets"] = len(targets)
+        stats["running"] = self._task is not None and not self._task.done()
+
+        due_at = np.array([t.next_due for t in targets], dtype=np.float64)
+        stats["due_now"] = int(np.count_nonzero(due_at <= now))
+        lags = np.array(self._lags, dtype=np.float64)
+        stats["lag_seconds"] = {
+            "p50": float(np.percentile(lags, 50)) if len(lags) else 0.0,
+            "p95": float(np.percentile(lags, 95)) if len(lags) else 0.0,
+            "max": float(lags.max()) if len(lags) else 0.0,
+        }
+
+        observed = [(now - t.last_observed, t.interval) for t in targets if t.last_observed is not None]
+        ages = np.array([age for age, _ in observed], dtype=np.float64)
+        intervals = np.array([interval for _, interval in observed], dtype=np.float64)
+        stats["freshness"] = {
+            "never_crawled": len(targets) - len(observed),
+            "age_p50_seconds": float(np.percentile(ages, 50)) if len(ages) else None,
+            "age_p95_seconds": float(np.percentile(ages, 95)) if len(ages) else None,
+            # Share of observed targets crawled within their current interval
+            "within_interval": round(float(np.mean(ages <= intervals)), 4) if len(ages) else None,
+        }
+        all_intervals = np.array([t.interval for t in targets], dtype=np.float64)
+        stats["interval_seconds"] = {
+            "min": float(all_intervals.min()) if len(all_intervals) else None,
+            "median": float(np.median(all_intervals)) if len(all_intervals) else None,
+            "max": float(all_intervals.max()) if len(all_intervals) else None,
+        }
+        return stats
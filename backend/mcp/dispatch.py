@@ -0,0 +1,180 @@
+"""
+Concurrent command dispatch for MCP WebSocket connections
+
+Each message is ``{"id": ..., "command": ..., "params": {...}}`` with an
+optional ``timeout`` in seconds. Commands run concurrently, up to a
+per-connection limit, with a bounded number queued behind them; each
+response carries the request id and is sent as soon as its command
+completes. ``{"command": "cancel", "params": {"id": ...}}`` cancels a queued
+or running command. A failing command, like a malformed or binary message,
+produces an error response and never closes the connection.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Set
+import asyncio
+import json
+import logging
+import math
+import os
+
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[dict]]
+
+
+class DispatchConfig(BaseModel):
+    max_in_flight: int = Field(16, ge=1, description="Concurrent commands per connection")
+    max_queued: int = Field(256, ge=0, description="Commands waiting for a slot, per connection")
+    default_timeout: float = Field(30.0, gt=0, description="Seconds, when a message sets no timeout")
+    max_timeout: float = Field(300.0, gt=0)
+
+    @classmethod
+    def from_env(cls) -> "DispatchConfig":
+        """Build a config from the MCP_MAX_* and MCP_*_TIMEOUT variables"""
+        return cls(
+            max_in_flight=int(os.getenv("MCP_MAX_IN_FLIGHT", 16)),
+            max_queued=int(os.getenv("MCP_MAX_QUEUED", 256)),
+            default_timeout=float(os.getenv("MCP_COMMAND_TIMEOUT", 30.0)),
+            max_timeout=float(os.getenv("MCP_MAX_COMMAND_TIMEOUT", 300.0)),
+        )
+
+
+class MCPSession:
+    """One WebSocket connection and its in-flight commands"""
+
+    def __init__(self, websocket: WebSocket, handlers: Dict[str, Handler], config: DispatchConfig):
+        self.websocket = websocket
+        self.handlers = handlers
+        self.config = config
+        self._slots = asyncio.Semaphore(config.max_in_flight)
+        self._send_lock = asyncio.Lock()
+        # Commands by request id, for cancellation; _tasks also holds id-less ones
+        self._in_flight: Dict[Any, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._closed = False
+
+    async def send(self, message: dict) -> None:
+        if self._closed:
+            return
+        # default=str covers datetimes and Mongo ObjectIds in handler results
+        payload = json.dumps(message, default=str)
+        async with self._send_lock:
+            await self.websocket.send_text(payload)
+
+    async def run(self) -> None:
+        """Read messages until the client disconnects, dispatching each one"""
+        try:
+            while True:
+                # receive_text() raises KeyError on a binary frame
+                frame = await self.websocket.receive()
+                if frame["type"] == "websocket.disconnect":
+                    break
+                raw = frame.get("text")
+                if raw is None:
+                    await self.send(
+                        {"id": None, "status": "error", "message": "Invalid message: binary frames are not supported"}
+                    )
+                    continue
+                try:
+                    message = json.loads(raw)
+                    if not isinstance(message, dict):
+                        raise ValueError("Message must be a JSON object")
+                except ValueError as e:
+                    await self.send({"id": None, "status": "error", "message": f"Invalid message: {str(e)}"})
+                    continue
+                await self.dispatch(message)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self._closed = True
+            self.cancel_all()
+
+    async def dispatch(self, message: dict) -> None:
+        request_id = message.get("id")
+        command = message.get("command")
+        params = message.get("params")
+        params = {} if params is None else params
+
+        if not isinstance(request_id, (str, int, type(None))):
+            await self.send({"id": None, "status": "error", "message": "Request id must be a string or integer"})
+            return
+        if not isinstance(params, dict):
+            await self.send({"id": request_id, "status": "error", "message": "Params must be a JSON object"})
+            return
+        # Never waits for a slot, so a cancel is read even when all are taken
+        if command == "cancel":
+            await self.send(self.cancel(request_id, params.get("id")))
+            return
+        if request_id is not None and request_id in self._in_flight:
+            await self.send({"id": request_id, "status": "error", "message": "Duplicate request id"})
+            return
+        handler = self.handlers.get(command)
+        if handler is None:
+            await self.send({"id": request_id, "status": "error", "message": "Unknown command"})
+            return
+
+        try:
+            timeout = float(message.get("timeout", self.config.default_timeout))
+        except (TypeError, ValueError):
+            timeout = math.nan
+        if not timeout > 0:
+            await self.send({"id": request_id, "status": "error", "message": "Timeout must be a positive number"})
+            return
+        timeout = min(timeout, self.config.max_timeout)
+
+        if len(self._tasks) >= self.config.max_in_flight + self.config.max_queued:
+            await self.send({"id": request_id, "status": "error", "message": "Too many commands in flight"})
+            return
+        task = asyncio.create_task(self._execute(request_id, command, handler, params, timeout))
+        self._tasks.add(task)
+        if request_id is not None:
+            self._in_flight[request_id] = task
+        task.add_done_callback(lambda done: self._finished(request_id, command, done))
+
+    def _finished(self, request_id: Any, command: str, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if request_id is not None and self._in_flight.get(request_id) is task:
+            del self._in_flight[request_id]
+        # Answered here rather than in _execute, which never runs for a
+        # command cancelled before it started
+        if task.cancelled() and not self._closed:
+            reply = asyncio.create_task(
+                self._respond(request_id, command, {"status": "cancelled", "message": "Command cancelled"})
+            )
+            self._tasks.add(reply)
+            reply.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, request_id: Any, command: str, handler: Handler,
+                       params: dict, timeout: float) -> None:
+        try:
+            # Queued here, not in the read loop, until one of max_in_flight
+            # slots frees up; the timeout covers the command alone
+            async with self._slots:
+                response = await asyncio.wait_for(handler(params), timeout=timeout)
+        except asyncio.TimeoutError:
+            response = {"status": "error", "message": f"Command timed out after {timeout:g}s"}
+        except Exception as e:
+            logger.exception("Command %s failed", command)
+            response = {"status": "error", "message": str(e)}
+        await self._respond(request_id, command, response)
+
+    async def _respond(self, request_id: Any, command: str, response: dict) -> None:
+        try:
+            await self.send({"id": request_id, **response})
+        except Exception as e:
+            logger.warning(f"Could not send response for {command}: {str(e)}")
+
+    def cancel(self, request_id: Any, target_id: Any) -> dict:
+        task = self._in_flight.get(target_id)
+        if task is None:
+            return {"id": request_id, "status": "error", "message": "No such in-flight request"}
+        task.cancel()
+        return {"id": request_id, "status": "success", "data": {"cancelled": target_id}}
+
+    def cancel_all(self) -> None:
+        """Cancel every running command; their responses are dropped once closed"""
+        for task in list(self._tasks):
+            task.cancel()
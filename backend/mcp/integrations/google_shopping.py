@@ -1,18 +1,38 @@
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 import aiohttp
 import asyncio
 import json
 import logging
+import time
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from .rate_limiter import QuotaExhaustedError, RateLimitConfig, RateLimiter, get_shared_limiter, parse_retry_after
+from .search_cache import STALE, SearchCache, search_key
+from .snippet_parser import SnippetParser
 
 logger = logging.getLogger(__name__)
 
+# The Custom Search API returns at most 10 items per request and serves
+# nothing past the 100th result
+PAGE_SIZE = 10
+MAX_RESULTS = 100
+
 class GoogleShoppingConfig(BaseModel):
     api_key: str
     cx: str  # Custom Search Engine ID
     country: str = "US"
     language: str = "en"
+    base_url: Optional[str] = Field(None, description="Override for GoogleShoppingAPI.BASE_URL, e.g. a local stand-in server")
+    max_concurrency: int = Field(8, ge=1, description="Page requests in flight per client")
+    connection_limit: int = Field(100, ge=1, description="Open connections in the shared session")
+    connection_limit_per_host: int = Field(20, ge=1)
+    dns_cache_ttl: int = Field(300, ge=0, description="Seconds")
+    keepalive_timeout: float = Field(30.0, gt=0, description="Seconds an idle connection is kept")
+    request_timeout: float = Field(15.0, gt=0, description="Seconds per page request")
+    rate_limit: RateLimitConfig = Field(default_factory=RateLimitConfig.from_env)
+    # Quota units kept back for first pages; deeper pages are skipped below it
+    quota_reserve: int = Field(100, ge=0)
 
 class ProductSearchResult(BaseModel):
     title: str
@@ -24,20 +44,70 @@ class ProductSearchResult(BaseModel):
     availability: str
     timestamp: datetime = datetime.utcnow()
 
+_shared_session: Optional[aiohttp.ClientSession] = None
+_shared_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_shared_session(config: GoogleShoppingConfig) -> aiohttp.ClientSession:
+    """
+    Long-lived session reused by every GoogleShoppingAPI on the running loop,
+    so keep-alive connections and cached DNS survive between batches. The
+    first caller's config sizes the connector.
+    """
+    global _shared_session, _shared_loop
+    loop = asyncio.get_running_loop()
+    if _shared_session is None or _shared_session.closed or _shared_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=config.connection_limit,
+            limit_per_host=config.connection_limit_per_host,
+            ttl_dns_cache=config.dns_cache_ttl,
+            keepalive_timeout=config.keepalive_timeout,
+        )
+        _shared_session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=config.request_timeout),
+        )
+        _shared_loop = loop
+    return _shared_session
+
+async def close_shared_session() -> None:
+    """Close the shared session, e.g. on application shutdown"""
+    global _shared_session, _shared_loop
+    if _shared_session is not None and not _shared_session.closed:
+        await _shared_session.close()
+    _shared_session = None
+    _shared_loop = None
+
 class GoogleShoppingAPI:
     BASE_URL = "https://www.googleapis.com/customsearch/v1"
     
-    def __init__(self, config: GoogleShoppingConfig):
+    def __init__(
+        self,
+        config: GoogleShoppingConfig,
+        session: Optional[aiohttp.ClientSession] = None,
+        cache: Optional[SearchCache] = None,
+        limiter: Optional[RateLimiter] = None,
+    ):
         self.config = config
-        self.session = None
+        # An explicitly passed session is the caller's to close; otherwise
+        # the shared session is used and outlives this client
+        self.session = session
+        self.cache = cache
+        # Defaults to the limiter shared by every client on the loop
+        self.limiter = limiter
+        self.parser = SnippetParser(config.country, config.language)
+        self._semaphore = asyncio.Semaphore(config.max_concurrency)
+        # Background refreshes of stale cache entries, by cache key
+        self._revalidating: Dict[str, asyncio.Task] = {}
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        if self.session is None:
+            self.session = get_shared_session(self.config)
+        if self.limiter is None:
+            self.limiter = get_shared_limiter(self.config.rate_limit)
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
+        pass
     
     async def search_products(
         self,
@@ -49,84 +119,225 @@ class GoogleShoppingAPI:
         """
         Search for products using Google Shopping API
         
+        Results past the first page are fetched concurrently once the first
+        page reports how many results exist. With a cache, fresh entries are
+        returned without a request and stale ones are returned while a
+        background refresh replaces them.
+        
         Args:
             query: Search query string
-            max_results: Maximum number of results to return
+            max_results: Maximum number of results to return (at most 100)
             min_price: Minimum price filter
             max_price: Maximum price filter
             
         Returns:
             List of ProductSearchResult objects
         """
+        max_results = max(0, min(max_results, MAX_RESULTS))
+        if max_results == 0:
+            return []
+        if self.cache is None:
+            results, _ = await self._search(query, max_results, min_price, max_price)
+            return results
+        
+        key = search_key(query, min_price, max_price, self.config.country, self.config.language)
+        cached = await self.cache.get(key, max_results)
+        if cached is None:
+            return await self._search_and_store(key, query, max_results, min_price, max_price)
+        if cached.state == STALE and key not in self._revalidating:
+            task = asyncio.create_task(
+                self._revalidate(key, query, max(max_results, cached.requested), min_price, max_price)
+            )
+            self._revalidating[key] = task
+            task.add_done_callback(lambda done: self._revalidating.pop(key, None))
+        return [ProductSearchResult(**item) for item in cached.results[:max_results]]
+    
+    async def _search_and_store(
+        self,
+        key: str,
+        query: str,
+        max_results: int,
+        min_price: Optional[float],
+        max_price: Optional[float]
+    ) -> List[ProductSearchResult]:
+        results, complete = await self._search(query, max_results, min_price, max_price)
+        items = [result.dict() for result in results]
+        if complete:
+            # Empty searches are stored too, as short-lived negative entries
+            await self.cache.put(key, items, max_results)
+        else:
+            # A failed search is stored as a negative entry, and a partial one
+            # as covering only what it found, but neither replaces results
+            # that are still being served stale
+            await self.cache.put(key, items, len(items) if items else max_results, keep_results=True)
+        return results
+    
+    async def _revalidate(
+        self,
+        key: str,
+        query: str,
+        max_results: int,
+        min_price: Optional[float],
+        max_price: Optional[float]
+    ) -> None:
         try:
-            params = {
-                "key": self.config.api_key,
-                "cx": self.config.cx,
-                "q": f"{query} site:shopping.google.com",
-                "num": min(max_results, 10),  # API limit is 10 per request
-                "gl": self.config.country,
-                "hl": self.config.language,
-            }
-            
-            if min_price is not None:
-                params["lowPrice"] = min_price
-            if max_price is not None:
-                params["highPrice"] = max_price
-            
-            async with self.session.get(self.BASE_URL, params=params) as response:
-                if response.status != 200:
-                    logger.error(f"Google Shopping API error: {response.status}")
-                    return []
-                
-                data = await response.json()
-                return self._parse_search_results(data)
-                
+            await self._search_and_store(key, query, max_results, min_price, max_price)
         except Exception as e:
-            logger.error(f"Error in Google Shopping search: {str(e)}")
-            return []
+            logger.error(f"Refreshing cached search '{query}' failed: {str(e)}")
     
-    def _parse_search_results(self, data: Dict) -> List[ProductSearchResult]:
-        """Parse Google Shopping API response into ProductSearchResult objects"""
-        results = []
+    async def _search(
+        self,
+        query: str,
+        max_results: int,
+        min_price: Optional[float],
+        max_price: Optional[float]
+    ) -> Tuple[List[ProductSearchResult], bool]:
+        """
+        Results of one search, and whether every page it needed was fetched
+        (False on quota exhaustion, errors or a truncated quota budget)
+        """
+        params = {
+            "key": self.config.api_key,
+            "cx": self.config.cx,
+            "q": f"{query} site:shopping.google.com",
+            "gl": self.config.country,
+            "hl": self.config.language,
+        }
+        if min_price is not None:
+            params["lowPrice"] = min_price
+        if max_price is not None:
+            params["highPrice"] = max_price
         
-        for item in data.get("items", []):
-            try:
-                # Extract price from snippet using regex or other parsing methods
-                price_info = self._extract_price_info(item.get("snippet", ""))
-                
-                result = ProductSearchResult(
-                    title=item.get("title", ""),
-                    link=item.get("link", ""),
-                    price=price_info["price"],
-                    currency=price_info["currency"],
-                    seller=self._extract_seller(item),
-                    availability=self._extract_availability(item),
-                )
-                results.append(result)
-            except Exception as e:
-                logger.warning(f"Error parsing search result: {str(e)}")
-                continue
+        first = await self._fetch_page(params, 1, min(max_results, PAGE_SIZE))
+        if first is None:
+            return [], False
+        results = self._parse_search_results(first)
         
-        return results
+        available = self._total_results(first)
+        wanted = min(max_results, available)
+        starts = range(1 + PAGE_SIZE, wanted + 1, PAGE_SIZE)
+        complete = True
+        # Each page costs a quota unit; near the end of the budget only
+        # first pages are fetched, so more queries get some results
+        affordable = max(0, self.limiter.quota_remaining() - self.config.quota_reserve)
+        if len(starts) > affordable:
+            logger.info(f"Quota low: fetching {affordable} of {len(starts)} further pages for '{query}'")
+            starts = starts[:affordable]
+            complete = False
+        if starts and len(first.get("items", [])) == PAGE_SIZE:
+            pages = await asyncio.gather(*(
+                self._fetch_page(params, start, min(PAGE_SIZE, wanted - start + 1))
+                for start in starts
+            ))
+            for page in pages:
+                if page is None:
+                    complete = False
+                else:
+                    results.extend(self._parse_search_results(page))
+        return results[:max_results], complete
     
-    def _extract_price_info(self, snippet: str) -> Dict[str, str]:
-        """Extract price and currency from snippet"""
-        # Implement price extraction logic
-        # This is a placeholder implementation
-        return {
-            "price": 0.0,
-            "currency": "USD"
-        }
+    async def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Search cache hit rate, bytes saved and size, or None without a cache"""
+        if self.cache is None:
+            return None
+        stats = await self.cache.stats()
+        stats["revalidating"] = len(self._revalidating)
+        return stats
+    
+    async def search_many(
+        self,
+        queries: Sequence[str],
+        max_results: int = 10,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None
+    ) -> Dict[str, List[ProductSearchResult]]:
+        """
+        Run search_products for many queries concurrently
+        
+        Page requests across all queries share this client's concurrency
+        limit, so hundreds of queries can be passed at once.
+        
+        Returns:
+            Results per distinct query, in the order given
+        """
+        unique = list(dict.fromkeys(queries))
+        found = await asyncio.gather(*(
+            self.search_products(query, max_results, min_price, max_price)
+            for query in unique
+        ))
+        return dict(zip(unique, found))
     
-    def _extract_seller(self, item: Dict) -> str:
-        """Extract seller information from search result"""
-        # Implement seller extraction logic
-        return "Unknown Seller"
+    async def _fetch_page(self, params: Dict, start: int, num: int) -> Optional[Dict]:
+        """
+        Fetch one page of results, or None if it could not be fetched
+        
+        429s, 5xx responses and connection errors are retried with backoff
+        (honouring Retry-After); other errors and an exhausted daily quota
+        give up immediately.
+        """
+        url = self.config.base_url or self.BASE_URL
+        status = None
+        for attempt in range(self.limiter.config.max_retries + 1):
+            retry_after = None
+            try:
+                async with self._semaphore, self.limiter.slot():
+                    started = time.monotonic()
+                    async with self.session.get(url, params={**params, "start": start, "num": num}) as response:
+                        status = response.status
+                        if status == 200:
+                            data = await response.json()
+                            self.limiter.on_success(time.monotonic() - started)
+                            return data
+                        if status != 429 and status < 500:
+                            logger.error(f"Google Shopping API error: {status}")
+                            return None
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        self.limiter.on_throttle(retry_after)
+            except QuotaExhaustedError as e:
+                logger.debug(f"Google Shopping search skipped: {str(e)}")
+                return None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = type(e).__name__
+                self.limiter.on_error()
+            except Exception as e:
+                logger.error(f"Error in Google Shopping search: {str(e)}")
+                return None
+            if attempt < self.limiter.config.max_retries:
+                await asyncio.sleep(self.limiter.backoff(attempt, retry_after))
+        logger.error(f"Google Shopping API error after {self.limiter.config.max_retries + 1} attempts: {status}")
+        return None
+    
+    @staticmethod
+    def _total_results(data: Dict) -> int:
+        """Result count reported by the API, capped at what it will serve"""
+        try:
+            total = int(data.get("searchInformation", {}).get("totalResults", 0))
+        except (TypeError, ValueError):
+            total = 0
+        return min(max(total, len(data.get("items", []))), MAX_RESULTS)
     
-    def _extract_availability(self, item: Dict) -> str:
-        """Extract product availability from search result"""
-        # Implement availability extraction logic
-        return "Unknown"
+    def _parse_search_results(self, data: Dict) -> List[ProductSearchResult]:
+        """Parse Google Shopping API response into ProductSearchResult objects"""
+        items = data.get("items", [])
+        fetched_at = datetime.utcnow()
+        results = []
+        # The parser's output is already typed, so models are built without
+        # re-validating every field
+        for item, offer in zip(items, self.parser.parse_many(items)):
+            if offer.price is None:
+                logger.debug(f"No price found in search result: {item.get('link', '')}")
+                continue
+            results.append(ProductSearchResult.model_construct(
+                title=item.get("title", ""),
+                link=item.get("link", ""),
+                price=offer.price,
+                currency=offer.currency,
+                seller=offer.seller,
+                condition="new",
+                availability=offer.availability,
+                timestamp=fetched_at,
+            ))
+        return results
 
 async def main():
     """Test the Google Shopping API integration"""
@@ -135,16 +346,20 @@ async def main():
         cx="YOUR_CUSTOM_SEARCH_ENGINE_ID"
     )
     
-    async with GoogleShoppingAPI(config) as api:
-        results = await api.search_products(
-            query="smartphone",
-            max_results=5,
-            min_price=200,
-            max_price=1000
-        )
-        
-        for result in results:
-            print(f"Found: {result.title} - {result.price} {result.currency}")
+    try:
+        async with GoogleShoppingAPI(config) as api:
+            results = await api.search_products(
+                query="smartphone",
+                max_results=5,
+                min_price=200,
+                max_price=1000
+            )
+            
+            for result in results:
+                print(f"Found: {result.title} - {result.price} {result.currency}")
+    finally:
+        await close_shared_session()
 
+# Run from backend/mcp with: python -m integrations.google_shopping
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
@@ -0,0 +1,216 @@
+"""
+Outbound request limiting for the Google Shopping integration
+A token bucket paces requests, a daily budget stops spending once the API
+quota is used up, and an AIMD concurrency limit backs off on throttling
+(429/5xx) or slow responses and creeps back up while requests succeed.
+A 429 with Retry-After pauses every caller sharing the limiter.
+"""
+
+from typing import Any, AsyncIterator, Dict, Optional
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timezone
+from email.utils import parsedate_to_datetime
+import asyncio
+import logging
+import os
+import random
+import time
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+try:
+    from zoneinfo import ZoneInfo
+    # The Custom Search API quota resets at midnight Pacific time
+    QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+except Exception:
+    QUOTA_TIMEZONE = timezone.utc
+
+class QuotaExhaustedError(RuntimeError):
+    """Raised when the daily request budget is spent"""
+
+class RateLimitConfig(BaseModel):
+    requests_per_second: float = Field(5.0, gt=0)
+    burst: int = Field(10, ge=1, description="Requests that may be sent back to back")
+    daily_quota: int = Field(10000, ge=0, description="Requests per quota day")
+    max_concurrency: int = Field(16, ge=1, description="Upper bound of the adaptive concurrency limit")
+    min_concurrency: int = Field(1, ge=1)
+    latency_target: float = Field(2.0, gt=0, description="Seconds; slower responses shrink the limit")
+    max_retries: int = Field(4, ge=0)
+    backoff_base: float = Field(0.5, gt=0, description="Seconds, doubled per retry before jitter")
+    backoff_cap: float = Field(30.0, gt=0)
+
+    @classmethod
+    def from_env(cls) -> "RateLimitConfig":
+        """Build a config from the GOOGLE_API_* variables"""
+        return cls(
+            requests_per_second=float(os.getenv("GOOGLE_API_RATE", 5.0)),
+            burst=int(os.getenv("GOOGLE_API_BURST", 10)),
+            daily_quota=int(os.getenv("GOOGLE_API_DAILY_QUOTA", 10000)),
+            max_concurrency=int(os.getenv("GOOGLE_API_MAX_CONCURRENCY", 16)),
+        )
+
+def parse_retry_after(value: Optional[str], now: Optional[datetime] = None) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    return max(0.0, (at - (now or datetime.now(timezone.utc))).total_seconds())
+
+class RateLimiter:
+    """Token bucket, daily quota and AIMD concurrency limit shared by API clients"""
+
+    def __init__(self, config: RateLimitConfig, clock=time.monotonic):
+        self.config = config
+        self._clock = clock
+        self._tokens = float(config.burst)
+        self._refilled = clock()
+        self._bucket_lock = asyncio.Lock()
+        self._limit = float(config.max_concurrency)
+        self._in_flight = 0
+        self._slot_freed = asyncio.Condition()
+        self._last_decrease = float("-inf")
+        self._paused_until = 0.0
+        self._quota_day = self._today()
+        self._quota_used = 0
+        self._exhausted_day: Optional[date] = None
+        self._stats = {"requests": 0, "throttled": 0, "slow": 0, "errors": 0, "retries": 0, "quota_rejections": 0}
+
+    @staticmethod
+    def _today() -> date:
+        return datetime.now(QUOTA_TIMEZONE).date()
+
+    @property
+    def concurrency_limit(self) -> int:
+        return int(self._limit)
+
+    def quota_remaining(self) -> int:
+        if self._today() != self._quota_day:
+            self._quota_day = self._today()
+            self._quota_used = 0
+        return max(0, self.config.daily_quota - self._quota_used)
+
+    def _check_quota(self) -> None:
+        if self.quota_remaining() <= 0:
+            if self._exhausted_day != self._quota_day:
+                self._exhausted_day = self._quota_day
+                logger.warning(f"Daily quota of {self.config.daily_quota} requests used; "
+                               f"further requests fail until the quota resets")
+            self._stats["quota_rejections"] += 1
+            raise QuotaExhaustedError(f"Daily quota of {self.config.daily_quota} requests used")
+
+    async def _take_token(self) -> None:
+        async with self._bucket_lock:
+            while True:
+                wait = self._paused_until - self._clock()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                now = self._clock()
+                self._tokens = min(
+                    float(self.config.burst),
+                    self._tokens + (now - self._refilled) * self.config.requests_per_second,
+                )
+                self._refilled = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.config.requests_per_second)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Wait for a concurrency slot and a token, then spend one quota unit
+
+        Raises QuotaExhaustedError without waiting once the day's budget is
+        spent.
+        """
+        self._check_quota()
+        async with self._slot_freed:
+            await self._slot_freed.wait_for(lambda: self._in_flight < self.concurrency_limit)
+            self._in_flight += 1
+        try:
+            await self._take_token()
+            # Other callers may have spent the last units while this one waited
+            self._check_quota()
+            self._quota_used += 1
+            self._stats["requests"] += 1
+            yield
+        finally:
+            async with self._slot_freed:
+                self._in_flight -= 1
+                self._slot_freed.notify_all()
+
+    def on_success(self, latency: float) -> None:
+        if latency > self.config.latency_target:
+            self._stats["slow"] += 1
+            self._decrease()
+        else:
+            # Additive increase: about one more slot per limit's worth of successes
+            self._limit = min(float(self.config.max_concurrency), self._limit + 1 / self._limit)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """Record a 429/5xx; Retry-After pauses every caller"""
+        self._stats["throttled"] += 1
+        self._decrease()
+        if retry_after:
+            self._paused_until = max(self._paused_until, self._clock() + retry_after)
+
+    def on_error(self) -> None:
+        """Record a connection error or timeout"""
+        self._stats["errors"] += 1
+        self._decrease()
+
+    def _decrease(self) -> None:
+        # Responses to requests sent before the last cut say nothing new
+        now = self._clock()
+        if now - self._last_decrease < self.config.latency_target:
+            return
+        self._last_decrease = now
+        self._limit = max(float(self.config.min_concurrency), self._limit / 2)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Seconds before retry ``attempt`` (0-based): Retry-After if given, else full-jitter exponential"""
+        self._stats["retries"] += 1
+        if retry_after is not None:
+            return min(retry_after, self.config.backoff_cap)
+        return random.uniform(0, min(self.config.backoff_cap, self.config.backoff_base * 2 ** attempt))
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self._stats)
+        stats["concurrency_limit"] = self.concurrency_limit
+        stats["in_flight"] = self._in_flight
+        stats["quota_used"] = self._quota_used
+        stats["quota_remaining"] = self.quota_remaining()
+        stats["paused_for"] = round(max(0.0, self._paused_until - self._clock()), 3)
+        return stats
+
+_shared_limiter: Optional[RateLimiter] = None
+_shared_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_shared_limiter(config: RateLimitConfig) -> RateLimiter:
+    """
+    Limiter shared by every GoogleShoppingAPI on the running loop, so all
+    callers draw on one rate, quota and concurrency budget. The first
+    caller's config applies.
+    """
+    global _shared_limiter, _shared_loop
+    loop = asyncio.get_running_loop()
+    if _shared_limiter is None or _shared_loop is not loop:
+        previous = _shared_limiter
+        _shared_limiter = RateLimiter(config)
+        if previous is not None:
+            # The quota spent today does not reset with the event loop
+            _shared_limiter._quota_day = previous._quota_day
+            _shared_limiter._quota_used = previous._quota_used
+        _shared_loop = loop
+    return _shared_limiter
@@ -0,0 +1,236 @@
+"""
+Disk-backed cache for Google Shopping searches
+Entries live in a SQLite file keyed by the normalized query, price filters,
+country and language. Fresh entries are served directly, stale ones are
+served while the caller refreshes them in the background, and empty or
+failed searches are cached for a shorter time so they are not retried on
+every call. The file is capped in size with least-recently-used eviction.
+SQLite calls run in worker threads so they never block the event loop.
+"""
+
+from typing import Any, Dict, List, NamedTuple, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+FRESH = "fresh"
+STALE = "stale"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_cache (
+    key TEXT PRIMARY KEY,
+    payload BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    requested INTEGER NOT NULL,
+    result_count INTEGER NOT NULL,
+    negative INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    stale_until REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_search_cache_last_access ON search_cache (last_access);
+CREATE INDEX IF NOT EXISTS idx_search_cache_stale_until ON search_cache (stale_until);
+"""
+
+class SearchCacheConfig(BaseModel):
+    path: str = "google_search_cache.sqlite3"
+    ttl_seconds: float = Field(3600.0, gt=0, description="How long a result set is fresh")
+    stale_seconds: float = Field(86400.0, ge=0, description="How long past its TTL a result set is still served while refreshing")
+    negative_ttl_seconds: float = Field(300.0, ge=0, description="How long empty or failed searches are remembered")
+    max_bytes: int = Field(256 * 1024 * 1024, gt=0, description="Payload size cap before LRU eviction")
+
+    @classmethod
+    def from_env(cls) -> "SearchCacheConfig":
+        """Build a config from the GOOGLE_SEARCH_CACHE_* variables"""
+        return cls(
+            path=os.getenv("GOOGLE_SEARCH_CACHE_PATH", "google_search_cache.sqlite3"),
+            ttl_seconds=float(os.getenv("GOOGLE_SEARCH_CACHE_TTL_SECONDS", 3600.0)),
+            stale_seconds=float(os.getenv("GOOGLE_SEARCH_CACHE_STALE_SECONDS", 86400.0)),
+            negative_ttl_seconds=float(os.getenv("GOOGLE_SEARCH_CACHE_NEGATIVE_TTL_SECONDS", 300.0)),
+            max_bytes=int(os.getenv("GOOGLE_SEARCH_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+        )
+
+class CachedSearch(NamedTuple):
+    state: str  # FRESH or STALE
+    results: List[Dict[str, Any]]
+    # max_results of the search that filled the entry
+    requested: int
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+def search_key(
+    query: str,
+    min_price: Optional[float],
+    max_price: Optional[float],
+    country: str,
+    language: str,
+) -> str:
+    """Stable cache key for a search"""
+    parts = [
+        normalize_query(query),
+        None if min_price is None else float(min_price),
+        None if max_price is None else float(max_price),
+        country.upper(),
+        language.lower(),
+    ]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+class SearchCache:
+    """
+    SQLite TTL cache of search result lists with LRU eviction and hit statistics
+
+    The async methods run their SQLite work in a worker thread; the
+    ``*_sync`` variants are for callers off the event loop.
+    """
+
+    def __init__(self, config: SearchCacheConfig, clock=time.time):
+        self.config = config
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(config.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM search_cache").fetchone()[0]
+        self._stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evictions": 0,
+            "bytes_saved": 0,
+        }
+
+    async def get(self, key: str, max_results: int) -> Optional[CachedSearch]:
+        return await asyncio.to_thread(self.get_sync, key, max_results)
+
+    async def put(self, key: str, results: List[Dict[str, Any]], requested: int, keep_results: bool = False) -> None:
+        await asyncio.to_thread(self.put_sync, key, results, requested, keep_results)
+
+    async def invalidate(self, key: str) -> None:
+        await asyncio.to_thread(self.invalidate_sync, key)
+
+    async def stats(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.stats_sync)
+
+    def get_sync(self, key: str, max_results: int) -> Optional[CachedSearch]:
+        """
+        The cached results for ``key``, or None if absent, past the stale
+        window, or filled by a smaller search that may have missed results
+        """
+        now = self._clock()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, size, requested, negative, expires_at, stale_until, result_count "
+                "FROM search_cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            # An entry covers the search if it asked for as many results or
+            # came back short of what it asked for
+            if row is None or row[5] <= now or (row[2] < max_results and row[6] >= row[2]):
+                self._stats["misses"] += 1
+                return None
+            payload, size, requested, negative, expires_at, _, _ = row
+            self._conn.execute("UPDATE search_cache SET last_access = ? WHERE key = ?", (now, key))
+            if expires_at > now:
+                self._stats["hits"] += 1
+                state = FRESH
+            else:
+                self._stats["stale_hits"] += 1
+                state = STALE
+            if negative:
+                self._stats["negative_hits"] += 1
+            self._stats["bytes_saved"] += size
+        return CachedSearch(state, json.loads(payload), requested)
+
+    def put_sync(self, key: str, results: List[Dict[str, Any]], requested: int, keep_results: bool = False) -> None:
+        """
+        Store a result list; an empty list is a negative entry with the
+        shorter TTL. With ``keep_results``, an unexpired entry holding
+        results is left in place.
+        """
+        now = self._clock()
+        negative = not results
+        if negative:
+            if self.config.negative_ttl_seconds <= 0:
+                return
+            expires_at = stale_until = now + self.config.negative_ttl_seconds
+        else:
+            expires_at = now + self.config.ttl_seconds
+            stale_until = expires_at + self.config.stale_seconds
+        payload = json.dumps(results, default=str).encode()
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT size, negative, stale_until FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if keep_results and previous and not previous[1] and previous[2] > now:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache "
+                "(key, payload, size, requested, result_count, negative, expires_at, stale_until, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, payload, len(payload), requested, len(results), int(negative), expires_at, stale_until, now),
+            )
+            self._bytes += len(payload) - (previous[0] if previous else 0)
+            self._stats["writes"] += 1
+            if self._bytes > self.config.max_bytes:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        self._conn.execute("BEGIN")
+        try:
+            # Both read through the stale_until index, not the whole table
+            expired_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM search_cache WHERE stale_until <= ?", (now,)
+            ).fetchone()[0]
+            evicted = self._conn.execute("DELETE FROM search_cache WHERE stale_until <= ?", (now,)).rowcount
+            self._bytes -= expired_bytes
+            # Evict down to 90% of the cap so eviction does not run on every write
+            target = self.config.max_bytes * 0.9
+            cursor = self._conn.execute("SELECT key, size FROM search_cache ORDER BY last_access")
+            victims = []
+            for key, size in cursor:
+                if self._bytes <= target:
+                    break
+                victims.append((key,))
+                self._bytes -= size
+            cursor.close()
+            self._conn.executemany("DELETE FROM search_cache WHERE key = ?", victims)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM search_cache").fetchone()[0]
+            raise
+        self._stats["evictions"] += evicted + len(victims)
+
+    def invalidate_sync(self, key: str) -> None:
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM search_cache WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                self._bytes -= row[0]
+
+    def stats_sync(self) -> Dict[str, Any]:
+        """Hit rate, bytes served from the cache instead of the API, and size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["stale_hits"]) / lookups, 4) if lookups else 0.0
+        stats["bytes"] = self._bytes
+        stats["max_bytes"] = self.config.max_bytes
+        return stats
+
+    def close(self) -> None:
+        self._conn.close()
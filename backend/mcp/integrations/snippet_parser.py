@@ -0,0 +1,354 @@
+"""
+Price, seller and availability extraction for Google Shopping result items
+Structured data (pagemap offers and metatags) is preferred; otherwise the
+snippet is matched against precompiled patterns that understand currency
+symbols and codes on either side of the amount and the common thousands/
+decimal separator conventions ("1,299.99", "1.299,99", "1 299,99",
+"1'299.99"). Batches can be split across a process pool for crawl dumps.
+"""
+
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import argparse
+import re
+import time
+
+UNKNOWN_SELLER = "Unknown Seller"
+UNKNOWN_AVAILABILITY = "Unknown"
+
+# Symbol -> ISO code, longest first so "US$" wins over "$"
+CURRENCY_SYMBOLS = {
+    "US$": "USD", "CA$": "CAD", "AU$": "AUD", "NZ$": "NZD", "HK$": "HKD",
+    "C$": "CAD", "A$": "AUD", "R$": "BRL", "S$": "SGD",
+    "€": "EUR", "£": "GBP", "₹": "INR", "₩": "KRW", "zł": "PLN", "Fr.": "CHF",
+}
+CURRENCY_CODES = (
+    "USD", "EUR", "GBP", "JPY", "CNY", "CAD", "AUD", "NZD", "INR", "CHF", "SEK",
+    "NOK", "DKK", "PLN", "BRL", "MXN", "HKD", "SGD", "KRW",
+)
+# Symbols whose currency depends on the market
+LOCAL_SYMBOLS = {
+    "$": {"CA": "CAD", "AU": "AUD", "NZ": "NZD", "MX": "MXN", "HK": "HKD", "SG": "SGD"},
+    "¥": {"CN": "CNY"},
+    "kr": {"SE": "SEK", "NO": "NOK", "DK": "DKK"},
+}
+LOCAL_DEFAULTS = {"$": "USD", "¥": "JPY", "kr": "SEK"}
+
+# Default currency of a market, for amounts without any currency marker
+COUNTRY_CURRENCIES = {
+    "US": "USD", "CA": "CAD", "AU": "AUD", "NZ": "NZD", "GB": "GBP", "UK": "GBP",
+    "IN": "INR", "JP": "JPY", "CN": "CNY", "CH": "CHF", "SE": "SEK", "NO": "NOK",
+    "DK": "DKK", "PL": "PLN", "BR": "BRL", "MX": "MXN", "HK": "HKD", "SG": "SGD",
+    "KR": "KRW", "DE": "EUR", "FR": "EUR", "ES": "EUR", "IT": "EUR", "NL": "EUR",
+    "BE": "EUR", "AT": "EUR", "IE": "EUR", "PT": "EUR", "FI": "EUR",
+}
+
+# Thousands separators besides "," and "." by language, by country where
+# it differs within a language,
+SPACE_GROUPING_LANGUAGES = {"fr", "sv", "nb", "no", "da", "fi", "pl", "cs", "sk", "ru", "uk", "hu", "pt"}
+APOSTROPHE_GROUPING_COUNTRIES = {"CH", "LI"}
+_SPACES = "\u00a0\u202f "
+# and by currency, whatever the market ("CHF 1'299.90", "1 299,00 kr")
+CURRENCY_GROUPING = {"CHF": "'", "SEK": _SPACES, "NOK": _SPACES, "DKK": _SPACES, "PLN": _SPACES}
+
+# Markers of a struck-through price right before an amount ("Was $1,299")
+STRUCK_PATTERN = re.compile(r"(?:\bwas|\breg\.?|\bregular|\blist|\bmsrp|\borig(?:inal)?)\W{0,3}$", re.IGNORECASE)
+_SEPARATORS = re.compile(f"['{_SPACES}]")
+_TOKEN_LENGTHS = sorted({len(token) for token in list(CURRENCY_SYMBOLS) + list(LOCAL_SYMBOLS) + list(CURRENCY_CODES)}, reverse=True)
+
+
+@lru_cache(maxsize=None)
+def amount_pattern(grouping: str) -> "re.Pattern":
+    """
+    Amount pattern allowing ``grouping`` characters as thousands separators:
+    grouped thousands or plain digits, then an optional one- or two-digit
+    decimal part
+    """
+    return re.compile(rf"(?:\d{{1,3}}(?:[{re.escape(grouping)}]\d{{3}})+|\d+)(?:[.,]\d{{1,2}})?(?!\d)")
+
+
+# Amounts in any grouping convention; a match is then accepted only if the
+# market or its currency groups thousands that way
+AMOUNT_PATTERN = amount_pattern(",.'" + _SPACES)
+
+
+SELLER_PATTERN = re.compile(
+    r"\b(?i:sold by|seller:|ships from and sold by)\s+([A-Z0-9][\w&'-]*(?:\.[\w&'-]+)*(?:\s+[A-Z0-9][\w&'-]*(?:\.[\w&'-]+)*){0,3})"
+)
+
+SCHEMA_AVAILABILITY = {
+    "instock": "In Stock",
+    "onlineonly": "In Stock",
+    "instoreonly": "In Store Only",
+    "outofstock": "Out of Stock",
+    "soldout": "Out of Stock",
+    "discontinued": "Discontinued",
+    "preorder": "Pre-order",
+    "presale": "Pre-order",
+    "backorder": "Backorder",
+    "limitedavailability": "Limited Stock",
+}
+# Snippet phrases, matched against the lower-cased snippet in one scan; the
+# earliest entry wins when several occur, so "not in stock" beats "in stock"
+AVAILABILITY_PHRASES = (
+    ("out_of_stock", r"out of stock|sold out|not in stock|unavailable", "Out of Stock"),
+    ("preorder", r"pre-?orders?", "Pre-order"),
+    ("backorder", r"back-?order(?:ed)?", "Backorder"),
+    ("limited", r"only \d+ left|limited stock|low stock|few left", "Limited Stock"),
+    ("in_stock", r"in stock|available now|ships (?:today|tomorrow|in \d)", "In Stock"),
+)
+AVAILABILITY_PATTERN = re.compile(
+    r"\b(?:{})\b".format("|".join(f"(?P<{name}>{pattern})" for name, pattern, _ in AVAILABILITY_PHRASES))
+)
+_AVAILABILITY_RANK = {name: (rank, label) for rank, (name, _, label) in enumerate(AVAILABILITY_PHRASES)}
+
+
+class ParsedOffer(NamedTuple):
+    price: Optional[float]
+    currency: str
+    seller: str
+    availability: str
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """
+    Number from a matched amount; the last separator is the decimal point
+    when one or two digits follow it, any other separator groups thousands
+    """
+    digits = _SEPARATORS.sub("", text)
+    last = max(digits.rfind("."), digits.rfind(","))
+    if last >= 0 and len(digits) - last - 1 in (1, 2):
+        digits = digits[:last].replace(",", "").replace(".", "") + "." + digits[last + 1:]
+    else:
+        digits = digits.replace(",", "").replace(".", "")
+    try:
+        return float(digits)
+    except ValueError:
+        return None
+
+
+def _first(pagemap: Dict[str, Any], name: str) -> Dict[str, Any]:
+    entries = pagemap.get(name)
+    return entries[0] if isinstance(entries, list) and entries and isinstance(entries[0], dict) else {}
+
+
+class SnippetParser:
+    """Extraction rules for one market (country and language)"""
+
+    def __init__(self, country: str = "US", language: str = "en"):
+        self.country = country.upper()
+        self.language = language.lower()
+        self.default_currency = COUNTRY_CURRENCIES.get(self.country, "USD")
+        self._currencies = dict(CURRENCY_SYMBOLS)
+        for code in CURRENCY_CODES:
+            self._currencies[code] = code
+        for symbol, by_country in LOCAL_SYMBOLS.items():
+            self._currencies[symbol] = by_country.get(self.country, LOCAL_DEFAULTS[symbol])
+        # Spaces and apostrophes this market groups thousands with
+        self._grouping = ""
+        if self.language in SPACE_GROUPING_LANGUAGES:
+            self._grouping += _SPACES
+        if self.country in APOSTROPHE_GROUPING_COUNTRIES:
+            self._grouping += "'"
+
+    def price(self, snippet: str) -> Optional[tuple]:
+        """(price, currency) of the current price in a snippet, skipping was/list prices"""
+        fallback = None
+        for match in AMOUNT_PATTERN.finditer(snippet):
+            start, end = match.span()
+            # Part of a longer number or version string
+            if start and snippet[start - 1] in ".,":
+                continue
+            currency = self._currency_before(snippet, start)
+            if currency is not None:
+                start = currency[1]
+            elif start and snippet[start - 1].isalpha():
+                # Model numbers and versions ("S24", "v1.5")
+                continue
+            else:
+                currency = self._currency_after(snippet, end)
+                if currency is None:
+                    continue
+            # "1 299,00" or "1'299" grouped in a way neither the market nor
+            # the currency uses is ambiguous; no part of it is a safe price
+            separators = _SEPARATORS.findall(match.group())
+            if separators and not set(separators) <= set(self._grouping + CURRENCY_GROUPING.get(currency[0], "")):
+                continue
+            value = parse_amount(match.group())
+            if value is None:
+                continue
+            found = (value, currency[0])
+            if STRUCK_PATTERN.search(snippet, max(0, start - 16), start):
+                fallback = fallback or found
+                continue
+            return found
+        return fallback
+
+    def _currency_before(self, text: str, at: int) -> Optional[tuple]:
+        """(ISO code, start index) of a currency token ending at ``at``, allowing one space"""
+        end = at - 1 if at and text[at - 1].isspace() else at
+        for length in _TOKEN_LENGTHS:
+            begin = end - length
+            if begin < 0:
+                continue
+            code = self._currencies.get(text[begin:end])
+            # Alphabetic tokens must start a word ("kr", not "Ukr")
+            if code is not None and (not text[begin].isalpha() or not begin or not text[begin - 1].isalnum()):
+                return code, begin
+        return None
+
+    def _currency_after(self, text: str, at: int) -> Optional[tuple]:
+        """(ISO code, end index) of a currency token starting at ``at``, allowing one space"""
+        begin = at + 1 if at < len(text) and text[at].isspace() else at
+        for length in _TOKEN_LENGTHS:
+            end = begin + length
+            if end > len(text):
+                continue
+            code = self._currencies.get(text[begin:end])
+            if code is None or (text[end - 1].isalpha() and end < len(text) and text[end].isalnum()):
+                continue
+            # A token followed by an amount is that amount's currency ("1.5 $3")
+            rest = text[end + 1:end + 2] if text[end:end + 1].isspace() else text[end:end + 1]
+            if rest.isdigit():
+                return None
+            return code, end
+        return None
+
+    def seller(self, item: Dict[str, Any], offer: Dict[str, Any], metatags: Dict[str, Any], snippet: str) -> str:
+        seller = offer.get("seller") or metatags.get("og:site_name")
+        if seller:
+            return str(seller)
+        match = SELLER_PATTERN.search(snippet)
+        if match:
+            return match.group(1)
+        domain = item.get("displayLink") or ""
+        return domain[4:] if domain.startswith("www.") else domain or UNKNOWN_SELLER
+
+    def availability(self, offer: Dict[str, Any], product: Dict[str, Any], snippet: str) -> str:
+        structured = offer.get("availability") or product.get("availability")
+        if structured:
+            label = SCHEMA_AVAILABILITY.get(str(structured).rsplit("/", 1)[-1].lower())
+            if label:
+                return label
+        found = [_AVAILABILITY_RANK[match.lastgroup] for match in AVAILABILITY_PATTERN.finditer(snippet.lower())]
+        return min(found)[1] if found else UNKNOWN_AVAILABILITY
+
+    def parse(self, item: Dict[str, Any]) -> ParsedOffer:
+        pagemap = item.get("pagemap") or {}
+        snippet = item.get("snippet") or ""
+        offer = _first(pagemap, "offer")
+        metatags = _first(pagemap, "metatags")
+        price = currency = None
+
+        structured = offer.get("price") or metatags.get("product:price:amount") or metatags.get("og:price:amount")
+        if structured is not None:
+            price = parse_amount(str(structured))
+            currency = (
+                offer.get("pricecurrency")
+                or metatags.get("product:price:currency")
+                or metatags.get("og:price:currency")
+            )
+        if price is None:
+            found = self.price(snippet)
+            if found is not None:
+                price, currency = found
+        return ParsedOffer(
+            price,
+            (currency or self.default_currency).upper(),
+            self.seller(item, offer, metatags, snippet),
+            self.availability(offer, _first(pagemap, "product"), snippet),
+        )
+
+    def parse_many(self, items: Iterable[Dict[str, Any]]) -> List[ParsedOffer]:
+        parse = self.parse
+        return [parse(item) for item in items]
+
+
+# Per-process parser for pool workers
+_worker_parser: Optional[SnippetParser] = None
+
+
+def _init_worker(country: str, language: str) -> None:
+    global _worker_parser
+    _worker_parser = SnippetParser(country, language)
+
+
+def _parse_chunk(items: Sequence[Dict[str, Any]]) -> List[ParsedOffer]:
+    return _worker_parser.parse_many(items)
+
+
+def parse_items(
+    items: Sequence[Dict[str, Any]],
+    country: str = "US",
+    language: str = "en",
+    workers: int = 1,
+    chunk_size: int = 5000,
+) -> List[ParsedOffer]:
+    """
+    Parse a batch of result items, in order
+
+    With ``workers`` > 1 and more than one chunk of items, chunks are parsed
+    in a process pool; below that the pool start-up costs more than it saves.
+    """
+    if workers <= 1 or len(items) <= chunk_size:
+        return SnippetParser(country, language).parse_many(items)
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(country, language)) as pool:
+        parsed: List[ParsedOffer] = []
+        for chunk in pool.map(_parse_chunk, chunks):
+            parsed.extend(chunk)
+    return parsed
+
+
+_SAMPLE_ITEMS = (
+    {"snippet": "Apple iPhone 15 Pro 128GB. Was $1,099.99 Now $999.99. In stock, ships today. Sold by Best Buy",
+     "displayLink": "www.bestbuy.com"},
+    {"snippet": "Samsung Galaxy S24 – 899,00 € inkl. MwSt. Nur noch 3 auf Lager", "displayLink": "www.mediamarkt.de"},
+    {"snippet": "Sony WH-1000XM5 £279.00 - Out of stock", "displayLink": "www.argos.co.uk"},
+    {"snippet": "MacBook Air M3 CHF 1'299.90 Pre-order now", "displayLink": "www.digitec.ch"},
+    {"snippet": "Dell XPS 13", "displayLink": "www.dell.com",
+     "pagemap": {"offer": [{"price": "1249.00", "pricecurrency": "USD",
+                            "availability": "https://schema.org/InStock"}]}},
+    {"snippet": "Nintendo Switch OLED from 1 299,00 kr only 2 left", "displayLink": "www.elgiganten.se"},
+)
+
+
+# (price, currency) each sample item must parse to, in every market
+_SAMPLE_PRICES = (
+    (999.99, "USD"),
+    (899.0, "EUR"),
+    (279.0, "GBP"),
+    (1299.9, "CHF"),
+    (1249.0, "USD"),
+    (1299.0, "SEK"),
+)
+
+
+def benchmark(items: int = 100_000, workers: int = 1) -> Dict[str, float]:
+    """Items per second over a synthetic mix of snippet styles, each checked against its expected price"""
+    sample = [dict(_SAMPLE_ITEMS[i % len(_SAMPLE_ITEMS)]) for i in range(items)]
+    started = time.perf_counter()
+    parsed = parse_items(sample, workers=workers)
+    elapsed = time.perf_counter() - started
+    wrong = sum(
+        (offer.price, offer.currency) != _SAMPLE_PRICES[i % len(_SAMPLE_PRICES)]
+        for i, offer in enumerate(parsed)
+    )
+    if wrong:
+        raise ValueError(f"{wrong} of {items} sample items parsed to the wrong price")
+    return {
+        "items": items,
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "items_per_second": round(items / elapsed),
+        "priced": sum(offer.price is not None for offer in parsed),
+    }
+
+
+if __name__ == "__main__":
+    cli = argparse.ArgumentParser(description="Benchmark snippet parsing throughput")
+    cli.add_argument("--items", type=int, default=100_000)
+    cli.add_argument("--workers", type=int, default=1)
+    args = cli.parse_args()
+    print(benchmark(args.items, args.workers))
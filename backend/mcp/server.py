@@ -1,13 +1,18 @@
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Literal, Optional, Union
 import asyncio
 import json
 import logging
+import os
 from datetime import datetime, timedelta
 from fastapi import FastAPI, HTTPException, WebSocket
 from pydantic import BaseModel, Field
 from motor.motor_asyncio import AsyncIOMotorClient
 from prisma import Prisma
 
+from crawl_scheduler import CrawlScheduler, CrawlSchedulerConfig
+from dispatch import DispatchConfig, MCPSession
+from integrations.google_shopping import GoogleShoppingAPI, GoogleShoppingConfig, close_shared_session
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -23,17 +28,35 @@ prisma = Prisma()
 mongo_client = AsyncIOMotorClient("mongodb://localhost:27017")
 db = mongo_client.retail_analytics
 
+dispatch_config = DispatchConfig.from_env()
+
+# Started on startup when the Google API credentials are configured
+crawl_scheduler: Optional[CrawlScheduler] = None
+crawl_tasks: List[asyncio.Task] = []
+
 # MCP Protocol Models
 class PriceTrendRequest(BaseModel):
     product_id: str
-    timeframe: str = Field(..., description="daily, weekly, or monthly")
+    timeframe: Literal["daily", "weekly", "monthly"] = Field(..., description="daily, weekly, or monthly")
     competitor_ids: Optional[List[str]] = None
 
+class PriceTrendBatchRequest(BaseModel):
+    product_ids: List[str] = Field(..., min_length=1, max_length=1000)
+    timeframe: Literal["daily", "weekly", "monthly"] = Field(..., description="daily, weekly, or monthly")
+    competitor_ids: Optional[List[str]] = None
+    points: int = Field(100, ge=1, le=1000, description="Most recent price points returned per product")
+
+class CompetitorReportRequest(BaseModel):
+    limit: int = Field(50, ge=1, le=500, description="Competitors per page")
+    cursor: Optional[str] = Field(None, description="next_cursor of the previous page")
+
 class CompetitorReport(BaseModel):
     competitor_id: str
     name: str
-    price_difference: float
-    market_share: float
+    price_difference: float = Field(..., description="Average of competitor price minus our price")
+    price_difference_percent: float = 0.0
+    market_share: float = Field(..., description="Share of listed products where this competitor is cheapest")
+    lowest_price_listings: int = 0
     product_overlap: int
     last_updated: datetime
 
@@ -45,10 +68,14 @@ class MCPResponse(BaseModel):
 @app.on_event("startup")
 async def startup():
     await prisma.connect()
+    # Serves the product_id/competitor_id $match and timestamp ordering of the trend pipelines
+    await db.price_history.create_index([("product_id", 1), ("competitor_id", 1), ("timestamp", -1)])
     logger.info("Connected to databases")
+    await start_crawl_scheduler()
 
 @app.on_event("shutdown")
 async def shutdown():
+    await stop_crawl_scheduler()
     await prisma.disconnect()
     mongo_client.close()
     logger.info("Disconnected from databases")
@@ -58,84 +85,297 @@ async def mcp_endpoint(websocket: WebSocket):
     await websocket.accept()
     logger.info("New MCP connection established")
     
-    try:
-        while True:
-            data = await websocket.receive_json()
-            
-            # Handle different MCP commands
-            command = data.get("command")
-            if command == "price_trends":
-                response = await handle_price_trends(data.get("params", {}))
-            elif command == "competitor_report":
-                response = await handle_competitor_report(data.get("params", {}))
-            elif command == "market_analysis":
-                response = await handle_market_analysis(data.get("params", {}))
-            else:
-                response = {"status": "error", "message": "Unknown command"}
-            
-            await websocket.send_json(response)
-            
-    except Exception as e:
-        logger.error(f"WebSocket error: {str(e)}")
-        await websocket.close()
+    # Commands run concurrently; responses carry the request id and are
+    # sent in completion order
+    session = MCPSession(websocket, COMMAND_HANDLERS, dispatch_config)
+    await session.run()
+    logger.info("MCP connection closed")
+
+# Query window and bucket unit per timeframe
+TIMEFRAME_WINDOWS = {
+    "daily": (timedelta(days=30), "day"),
+    "weekly": (timedelta(weeks=12), "week"),
+    "monthly": (timedelta(days=365), "month"),
+}
+# Relative change over the window below which a trend counts as stable
+TREND_TOLERANCE = 0.01
+MS_PER_DAY = 86_400_000
+
+def _price_match(product_ids: List[str], competitor_ids: Optional[List[str]], since: datetime) -> dict:
+    """$match stage for recent price history of some products, optionally only some competitors"""
+    match = {
+        "product_id": product_ids[0] if len(product_ids) == 1 else {"$in": product_ids},
+        "timestamp": {"$gte": since},
+    }
+    if competitor_ids:
+        match["competitor_id"] = {"$in": competitor_ids}
+    return {"$match": match}
+
+def _stats_accumulators(since: datetime) -> dict:
+    """$group accumulators for summary stats and the least-squares sums of price over days"""
+    days = {"$divide": [{"$subtract": ["$timestamp", since]}, MS_PER_DAY]}
+    return {
+        "count": {"$sum": 1},
+        "mean": {"$avg": "$price"},
+        "min": {"$min": "$price"},
+        "max": {"$max": "$price"},
+        "stddev": {"$stdDevPop": "$price"},
+        "sx": {"$sum": days},
+        "sy": {"$sum": "$price"},
+        "sxx": {"$sum": {"$multiply": [days, days]}},
+        "sxy": {"$sum": {"$multiply": [days, "$price"]}},
+    }
+
+# Replace the regression sums with the slope in price per day
+_SLOPE_STAGES = [
+    {"$set": {"slope": {"$let": {
+        "vars": {"denominator": {"$subtract": [{"$multiply": ["$count", "$sxx"]}, {"$multiply": ["$sx", "$sx"]}]}},
+        "in": {"$cond": [
+            {"$eq": ["$$denominator", 0]},
+            0,
+            {"$divide": [
+                {"$subtract": [{"$multiply": ["$count", "$sxy"]}, {"$multiply": ["$sx", "$sy"]}]},
+                "$$denominator"
+            ]}
+        ]}
+    }}}},
+    {"$unset": ["sx", "sy", "sxx", "sxy"]},
+]
+
+def _analysis(stats: Optional[dict], window: timedelta) -> dict:
+    """Summary stats plus a trend judged by the fitted change over the window"""
+    if not stats or not stats.get("count"):
+        return {"count": 0, "mean": None, "min": None, "max": None, "stddev": None,
+                "slope_per_day": None, "trend": "insufficient_data"}
+    slope = stats["slope"]
+    change = slope * window.total_seconds() / 86400 / stats["mean"] if stats["mean"] else 0.0
+    if stats["count"] < 2:
+        trend = "insufficient_data"
+    elif change > TREND_TOLERANCE:
+        trend = "increasing"
+    elif change < -TREND_TOLERANCE:
+        trend = "decreasing"
+    else:
+        trend = "stable"
+    return {
+        "count": stats["count"],
+        "mean": stats["mean"],
+        "min": stats["min"],
+        "max": stats["max"],
+        "stddev": stats["stddev"],
+        "slope_per_day": slope,
+        "trend": trend,
+    }
 
 async def handle_price_trends(params: dict) -> dict:
     """Handle price trend analysis requests"""
     try:
         request = PriceTrendRequest(**params)
+        window, unit = TIMEFRAME_WINDOWS[request.timeframe]
+        now = datetime.utcnow()
+        since = now - window
         
-        # Query historical price data
+        # Stats and bucketed series are computed by Mongo; only one
+        # summary document and one row per bucket come back
         pipeline = [
-            {"$match": {"product_id": request.product_id}},
-            {"$sort": {"timestamp": -1}},
-            {"$limit": 100}  # Adjust based on timeframe
+            _price_match([request.product_id], request.competitor_ids, since),
+            {"$project": {"_id": 0, "price": 1, "timestamp": 1}},
+            {"$sort": {"timestamp": 1}},
+            {"$facet": {
+                "stats": [
+                    {"$group": {"_id": None, **_stats_accumulators(since)}},
+                    *_SLOPE_STAGES
+                ],
+                "buckets": [
+                    {"$group": {
+                        "_id": {"$dateTrunc": {"date": "$timestamp", "unit": unit, "startOfWeek": "monday"}},
+                        "open": {"$first": "$price"},
+                        "close": {"$last": "$price"},
+                        "min": {"$min": "$price"},
+                        "max": {"$max": "$price"},
+                        "mean": {"$avg": "$price"},
+                        "count": {"$sum": 1}
+                    }},
+                    {"$setWindowFields": {
+                        "sortBy": {"_id": 1},
+                        "output": {
+                            "moving_average": {"$avg": "$mean", "window": {"documents": [-2, 0]}},
+                            "previous_close": {"$shift": {"output": "$close", "by": -1}}
+                        }
+                    }},
+                    {"$project": {
+                        "_id": 0,
+                        "bucket_start": "$_id",
+                        "open": 1, "close": 1, "min": 1, "max": 1, "mean": 1, "count": 1,
+                        "moving_average": 1,
+                        "change_percent": {"$cond": [
+                            {"$gt": ["$previous_close", 0]},
+                            {"$multiply": [{"$divide": [{"$subtract": ["$close", "$previous_close"]}, "$previous_close"]}, 100]},
+                            None
+                        ]}
+                    }}
+                ]
+            }}
         ]
         
-        price_data = await db.price_history.aggregate(pipeline).to_list(None)
+        result = await db.price_history.aggregate(pipeline).to_list(None)
+        facets = result[0] if result else {"stats": [], "buckets": []}
         
         return {
             "status": "success",
             "data": {
-                "trends": price_data,
-                "analysis": {
-                    "mean": sum(p["price"] for p in price_data) / len(price_data),
-                    "trend": "increasing" if price_data[0]["price"] > price_data[-1]["price"] else "decreasing"
-                }
+                "timeframe": request.timeframe,
+                "window": {"start": since, "end": now},
+                "trends": facets["buckets"],
+                "analysis": _analysis(facets["stats"][0] if facets["stats"] else None, window)
             }
         }
     except Exception as e:
         logger.error(f"Error in price trends: {str(e)}")
         return {"status": "error", "message": str(e)}
 
+async def handle_price_trends_batch(params: dict) -> dict:
+    """Price trends for many products with a single aggregation"""
+    try:
+        request = PriceTrendBatchRequest(**params)
+        product_ids = list(dict.fromkeys(request.product_ids))
+        window, _ = TIMEFRAME_WINDOWS[request.timeframe]
+        now = datetime.utcnow()
+        since = now - window
+        
+        # One pass over the matching history: per-product stats plus the
+        # most recent points, newest first
+        pipeline = [
+            _price_match(product_ids, request.competitor_ids, since),
+            {"$group": {
+                "_id": "$product_id",
+                **_stats_accumulators(since),
+                "points": {"$topN": {
+                    "n": request.points,
+                    "sortBy": {"timestamp": -1},
+                    "output": {
+                        "price": "$price",
+                        "timestamp": "$timestamp",
+                        "competitor_id": "$competitor_id"
+                    }
+                }}
+            }},
+            *_SLOPE_STAGES
+        ]
+        
+        groups = await db.price_history.aggregate(pipeline).to_list(None)
+        
+        results = {
+            group["_id"]: {"trends": group["points"], "analysis": _analysis(group, window)}
+            for group in groups
+        }
+        
+        return {
+            "status": "success",
+            "data": {
+                "timeframe": request.timeframe,
+                "window": {"start": since, "end": now},
+                "results": results,
+                "missing": [product_id for product_id in product_ids if product_id not in results]
+            }
+        }
+    except Exception as e:
+        logger.error(f"Error in batch price trends: {str(e)}")
+        return {"status": "error", "message": str(e)}
+
+# Competitor report in one round trip, whatever the number of competitors:
+# latest price per (product, competitor), the lowest of those per product,
+# then overlap, average gap against our price and lowest-price listings for
+# one keyset page of competitors
+COMPETITOR_REPORT_SQL = """
+WITH page AS (
+    SELECT c.id, c.name, c."updatedAt" AS updated_at
+    FROM "Competitor" c
+    WHERE c.active = TRUE {after_clause}
+    ORDER BY c.id
+    LIMIT {limit}
+),
+latest AS (
+    SELECT ranked."productId" AS product_id, ranked."competitorId" AS competitor_id, ranked.price
+    FROM (
+        SELECT ph."productId", ph."competitorId", ph.price,
+               ROW_NUMBER() OVER (
+                   PARTITION BY ph."productId", ph."competitorId"
+                   ORDER BY ph.timestamp DESC, ph.id DESC
+               ) AS rn
+        FROM "PriceHistory" ph
+    ) ranked
+    WHERE ranked.rn = 1
+),
+lowest AS (
+    SELECT product_id, MIN(price) AS min_price
+    FROM latest
+    GROUP BY product_id
+),
+per_competitor AS (
+    SELECT l.competitor_id,
+           COUNT(*) AS product_overlap,
+           AVG(l.price - p.price) AS price_difference,
+           AVG((l.price - p.price) * 100.0 / p.price) AS price_difference_percent,
+           SUM(CASE WHEN l.price <= lo.min_price THEN 1 ELSE 0 END) AS lowest_price_listings
+    FROM latest l
+    JOIN page ON page.id = l.competitor_id
+    JOIN "Product" p ON p.id = l.product_id
+    JOIN lowest lo ON lo.product_id = l.product_id
+    GROUP BY l.competitor_id
+)
+SELECT page.id AS competitor_id,
+       page.name,
+       page.updated_at,
+       COALESCE(pc.product_overlap, 0) AS product_overlap,
+       COALESCE(pc.price_difference, 0) AS price_difference,
+       COALESCE(pc.price_difference_percent, 0) AS price_difference_percent,
+       COALESCE(pc.lowest_price_listings, 0) AS lowest_price_listings,
+       (SELECT COUNT(*) FROM lowest) AS listed_products
+FROM page
+LEFT JOIN per_competitor pc ON pc.competitor_id = page.id
+ORDER BY page.id
+"""
+
+def competitor_report_query(limit: int, cursor: Optional[str] = None) -> tuple:
+    """Report SQL with $n placeholders and its arguments, for one page after ``cursor``"""
+    args = [] if cursor is None else [cursor]
+    after_clause = "AND c.id > $1" if cursor is not None else ""
+    args.append(limit)
+    sql = COMPETITOR_REPORT_SQL.format(after_clause=after_clause, limit=f"${len(args)}")
+    return sql, args
+
 async def handle_competitor_report(params: dict) -> dict:
     """Generate competitor analysis report"""
     try:
-        competitor_data = await prisma.competitor.find_many(
-            where={"active": True},
-            include={
-                "products": True,
-                "priceHistory": {
-                    "take": 30,  # Last 30 price points
-                    "orderBy": {"timestamp": "desc"}
-                }
-            }
-        )
+        request = CompetitorReportRequest(**params)
+        sql, args = competitor_report_query(request.limit + 1, request.cursor)
+        rows = await prisma.query_raw(sql, *args)
         
+        has_more = len(rows) > request.limit
+        rows = rows[:request.limit]
         reports = []
-        for competitor in competitor_data:
+        for row in rows:
+            listed = int(row["listed_products"])
+            lowest = int(row["lowest_price_listings"])
             report = CompetitorReport(
-                competitor_id=competitor.id,
-                name=competitor.name,
-                price_difference=calculate_price_difference(competitor),
-                market_share=calculate_market_share(competitor),
-                product_overlap=len(competitor.products),
-                last_updated=competitor.updated_at
+                competitor_id=row["competitor_id"],
+                name=row["name"],
+                price_difference=float(row["price_difference"]),
+                price_difference_percent=float(row["price_difference_percent"]),
+                market_share=lowest / listed if listed else 0.0,
+                lowest_price_listings=lowest,
+                product_overlap=int(row["product_overlap"]),
+                last_updated=row["updated_at"]
             )
             reports.append(report.dict())
         
         return {
             "status": "success",
-            "data": {"reports": reports}
+            "data": {
+                "reports": reports,
+                "next_cursor": rows[-1]["competitor_id"] if has_more else None
+            }
         }
     except Exception as e:
         logger.error(f"Error in competitor report: {str(e)}")
@@ -157,15 +397,135 @@ async def handle_market_analysis(params: dict) -> dict:
         logger.error(f"Error in market analysis: {str(e)}")
         return {"status": "error", "message": str(e)}
 
-def calculate_price_difference(competitor: dict) -> float:
-    """Calculate average price difference with competitor"""
-    # Implement price difference calculation
-    return 0.0
+# Every (product, active competitor) pair, with its price change count,
+# mean absolute log move per change and observed span over the lookback
+# window, to seed the crawl intervals
+CRAWL_TARGETS_SQL = """
+WITH ticks AS (
+    SELECT ph."productId" AS product_id, ph."competitorId" AS competitor_id, ph.price, ph.timestamp,
+           LAG(ph.price) OVER (
+               PARTITION BY ph."productId", ph."competitorId"
+               ORDER BY ph.timestamp, ph.id
+           ) AS previous
+    FROM "PriceHistory" ph
+    WHERE ph.timestamp >= $1
+),
+stats AS (
+    SELECT product_id, competitor_id,
+           COUNT(*) FILTER (WHERE previous IS NOT NULL AND price <> previous) AS changes,
+           AVG(ABS(LN(price / previous))) FILTER (
+               WHERE previous IS NOT NULL AND price <> previous AND price > 0 AND previous > 0
+           ) AS volatility,
+           EXTRACT(EPOCH FROM MAX(timestamp) - MIN(timestamp)) AS observed_seconds,
+           EXTRACT(EPOCH FROM MAX(timestamp)) AS last_seen,
+           (ARRAY_AGG(price ORDER BY timestamp DESC))[1] AS last_price
+    FROM ticks
+    GROUP BY product_id, competitor_id
+)
+SELECT p.id AS product_id, p.name, c.id AS competitor_id, c.website,
+       COALESCE(s.changes, 0) AS changes,
+       COALESCE(s.volatility, 0) AS volatility,
+       COALESCE(s.observed_seconds, 0) AS observed_seconds,
+       s.last_seen,
+       s.last_price
+FROM "Product" p
+CROSS JOIN "Competitor" c
+LEFT JOIN stats s ON s.product_id = p.id AND s.competitor_id = c.id
+WHERE c.active = TRUE
+"""
+
+async def record_crawled_prices(observations: list) -> None:
+    """Store crawled competitor prices in price history"""
+    await prisma.pricehistory.create_many(data=[
+        {
+            "productId": product_id,
+            "competitorId": competitor_id,
+            "price": price,
+            "url": url,
+            "timestamp": datetime.utcfromtimestamp(at),
+        }
+        for product_id, competitor_id, price, url, at in observations
+    ])
+
+async def load_crawl_targets(scheduler: CrawlScheduler) -> None:
+    """
+    Add new (product, competitor) pairs to the scheduler, seeded from price
+    history, and drop pairs whose product or competitor is gone; pairs
+    already scheduled keep their state
+    """
+    since = datetime.utcnow() - timedelta(days=scheduler.config.lookback_days)
+    rows = await prisma.query_raw(CRAWL_TARGETS_SQL, since)
+    keys = set()
+    for row in rows:
+        key = (row["product_id"], row["competitor_id"])
+        keys.add(key)
+        if scheduler.get(*key) is not None or not row["website"]:
+            continue
+        scheduler.add_target(
+            row["product_id"],
+            row["competitor_id"],
+            query=row["name"],
+            website=row["website"],
+            changes=float(row["changes"]),
+            observed_seconds=float(row["observed_seconds"]),
+            volatility=float(row["volatility"]),
+            last_observed=float(row["last_seen"]) if row["last_seen"] is not None else None,
+            last_price=float(row["last_price"]) if row["last_price"] is not None else None,
+        )
+    scheduler.drop_where(lambda key: key not in keys)
+    logger.info(f"Crawl scheduler tracking {len(scheduler)} product/competitor pairs")
+
+async def _refresh_crawl_targets(scheduler: CrawlScheduler) -> None:
+    while True:
+        try:
+            await load_crawl_targets(scheduler)
+        except Exception as e:
+            logger.error(f"Error loading crawl targets: {str(e)}")
+        await asyncio.sleep(scheduler.config.target_refresh)
+
+async def start_crawl_scheduler() -> None:
+    """Start re-crawling competitor prices if Google API credentials are set"""
+    global crawl_scheduler
+    api_key = os.getenv("GOOGLE_API_KEY")
+    cx = os.getenv("GOOGLE_CSE_ID")
+    if not (api_key and cx) or os.getenv("CRAWL_SCHEDULER_ENABLED", "true").lower() in ("0", "false", "no"):
+        logger.info("Crawl scheduler disabled")
+        return
+    config = CrawlSchedulerConfig.from_env()
+    # No search cache: every crawl must see the live price
+    api = GoogleShoppingAPI(GoogleShoppingConfig(api_key=api_key, cx=cx))
+
+    async def search(queries: List[str]) -> dict:
+        async with api:
+            return await api.search_many(queries, max_results=config.max_results)
+
+    crawl_scheduler = CrawlScheduler(search, record_crawled_prices, config)
+    crawl_tasks.append(asyncio.create_task(_refresh_crawl_targets(crawl_scheduler)))
+    crawl_scheduler.start()
+
+async def stop_crawl_scheduler() -> None:
+    global crawl_scheduler
+    for task in crawl_tasks:
+        task.cancel()
+    crawl_tasks.clear()
+    if crawl_scheduler is not None:
+        await crawl_scheduler.stop()
+        crawl_scheduler = None
+        await close_shared_session()
+
+async def handle_crawl_status(params: dict) -> dict:
+    """Re-crawl scheduler counters, lag and price freshness"""
+    if crawl_scheduler is None:
+        return {"status": "error", "message": "Crawl scheduler is not running"}
+    return {"status": "success", "data": crawl_scheduler.stats()}
 
-def calculate_market_share(competitor: dict) -> float:
-    """Calculate competitor's market share"""
-    # Implement market share calculation
-    return 0.0
+COMMAND_HANDLERS = {
+    "price_trends": handle_price_trends,
+    "price_trends_batch": handle_price_trends_batch,
+    "competitor_report": handle_competitor_report,
+    "market_analysis": handle_market_analysis,
+    "crawl_status": handle_crawl_status,
+}
 
 if __name__ == "__main__":
     import uvicorn
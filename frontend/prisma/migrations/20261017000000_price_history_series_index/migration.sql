@@ -0,0 +1,2 @@
+-- CreateIndex
+CREATE INDEX "PriceHistory_productId_competitorId_timestamp_idx" ON "PriceHistory"("productId", "competitorId", "timestamp");